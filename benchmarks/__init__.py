@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+"""
+gpxpy benchmarks (not installed with the library):
+
+ * generator.py: deterministic synthetic GPX files
+ * run.py: benchmarks of the main operations, with results saved as JSON
+ * the other modules: benchmarks of single features
+
+Run them from the repository root, for example:
+
+    python benchmarks/run.py --help
+"""
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Accuracy versus throughput of the distance models (geo.DISTANCE_MODELS).
+The errors are relative to the Vincenty (ellipsoid) distance, for pairs
+of random points at different distances.
+
+Usage:
+
+    python benchmarks/distance_models.py [pairs]
+"""
+
+from __future__ import print_function
+
+import os as mod_os
+import random as mod_random
+import sys as mod_sys
+import time as mod_time
+
+mod_sys.path.insert(0, mod_os.path.join(mod_os.path.dirname(mod_os.path.abspath(__file__)), '..'))
+
+import gpxpy.geo as mod_geo
+
+# (description, maximum latitude/longitude difference in degrees):
+SCALES = [
+    ('~10m', 0.0001),
+    ('~1km', 0.01),
+    ('~20km', 0.2),
+    ('~200km', 2),
+    ('~2000km', 20),
+]
+
+
+def generate_points(pairs, max_difference):
+    """ Consecutive points (with pairs steps of up to max_difference degrees) """
+    random = mod_random.Random(1)
+    latitude, longitude = random.uniform(-60, 60), random.uniform(-180, 180)
+    points = []
+    for i in range(pairs + 1):
+        points.append(mod_geo.Location(latitude, longitude))
+        latitude = max(-70, min(70, latitude + random.uniform(-max_difference, max_difference)))
+        longitude = (longitude + random.uniform(-max_difference, max_difference) + 180) % 360 - 180
+    return points
+
+
+def main():
+    pairs = int(mod_sys.argv[1]) if len(mod_sys.argv) > 1 else 20000
+    names = sorted(mod_geo.DISTANCE_MODELS)
+
+    print('%s pairs of points' % pairs)
+    print('%-10s %-10s %14s %14s %14s %14s' % ('distance', 'model', 'max error', 'mean error',
+                                               'pairs/s', 'batch pairs/s'))
+    for description, max_difference in SCALES:
+        points = generate_points(pairs, max_difference)
+        geometry = mod_geo.get_geometry(points)
+        exact = mod_geo.DISTANCE_MODELS['vincenty'].distances(geometry)
+        for name in names:
+            model = mod_geo.DISTANCE_MODELS[name]
+
+            start = mod_time.time()
+            for i in range(1, len(points)):
+                model.distance(points[i].latitude, points[i].longitude, None,
+                               points[i - 1].latitude, points[i - 1].longitude, None)
+            single_seconds = mod_time.time() - start
+
+            geometry.computed_distances.clear()
+            start = mod_time.time()
+            distances = geometry.distances(distance_model=model)
+            batch_seconds = mod_time.time() - start
+
+            errors = [abs(d - e) / e for d, e in zip(distances, exact) if e]
+            print('%-10s %-10s %13.5f%% %13.5f%% %14d %14d' % (
+                description, name, 100 * max(errors), 100 * sum(errors) / len(errors),
+                pairs / single_seconds, pairs / max(batch_seconds, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""
+Deterministic generator of synthetic GPX tracks.
+
+The same parameters (and seed) always give the same points, so the
+generated files can be used to compare benchmark results between
+versions. Points are a random walk (about 1 point per second and 50m
+between points) with optional Garmin TrackPointExtension extensions
+(heart rate, cadence and temperature), gaps (pauses which start a new
+segment) and GPS noise.
+
+Usage:
+
+    python benchmarks/generator.py [options] output.gpx
+"""
+
+from __future__ import print_function
+
+import argparse as mod_argparse
+import datetime as mod_datetime
+import io as mod_io
+import math as mod_math
+import os as mod_os
+import random as mod_random
+import sys as mod_sys
+
+mod_sys.path.insert(0, mod_os.path.join(mod_os.path.dirname(mod_os.path.abspath(__file__)), '..'))
+
+import gpxpy.gpx as mod_gpx
+
+try:
+    import lxml.etree as mod_etree
+except ImportError:
+    import xml.etree.ElementTree as mod_etree
+
+TRACK_POINT_EXTENSION_NAMESPACE = 'http://www.garmin.com/xmlschemas/TrackPointExtension/v1'
+
+START_TIME = mod_datetime.datetime(2020, 1, 1)
+
+# Length of the pause at every gap:
+GAP = mod_datetime.timedelta(minutes=10)
+
+
+def generate_points(tracks_no, points_no, extensions=False, gaps=0, noise=0, seed=1):
+    """
+    Yield (track_no, segment_no, latitude, longitude, elevation, time,
+    extension_values) for every point. extension_values is a (heart rate,
+    cadence, temperature) tuple or None.
+
+    Parameters
+    ----------
+    tracks_no : int
+    points_no : int
+        Points per track
+    extensions : bool
+        Generate extension values
+    gaps : int
+        Number of gaps (10 minute pauses, every one starts a new segment)
+        per track
+    noise : float
+        Standard deviation (meters) of the noise added to the coordinates
+        and elevations
+    seed : int
+    """
+    random = mod_random.Random(seed)
+    noise_degrees = noise / (2 * mod_math.pi * 6378137. / 360)
+    time = START_TIME
+
+    for track_no in range(tracks_no):
+        latitude, longitude, elevation = 45 + random.random(), 14 + random.random(), random.random() * 1000
+        heart_rate, cadence, temperature = 120., 80., 20.
+        gap_every = points_no // (gaps + 1) if gaps else None
+        segment_no = 0
+        for point_no in range(points_no):
+            latitude += (random.random() - 0.5) / 1000
+            longitude += (random.random() - 0.5) / 1000
+            elevation += random.random() - 0.5
+            if gap_every and point_no and point_no % gap_every == 0 and segment_no < gaps:
+                segment_no += 1
+                time += GAP
+            point_latitude, point_longitude, point_elevation = latitude, longitude, elevation
+            if noise:
+                point_latitude += random.gauss(0, noise_degrees)
+                point_longitude += random.gauss(0, noise_degrees)
+                point_elevation += random.gauss(0, noise)
+            extension_values = None
+            if extensions:
+                heart_rate = min(max(heart_rate + random.random() * 4 - 2, 60), 200)
+                cadence = min(max(cadence + random.random() * 6 - 3, 0), 120)
+                temperature += (random.random() - 0.5) / 10
+                extension_values = int(heart_rate), int(cadence), round(temperature, 1)
+            yield (track_no, segment_no, point_latitude, point_longitude, point_elevation,
+                   time + mod_datetime.timedelta(seconds=point_no), extension_values)
+        time += mod_datetime.timedelta(seconds=points_no)
+
+
+def generate_gpx(tracks_no, points_no, extensions=False, gaps=0, noise=0, seed=1):
+    """ GPX with the generated points (see generate_points()) """
+    gpx = mod_gpx.GPX()
+    if extensions:
+        gpx.nsmap['gpxtpx'] = TRACK_POINT_EXTENSION_NAMESPACE
+    track = segment = None
+    for track_no, segment_no, latitude, longitude, elevation, time, extension_values in \
+            generate_points(tracks_no, points_no, extensions, gaps, noise, seed):
+        if track is None or track_no != len(gpx.tracks) - 1:
+            track = mod_gpx.GPXTrack(name='Track %s' % track_no)
+            gpx.tracks.append(track)
+        if not track.segments or segment_no != len(track.segments) - 1:
+            segment = mod_gpx.GPXTrackSegment()
+            track.segments.append(segment)
+        point = mod_gpx.GPXTrackPoint(latitude, longitude, elevation=elevation, time=time)
+        if extension_values:
+            point.extensions.append(_extension(extension_values))
+        segment.points.append(point)
+    return gpx
+
+
+def _extension(extension_values):
+    element = mod_etree.Element('{%s}TrackPointExtension' % TRACK_POINT_EXTENSION_NAMESPACE)
+    for tag, value in zip(('hr', 'cad', 'atemp'), extension_values):
+        mod_etree.SubElement(element, '{%s}%s' % (TRACK_POINT_EXTENSION_NAMESPACE, tag)).text = str(value)
+    return element
+
+
+def write_gpx(output, tracks_no, points_no, version='1.1', extensions=False, gaps=0, noise=0, seed=1):
+    """
+    Write the generated points (see generate_points()) as a GPX document
+    to output (a text file object) without building GPX objects, so that
+    big files can be generated quickly. Extensions are only written in GPX
+    1.1 documents.
+    """
+    extensions = extensions and version == '1.1'
+    write = output.write
+    write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    write('<gpx version="%s" creator="gpxpy benchmarks" xmlns="http://www.topografix.com/GPX/%s"'
+          % (version, version.replace('.', '/')))
+    if extensions:
+        write(' xmlns:gpxtpx="%s"' % TRACK_POINT_EXTENSION_NAMESPACE)
+    write('>\n')
+
+    previous = None
+    for track_no, segment_no, latitude, longitude, elevation, time, extension_values in \
+            generate_points(tracks_no, points_no, extensions, gaps, noise, seed):
+        if previous is None or previous != (track_no, segment_no):
+            if previous is not None:
+                write('</trkseg>\n')
+            if previous is None or previous[0] != track_no:
+                if previous is not None:
+                    write('</trk>\n')
+                write('<trk>\n<name>Track %s</name>\n' % track_no)
+            write('<trkseg>\n')
+            previous = track_no, segment_no
+        write('<trkpt lat="%.7f" lon="%.7f"><ele>%.2f</ele><time>%sZ</time>'
+              % (latitude, longitude, elevation, time.isoformat()))
+        if extension_values:
+            write('<extensions><gpxtpx:TrackPointExtension><gpxtpx:hr>%s</gpxtpx:hr>'
+                  '<gpxtpx:cad>%s</gpxtpx:cad><gpxtpx:atemp>%s</gpxtpx:atemp>'
+                  '</gpxtpx:TrackPointExtension></extensions>' % extension_values)
+        write('</trkpt>\n')
+    if previous is not None:
+        write('</trkseg>\n</trk>\n')
+    write('</gpx>\n')
+
+
+def generate_xml(tracks_no, points_no, version='1.1', extensions=False, gaps=0, noise=0, seed=1):
+    """ The GPX document written by write_gpx() as a string """
+    output = mod_io.StringIO()
+    write_gpx(output, tracks_no, points_no, version, extensions, gaps, noise, seed)
+    return output.getvalue()
+
+
+def main():
+    parser = mod_argparse.ArgumentParser(description='Generate a synthetic GPX file')
+    parser.add_argument('output', help='output file (or directory with --files)')
+    parser.add_argument('--tracks', type=int, default=1)
+    parser.add_argument('--points', type=int, default=10000, help='points per track')
+    parser.add_argument('--gpx-version', default='1.1', choices=('1.0', '1.1'))
+    parser.add_argument('--extensions', action='store_true', help='Garmin TrackPointExtension values')
+    parser.add_argument('--gaps', type=int, default=0, help='pauses (new segments) per track')
+    parser.add_argument('--noise', type=float, default=0, help='GPS noise (meters)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--files', type=int, default=None,
+                        help='write this many files (with seeds seed, seed + 1, ...) into the output directory')
+    args = parser.parse_args()
+
+    if args.files is None:
+        outputs = [(args.output, args.seed)]
+    else:
+        if not mod_os.path.isdir(args.output):
+            mod_os.makedirs(args.output)
+        outputs = [(mod_os.path.join(args.output, '%05d.gpx' % file_no), args.seed + file_no)
+                   for file_no in range(args.files)]
+    for file_name, seed in outputs:
+        with mod_io.open(file_name, 'w', encoding='utf-8') as f:
+            write_gpx(f, args.tracks, args.points, args.gpx_version, args.extensions, args.gaps,
+                      args.noise, seed)
+
+
+if __name__ == '__main__':
+    main()
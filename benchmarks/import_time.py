@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Startup time: the wall time of new Python processes importing gpxpy
+modules (and doing a first small parse), best of --repeat runs. The time
+of an empty Python process is reported for comparison.
+
+Run it twice after changing the modules: the first run also writes the
+.pyc files. With PYTHONDONTWRITEBYTECODE set, the modules are compiled
+in every process, so the times are much bigger.
+
+Usage:
+
+    python benchmarks/import_time.py [--repeat 20] [--json import-time.json]
+"""
+
+from __future__ import print_function
+
+import argparse as mod_argparse
+import json as mod_json
+import os as mod_os
+import subprocess as mod_subprocess
+import sys as mod_sys
+import timeit as mod_timeit
+
+mod_sys.path.insert(0, mod_os.path.join(mod_os.path.dirname(mod_os.path.abspath(__file__)), '..'))
+
+from benchmarks import run as mod_run
+
+ROOT = mod_os.path.abspath(mod_os.path.join(mod_os.path.dirname(mod_os.path.abspath(__file__)), '..'))
+
+# (name, statement) timed in new processes:
+STATEMENTS = [
+    ('python', 'pass'),
+    ('import gpxpy', 'import gpxpy'),
+    ('import gpxpy.gpx', 'import gpxpy.gpx'),
+    ('import gpxpy.parser', 'import gpxpy.parser'),
+    ('first parse', 'import gpxpy; gpxpy.parse(%r)' % (
+        '<gpx version="1.1"><trk><trkseg><trkpt lat="1" lon="2"><time>2020-01-01T00:00:00Z</time></trkpt>'
+        '</trkseg></trk></gpx>')),
+]
+
+
+def measure(statement):
+    """ Seconds of a new Python process (started in the repository root) running statement """
+    start = mod_timeit.default_timer()
+    mod_subprocess.check_call([mod_sys.executable, '-c', statement], cwd=ROOT)
+    return mod_timeit.default_timer() - start
+
+
+def main():
+    parser = mod_argparse.ArgumentParser(description='gpxpy import time')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', help='save the results to this file')
+    parser.add_argument('--compare', help='compare with the results saved (with --json) in this file')
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = mod_json.load(f)['results']
+
+    results = {}
+    for name, statement in STATEMENTS:
+        times = sorted(measure(statement) for i in range(args.repeat))
+        results[name] = {'best': times[0], 'median': times[len(times) // 2]}
+        line = '%-22s best %8.2fms  median %8.2fms' % (name, times[0] * 1000, times[len(times) // 2] * 1000)
+        if previous and name in previous and times[0]:
+            line += '  %5.2fx' % (previous[name]['best'] / times[0])
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            result = mod_run.metadata(args)
+            result['results'] = results
+            mod_json.dump(result, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
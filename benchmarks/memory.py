@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Memory benchmarks (with tracemalloc, Python 3.4+):
+
+ * peak and retained memory of gpxpy.parse() of a synthetic file (see
+   generator.py)
+ * bytes per GPXTrackPoint, GPXWaypoint and GPXRoutePoint (with
+   coordinates, elevation and time)
+ * the gpxpy functions allocating the memory retained by the parsed GPX
+
+With --json the results are saved like run.py does (--compare shows the
+differences from saved results).
+
+Usage:
+
+    python benchmarks/memory.py [--points 1000000] [--extensions] [--json memory.json]
+"""
+
+from __future__ import print_function
+
+import argparse as mod_argparse
+import ast as mod_ast
+import datetime as mod_datetime
+import gc as mod_gc
+import json as mod_json
+import os as mod_os
+import sys as mod_sys
+import tempfile as mod_tempfile
+import tracemalloc as mod_tracemalloc
+
+mod_sys.path.insert(0, mod_os.path.join(mod_os.path.dirname(mod_os.path.abspath(__file__)), '..'))
+
+import gpxpy as mod_gpxpy
+import gpxpy.gpx as mod_gpx
+
+from benchmarks import generator as mod_generator
+from benchmarks import run as mod_run
+
+GPXPY_DIRECTORY = mod_os.path.dirname(mod_os.path.abspath(mod_gpxpy.__file__))
+
+
+def measure(function):
+    """
+    Returns (result, retained bytes, peak bytes) of function(). Retained
+    is the memory still allocated (by the result) after the call.
+    """
+    mod_gc.collect()
+    mod_tracemalloc.clear_traces()
+    start, _ = mod_tracemalloc.get_traced_memory()
+    if hasattr(mod_tracemalloc, 'reset_peak'):
+        # Python 3.9+ (before, the peak is the peak since clear_traces()):
+        mod_tracemalloc.reset_peak()
+    result = function()
+    mod_gc.collect()
+    current, peak = mod_tracemalloc.get_traced_memory()
+    return result, current - start, peak - start
+
+
+def bytes_per_point(classs, count):
+    """ Retained bytes per point of classs (with elevation and time) """
+    time = mod_generator.START_TIME
+
+    def create():
+        return [classs(45. + i / 1e6, 14. + i / 1e6, elevation=100. + i, time=time + mod_datetime.timedelta(seconds=i))
+                for i in range(count)]
+    points, retained, _ = measure(create)
+    # Without the list itself:
+    return (retained - mod_sys.getsizeof(points)) / float(count)
+
+
+class FunctionNames:
+    """ Names of the functions (Class.method) of the gpxpy modules by line """
+
+    def __init__(self):
+        self.names = {}
+
+    def get(self, file_name, line_no):
+        if file_name not in self.names:
+            self.names[file_name] = self._read(file_name)
+        for start, end, name in self.names[file_name]:
+            if start <= line_no <= end:
+                return name
+        return '<module>'
+
+    def _read(self, file_name):
+        """ (start line, end line, name) of the functions, innermost first """
+        with open(file_name, 'rb') as f:
+            tree = mod_ast.parse(f.read(), file_name)
+        result = []
+
+        def visit(node, prefix):
+            for child in mod_ast.iter_child_nodes(node):
+                if isinstance(child, (mod_ast.FunctionDef, mod_ast.ClassDef)):
+                    name = prefix + child.name
+                    visit(child, name + '.')
+                    if isinstance(child, mod_ast.FunctionDef):
+                        end = getattr(child, 'end_lineno', None) or max(
+                            getattr(descendant, 'lineno', child.lineno) for descendant in mod_ast.walk(child))
+                        result.append((child.lineno, end, name))
+                else:
+                    visit(child, prefix)
+        visit(tree, '')
+        result.sort(key=lambda function: function[1] - function[0])
+        return result
+
+
+def allocations_by_function(snapshot, limit):
+    """
+    Retained bytes and blocks grouped by the innermost gpxpy function in the
+    traceback of the allocation, the biggest first
+    """
+    names = FunctionNames()
+    file_names = {}
+    result = {}
+    for statistic in snapshot.statistics('traceback'):
+        key = '<outside gpxpy>'
+        # Frames are ordered from the oldest:
+        for frame in reversed(statistic.traceback):
+            if frame.filename not in file_names:
+                file_names[frame.filename] = mod_os.path.abspath(frame.filename)
+            file_name = file_names[frame.filename]
+            if file_name.startswith(GPXPY_DIRECTORY + mod_os.sep):
+                key = '%s:%s' % (mod_os.path.relpath(file_name, mod_os.path.dirname(GPXPY_DIRECTORY)),
+                                 names.get(file_name, frame.lineno))
+                break
+        size, count = result.get(key, (0, 0))
+        result[key] = size + statistic.size, count + statistic.count
+    return sorted(result.items(), key=lambda item: -item[1][0])[:limit]
+
+
+def main():
+    parser = mod_argparse.ArgumentParser(description='gpxpy memory benchmarks')
+    parser.add_argument('--tracks', type=int, default=1)
+    parser.add_argument('--points', type=int, default=100000, help='points per track')
+    parser.add_argument('--gpx-version', default='1.1', choices=('1.0', '1.1'))
+    parser.add_argument('--extensions', action='store_true', help='Garmin TrackPointExtension values')
+    parser.add_argument('--gaps', type=int, default=0, help='pauses (new segments) per track')
+    parser.add_argument('--noise', type=float, default=0, help='GPS noise (meters)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--objects', type=int, default=100000, help='points created for the bytes per point')
+    parser.add_argument('--top', type=int, default=15, help='functions listed')
+    parser.add_argument('--traceback-limit', type=int, default=4,
+                        help='frames stored for every allocation (more are slower but find gpxpy functions '
+                             'called from deeper in the standard library)')
+    parser.add_argument('--json', help='save the results to this file')
+    parser.add_argument('--compare', help='compare with the results saved (with --json) in this file')
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = mod_json.load(f)['results']
+
+    f = mod_tempfile.NamedTemporaryFile(mode='w', suffix='.gpx', delete=False)
+    try:
+        with f:
+            mod_generator.write_gpx(f, args.tracks, args.points, args.gpx_version, args.extensions,
+                                    args.gaps, args.noise, args.seed)
+        file_size = mod_os.path.getsize(f.name)
+
+        def parse():
+            with open(f.name) as gpx_file:
+                return mod_gpxpy.parse(gpx_file)
+
+        mod_tracemalloc.start(args.traceback_limit)
+        gpx, retained, peak = measure(parse)
+        snapshot = mod_tracemalloc.take_snapshot()
+        points_no = gpx.get_track_points_no()
+        results = {
+            'file_bytes': file_size,
+            'parse_retained_bytes': retained,
+            'parse_peak_bytes': peak,
+            'parse_retained_bytes_per_point': retained / float(points_no),
+            'parse_peak_bytes_per_point': peak / float(points_no),
+        }
+        del gpx
+        for classs in mod_gpx.GPXTrackPoint, mod_gpx.GPXWaypoint, mod_gpx.GPXRoutePoint:
+            results['bytes_per_%s' % classs.__name__] = bytes_per_point(classs, args.objects)
+        mod_tracemalloc.stop()
+    finally:
+        mod_os.remove(f.name)
+
+    print('%s points, %s bytes file' % (points_no, file_size))
+    for name in sorted(results):
+        line = '%-40s %14.1f' % (name, results[name])
+        if previous and name in previous:
+            line += '  %+6.1f%%' % ((results[name] - previous[name]) * 100. / previous[name])
+        print(line)
+
+    print()
+    print('Retained by the parsed GPX, by function:')
+    functions = allocations_by_function(snapshot, args.top)
+    for key, (size, count) in functions:
+        print('%12s bytes %10s blocks  %s' % (size, count, key))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            result = mod_run.metadata(args)
+            result['results'] = results
+            result['functions'] = dict((key, {'bytes': size, 'blocks': count}) for key, (size, count) in functions)
+            mod_json.dump(result, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
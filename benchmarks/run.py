@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmarks of the main gpxpy operations on synthetic tracks (see
+generator.py). Every benchmark is repeated and the best and median times
+are reported; with --json the results (and the machine, Python and
+parameters) are saved, so that they can be compared with --compare.
+
+Usage:
+
+    python benchmarks/run.py [--points 1000000] [--extensions] [--json results.json]
+    python benchmarks/run.py --compare old-results.json
+"""
+
+from __future__ import print_function
+
+import argparse as mod_argparse
+import datetime as mod_datetime
+import json as mod_json
+import os as mod_os
+import platform as mod_platform
+import subprocess as mod_subprocess
+import sys as mod_sys
+import time as mod_time
+
+mod_sys.path.insert(0, mod_os.path.join(mod_os.path.dirname(mod_os.path.abspath(__file__)), '..'))
+
+import gpxpy as mod_gpxpy
+import gpxpy.geo as mod_geo
+
+from benchmarks import generator as mod_generator
+
+
+def benchmark_parse(data):
+    mod_gpxpy.parse(data.xml)
+
+
+def benchmark_parse_files(data):
+    for xml in data.files:
+        mod_gpxpy.parse(xml)
+
+
+def benchmark_to_xml(data):
+    data.gpx.to_xml(data.args.gpx_version)
+
+
+def benchmark_length_3d(data):
+    data.gpx.length_3d()
+
+
+def benchmark_get_moving_data(data):
+    data.gpx.get_moving_data()
+
+
+def benchmark_simplify(data, gpx):
+    gpx.simplify()
+
+
+def benchmark_smooth(data, gpx):
+    for track in gpx.tracks:
+        for segment in track.segments:
+            segment.smooth(remove_extremes=True)
+
+
+def benchmark_get_nearest_location(data):
+    for location in data.locations:
+        data.gpx.get_nearest_location(location)
+
+
+def benchmark_clone(data):
+    data.gpx.clone()
+
+
+# (name, function, True if it changes the GPX and needs a fresh clone):
+BENCHMARKS = [
+    ('parse', benchmark_parse, False),
+    ('parse_files', benchmark_parse_files, False),
+    ('to_xml', benchmark_to_xml, False),
+    ('length_3d', benchmark_length_3d, False),
+    ('get_moving_data', benchmark_get_moving_data, False),
+    ('simplify', benchmark_simplify, True),
+    ('smooth', benchmark_smooth, True),
+    ('get_nearest_location', benchmark_get_nearest_location, False),
+    ('clone', benchmark_clone, False),
+]
+
+
+class BenchmarkData:
+    """ The documents and objects used by the benchmarks """
+
+    def __init__(self, args):
+        self.args = args
+        generator_args = dict(version=args.gpx_version, extensions=args.extensions, gaps=args.gaps,
+                              noise=args.noise)
+        self.xml = mod_generator.generate_xml(args.tracks, args.points, seed=args.seed, **generator_args)
+        self.gpx = mod_gpxpy.parse(self.xml)
+        self.files = [mod_generator.generate_xml(1, args.file_points, seed=args.seed + file_no, **generator_args)
+                      for file_no in range(args.files)]
+        points = [point for point, _, _, _, _ in self.gpx.get_points_data()]
+        self.locations = [mod_geo.Location(points[i].latitude + 0.001, points[i].longitude)
+                          for i in range(0, len(points), max(1, len(points) // args.locations))]
+
+
+def run(function, data, mutates, repeat):
+    """ Times (seconds) of repeat calls of function """
+    times = []
+    for i in range(repeat):
+        arguments = (data, data.gpx.clone()) if mutates else (data, )
+        start = mod_time.time()
+        function(*arguments)
+        times.append(mod_time.time() - start)
+    return times
+
+
+def git_revision():
+    try:
+        return mod_subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                           cwd=mod_os.path.dirname(mod_os.path.abspath(__file__)),
+                                           stderr=mod_subprocess.STDOUT).decode('utf-8').strip()
+    except Exception:
+        return None
+
+
+def metadata(args):
+    """ Revision, Python, platform and arguments saved with the results """
+    return {
+        'date': mod_datetime.datetime.utcnow().isoformat(),
+        'revision': git_revision(),
+        'python': mod_sys.version,
+        'platform': mod_platform.platform(),
+        'arguments': dict((key, value) for key, value in vars(args).items() if key not in ('json', 'compare')),
+    }
+
+
+def main():
+    parser = mod_argparse.ArgumentParser(description='gpxpy benchmarks')
+    parser.add_argument('--tracks', type=int, default=1)
+    parser.add_argument('--points', type=int, default=100000, help='points per track')
+    parser.add_argument('--gpx-version', default='1.1', choices=('1.0', '1.1'))
+    parser.add_argument('--extensions', action='store_true', help='Garmin TrackPointExtension values')
+    parser.add_argument('--gaps', type=int, default=0, help='pauses (new segments) per track')
+    parser.add_argument('--noise', type=float, default=0, help='GPS noise (meters)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--files', type=int, default=1000, help='number of files for parse_files')
+    parser.add_argument('--file-points', type=int, default=100, help='points per file for parse_files')
+    parser.add_argument('--locations', type=int, default=10, help='locations for get_nearest_location')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', nargs='+', choices=[name for name, _, _ in BENCHMARKS],
+                        help='run only these benchmarks')
+    parser.add_argument('--json', help='save the results to this file')
+    parser.add_argument('--compare', help='compare with the results saved (with --json) in this file')
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = mod_json.load(f)['results']
+
+    data = BenchmarkData(args)
+    print('%s tracks with %s points (%s bytes), %s files with %s points'
+          % (args.tracks, args.points, len(data.xml), args.files, args.file_points))
+
+    results = {}
+    for name, function, mutates in BENCHMARKS:
+        if args.only and name not in args.only:
+            continue
+        times = sorted(run(function, data, mutates, args.repeat))
+        results[name] = {'best': times[0], 'median': times[len(times) // 2], 'times': times}
+        line = '%-22s best %8.4fs  median %8.4fs' % (name, times[0], times[len(times) // 2])
+        if previous and name in previous:
+            line += '  %5.2fx' % (previous[name]['best'] / times[0])
+        print(line)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            result = metadata(args)
+            result['results'] = results
+            mod_json.dump(result, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Microbenchmark of the segment-level distance computations: number of
+math.cos() calls and times of the segment methods.
+
+Usage:
+
+    python benchmarks/segment_geometry.py [points]
+"""
+
+from __future__ import print_function
+
+import math as mod_math
+import os as mod_os
+import sys as mod_sys
+import time as mod_time
+
+mod_sys.path.insert(0, mod_os.path.join(mod_os.path.dirname(mod_os.path.abspath(__file__)), '..'))
+
+import gpxpy.geo as mod_geo
+import gpxpy.gpx as mod_gpx
+
+from benchmarks.generator import generate_gpx
+
+
+class CountingMath:
+    """ The math module, counting calls of the transcendental functions """
+
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        function = getattr(mod_math, name)
+        if name not in ('cos', 'sin', 'atan2', 'atan'):
+            return function
+
+        def counted(*args):
+            self.calls += 1
+            return function(*args)
+        return counted
+
+
+def main():
+    points_no = int(mod_sys.argv[1]) if len(mod_sys.argv) > 1 else 20000
+    segment = generate_gpx(1, points_no).tracks[0].segments[0]
+    location = mod_geo.Location(segment.points[points_no // 2].latitude + 0.001,
+                                segment.points[points_no // 2].longitude)
+
+    operations = [
+        ('length_2d', lambda segment: segment.length_2d()),
+        ('length_3d', lambda segment: segment.length_3d()),
+        ('get_moving_data', lambda segment: segment.get_moving_data()),
+        ('get_nearest_location x 5', lambda segment: [segment.get_nearest_location(location) for i in range(5)]),
+        ('smooth', lambda segment: segment.smooth(horizontal=True, remove_extremes=True)),
+        ('reduce_points', lambda segment: segment.reduce_points(2)),
+    ]
+
+    # The operations are run in this order on the same segment, once
+    # counting the calls and once measuring the times:
+    math = CountingMath()
+    counted_segment = segment.clone()
+    calls = []
+    mod_geo.mod_math = math
+    try:
+        for name, operation in operations:
+            math.calls = 0
+            operation(counted_segment)
+            calls.append(math.calls)
+    finally:
+        mod_geo.mod_math = mod_math
+
+    # Best of 5 runs:
+    times = [float('inf')] * len(operations)
+    for i in range(5):
+        timed_segment = segment.clone()
+        for operation_no, (name, operation) in enumerate(operations):
+            start = mod_time.time()
+            operation(timed_segment)
+            times[operation_no] = min(times[operation_no], mod_time.time() - start)
+
+    print('%s points' % points_no)
+    for (name, operation), operation_calls, seconds in zip(operations, calls, times):
+        print('%-26s %8s transcendental calls %6.3fs' % (name, operation_calls, seconds))
+
+if __name__ == '__main__':
+    main()
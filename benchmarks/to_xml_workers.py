@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of GPX.to_xml(workers=...) for different numbers of worker
+processes.
+
+Usage:
+
+    python benchmarks/to_xml_workers.py [tracks] [points_per_track]
+"""
+
+from __future__ import print_function
+
+import multiprocessing as mod_multiprocessing
+import os as mod_os
+import sys as mod_sys
+import time as mod_time
+
+mod_sys.path.insert(0, mod_os.path.join(mod_os.path.dirname(mod_os.path.abspath(__file__)), '..'))
+
+from benchmarks.generator import generate_gpx
+
+
+def main():
+    tracks_no = int(mod_sys.argv[1]) if len(mod_sys.argv) > 1 else 100
+    points_no = int(mod_sys.argv[2]) if len(mod_sys.argv) > 2 else 2000
+
+    gpx = generate_gpx(tracks_no, points_no)
+    print('%s tracks with %s points, %s cpus' % (tracks_no, points_no, mod_multiprocessing.cpu_count()))
+
+    workers_counts = [1]
+    while workers_counts[-1] < max(2, mod_multiprocessing.cpu_count()):
+        workers_counts.append(workers_counts[-1] * 2)
+
+    expected = None
+    for workers in workers_counts:
+        start = mod_time.time()
+        xml = gpx.to_xml(workers=workers)
+        seconds = mod_time.time() - start
+        if expected is None:
+            expected = xml
+            sequential_seconds = seconds
+        assert xml == expected, 'Different output with %s workers' % workers
+        print('workers=%-3s %6.2fs  %4.2fx' % (workers, seconds, sequential_seconds / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -15,7 +15,9 @@
 # limitations under the License.
 
 
-def parse(xml_or_file, version = None):
+def parse(xml_or_file, version = None, extension_values=None, fields=None,
+          tracks=None, routes=None, waypoints=None, bounds=None, time_bounds=None,
+          stats=None):
     """
     Parse xml (string) or file object. This is just an wrapper for
     GPXParser.parse() function.
@@ -27,10 +29,29 @@ def parse(xml_or_file, version = None):
 
     version may be '1.0', '1.1' or None (then it will be read from the gpx
     xml node if possible, if not then version 1.0 will be used).
+
+    extension_values may be a list of track point extension tags (for
+    example ['hr', 'cad']) to be read directly into
+    GPXTrackPoint.extension_values, see GPXParser.parse().
+
+    fields may be a set of point field names (for example {'latitude',
+    'longitude', 'time'}) or a profile name ('geometry' or 'full'). Only
+    those fields of waypoints, route and track points will be parsed.
+
+    tracks, routes and waypoints may be an index, a name or a list of
+    indexes and names of the elements to be parsed. bounds and time_bounds
+    skip elements outside the given area or time interval. Skipped
+    elements are never loaded into GPX objects, see GPXParser.parse().
+
+    stats may be a parser.GPXParseStats, it will be filled with the time
+    of every parsing phase and the numbers of bytes, XML elements, points,
+    times and extensions.
     """
 
     from . import parser as mod_parser
 
-    parser = mod_parser.GPXParser(xml_or_file)
+    parser = mod_parser.GPXParser(xml_or_file, stats=stats)
 
-    return parser.parse(version)
+    return parser.parse(version, extension_values=extension_values, fields=fields,
+                        tracks=tracks, routes=routes, waypoints=waypoints,
+                        bounds=bounds, time_bounds=time_bounds)
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Tomo Krajina
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Parsing and writing GPX in asyncio applications (Python 3.5+, setup.py
+doesn't install this module on older versions):
+
+    gpx = await gpxpy.aio.parse(reader)
+    await gpxpy.aio.write_xml(gpx, writer)
+
+The streams are read and written in chunks, the parsing and the
+serialization of every chunk run in an executor, so the event loop is
+never blocked for long.
+"""
+
+import asyncio as mod_asyncio
+import inspect as mod_inspect
+
+from . import parser as mod_parser
+
+# Bytes read from the stream (and parsed) in one step:
+CHUNK_SIZE = 64 * 1024
+
+# Points serialized in one step:
+POINTS_PER_CHUNK = 10000
+
+
+def _get_loop():
+    return getattr(mod_asyncio, 'get_running_loop', mod_asyncio.get_event_loop)()
+
+
+async def parse(stream, version=None, extension_values=None, fields=None,
+                chunk_size=CHUNK_SIZE, executor=None):
+    """
+    Parse the GPX read from an async stream.
+
+    Args:
+        stream: object with a coroutine read(n) returning bytes (for
+            example an asyncio.StreamReader), an empty result is the end
+        version, extension_values, fields: see GPXParser.parse()
+        chunk_size: number of bytes read and parsed in one step
+        executor: concurrent.futures executor for the parsing (None for
+            the default executor of the loop)
+
+    Returns:
+        The GPX object
+
+    Raises:
+        GPXXMLSyntaxException: the XML is invalid
+        GPXException: the incremental parser is not available (it requires
+            lxml or Python 3.4+)
+    """
+    loop = _get_loop()
+    parser = mod_parser.GPXFollowParser(version=version, extension_values=extension_values,
+                                        fields=fields)
+    while True:
+        data = await stream.read(chunk_size)
+        if not data:
+            break
+        await loop.run_in_executor(executor, parser.feed, data)
+    return await loop.run_in_executor(executor, parser.close)
+
+
+async def write_xml(gpx, stream, version=None, prettyprint=True, precision=None,
+                    points_per_chunk=POINTS_PER_CHUNK, executor=None):
+    """
+    Write the XML of gpx.to_xml() into an async stream.
+
+    Args:
+        gpx: the GPX object, it must not be changed until the end
+        stream: an asyncio.StreamWriter (write() and the coroutine
+            drain()) or an object with a coroutine write(data); the XML is
+            written as UTF-8 bytes
+        version, prettyprint, precision: see GPX.to_xml()
+        points_per_chunk: number of points serialized in one step, see
+            GPX.to_xml_chunks()
+        executor: concurrent.futures executor for the serialization (None
+            for the default executor of the loop)
+    """
+    loop = _get_loop()
+    chunks = gpx.to_xml_chunks(version, prettyprint, precision, points_per_chunk)
+    while True:
+        chunk = await loop.run_in_executor(executor, next, chunks, None)
+        if chunk is None:
+            break
+        if not chunk:
+            continue
+        result = stream.write(chunk.encode('utf-8'))
+        if mod_inspect.isawaitable(result):
+            await result
+        elif hasattr(stream, 'drain'):
+            await stream.drain()
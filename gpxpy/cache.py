@@ -0,0 +1,260 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Tomo Krajina
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Cache of parsed GPX objects, for services parsing the same files again
+and again:
+
+    cache = gpxpy.cache.GPXCache(max_points=5000000, directory='/var/cache/gpx')
+    gpx = cache.parse('track.gpx')
+
+Parsed GPX objects are kept in memory (least recently used ones are
+evicted when the points or bytes limit is exceeded) and, optionally,
+pickled in a directory (so that other processes and restarts can reuse
+them).
+"""
+
+import collections as mod_collections
+import datetime as mod_datetime
+import hashlib as mod_hashlib
+import logging as mod_logging
+import os as mod_os
+import pickle as mod_pickle
+import tempfile as mod_tempfile
+import threading as mod_threading
+
+from . import utils as mod_utils
+
+log = mod_logging.getLogger(__name__)
+
+# Version of the pickled files format (part of their names):
+CACHE_FORMAT_VERSION = 3
+
+PICKLE_PROTOCOL = 2
+
+GPXCacheStats = mod_collections.namedtuple(
+    'GPXCacheStats',
+    ('hits', 'disk_hits', 'misses', 'evictions', 'entries', 'points', 'bytes'))
+
+# parse() argument values with a repr() depending only on the value:
+_SIMPLE_TYPES = (type(None), bool, int, type(2 ** 64), float, str, bytes, type(u''))
+
+# In memory cache entries:
+_Entry = mod_collections.namedtuple('_Entry', ('gpx', 'points', 'bytes'))
+
+
+class GPXCache:
+    """
+    LRU cache of parsed GPX objects.
+
+    Files are cached by their path, modification time and size (a changed
+    file is parsed again) or, with key='hash', by the hash of their
+    content (identical files are parsed once). XML strings and file
+    objects are always cached by the hash of the content. The parse
+    arguments are part of the key.
+
+    Parameters
+    ----------
+    max_points : int
+        Maximum number of points (waypoints, route and track points) of all
+        the GPX objects in memory, None for no limit
+    max_bytes : int
+        Maximum size of the XML of all the GPX objects in memory, None for
+        no limit
+    directory : str
+        If given, parsed GPX objects are pickled there (and read from there
+        after they are evicted from memory or in other processes). Old
+        files are never deleted by the cache.
+    key : str
+        'mtime' (default) or 'hash', how files are identified
+    clone : bool
+        If True (default) parse() returns a clone (see GPX.clone(), which
+        is much faster than parsing) so the caller may change it. If False
+        the cached GPX object itself is returned and it must not be
+        changed.
+    """
+
+    def __init__(self, max_points=1000000, max_bytes=None, directory=None, key='mtime', clone=True):
+        if key not in ('mtime', 'hash'):
+            raise ValueError('Invalid key: %s' % key)
+        self.max_points = max_points
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.key = key
+        self.clone = clone
+
+        self.lock = mod_threading.Lock()
+        self.entries = mod_collections.OrderedDict()
+        self.points = 0
+        self.bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def parse(self, xml_or_file, **kwargs):
+        """
+        Same as gpxpy.parse(xml_or_file, **kwargs), but the parsed GPX is
+        cached. xml_or_file is a file name, a file object or the XML. The
+        stats argument (see parser.GPXParseStats) is filled only on misses.
+        """
+        stats = kwargs.pop('stats', None)
+        key, xml, size = self._key(xml_or_file, kwargs)
+
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.entries[key] = entry
+                self.hits += 1
+        if entry is not None:
+            return self._result(entry.gpx)
+
+        gpx = self._load(key)
+        if gpx is not None:
+            with self.lock:
+                self.disk_hits += 1
+        else:
+            with self.lock:
+                self.misses += 1
+            if xml is None:
+                with open(xml_or_file, 'rb') as f:
+                    xml = f.read()
+            if isinstance(xml, bytes) and mod_utils.PYTHON_VERSION[0] >= '3':
+                xml = xml.decode('utf-8')
+            from . import parser as mod_parser
+            gpx = mod_parser.GPXParser(xml, stats=stats).parse(**kwargs)
+            try:
+                self._save(key, gpx)
+            except Exception as e:
+                log.warning('Cannot save the parsed GPX in %s: %s', self.directory, e)
+
+        self._add(key, gpx, size)
+        return self._result(gpx)
+
+    def get_stats(self):
+        """ Numbers of hits, misses... and size of the cache (GPXCacheStats) """
+        with self.lock:
+            return GPXCacheStats(self.hits, self.disk_hits, self.misses, self.evictions,
+                                 len(self.entries), self.points, self.bytes)
+
+    def clear(self):
+        """ Remove all the GPX objects from memory (pickled files are kept) """
+        with self.lock:
+            self.entries.clear()
+            self.points = 0
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _result(self, gpx):
+        return gpx.clone() if self.clone else gpx
+
+    def _key(self, xml_or_file, kwargs):
+        """ Returns (key, content or None if not read, size) """
+        arguments = repr(sorted((name, _argument_key(value)) for name, value in kwargs.items()))
+        if hasattr(xml_or_file, 'read'):
+            xml_or_file = xml_or_file.read()
+        elif not _is_xml(xml_or_file):
+            path = mod_os.path.abspath(xml_or_file)
+            status = mod_os.stat(path)
+            if self.key == 'mtime':
+                return ('file', path, status.st_mtime, status.st_size, arguments), None, status.st_size
+            with open(path, 'rb') as f:
+                xml_or_file = f.read()
+        content = xml_or_file if isinstance(xml_or_file, bytes) else xml_or_file.encode('utf-8')
+        return ('hash', mod_hashlib.sha1(content).hexdigest(), arguments), xml_or_file, len(content)
+
+    def _add(self, key, gpx, size):
+        points = _count_points(gpx)
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = _Entry(gpx, points, size)
+            self.points += points
+            self.bytes += size
+            # The new entry is kept even if it alone exceeds the limits:
+            while len(self.entries) > 1 and (
+                    (self.max_points is not None and self.points > self.max_points)
+                    or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                _, entry = self.entries.popitem(last=False)
+                self.points -= entry.points
+                self.bytes -= entry.bytes
+                self.evictions += 1
+
+    def _file_name(self, key):
+        digest = mod_hashlib.sha1(mod_utils.make_str(repr(key)).encode('utf-8')).hexdigest()
+        return mod_os.path.join(self.directory, '%s.v%s.pickle' % (digest, CACHE_FORMAT_VERSION))
+
+    def _load(self, key):
+        if not self.directory:
+            return None
+        file_name = self._file_name(key)
+        if not mod_os.path.exists(file_name):
+            return None
+        try:
+            with open(file_name, 'rb') as f:
+                return mod_pickle.load(f)
+        except Exception as e:
+            log.debug('Invalid cache file %s: %s', file_name, e)
+            return None
+
+    def _save(self, key, gpx):
+        if not self.directory:
+            return
+        if not mod_os.path.isdir(self.directory):
+            mod_os.makedirs(self.directory)
+        # Written to a temporary file and renamed, so that other processes
+        # never read a partially written file:
+        descriptor, temporary_file_name = mod_tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with mod_os.fdopen(descriptor, 'wb') as f:
+                mod_pickle.dump(gpx, f, PICKLE_PROTOCOL)
+            mod_os.rename(temporary_file_name, self._file_name(key))
+        except Exception:
+            mod_os.remove(temporary_file_name)
+            raise
+
+
+def _is_xml(xml_or_file_name):
+    return xml_or_file_name.lstrip()[:1] in (b'<', u'<')
+
+
+def _argument_key(value):
+    """
+    Hashable representation of a parse() argument, its repr() depends only
+    on the value (the keys are also a part of the pickled file names)
+    """
+    from . import gpx as mod_gpx
+    if isinstance(value, _SIMPLE_TYPES):
+        return value
+    if isinstance(value, mod_gpx.GPXBounds):
+        return ('GPXBounds', tuple(value))
+    if isinstance(value, mod_datetime.datetime):
+        return ('datetime', value.isoformat())
+    if isinstance(value, (set, frozenset)):
+        return sorted((_argument_key(item) for item in value), key=repr)
+    if isinstance(value, (list, tuple)):
+        return tuple(_argument_key(item) for item in value)
+    raise ValueError('Argument of type %s cannot be a part of the cache key' % type(value).__name__)
+
+
+def _count_points(gpx):
+    result = len(gpx.waypoints)
+    for route in gpx.routes:
+        result += len(route.points)
+    return result + gpx.get_track_points_no()
@@ -14,9 +14,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import array as mod_array
+import collections as mod_collections
+import heapq as mod_heapq
 import logging as mod_logging
 import math as mod_math
 
+from . import instrumentation as mod_instrumentation
 from . import utils as mod_utils
 
 log = mod_logging.getLogger(__name__)
@@ -30,6 +34,10 @@ EARTH_RADIUS = 6378.137 * 1000
 # One degree in meters:
 ONE_DEGREE = (2*mod_math.pi*EARTH_RADIUS) / 360  # ==> 111.319 km
 
+# WGS84 flattening and semi-minor axis (used by the Vincenty distance):
+WGS84_FLATTENING = 1 / 298.257223563
+WGS84_SEMI_MINOR_AXIS = EARTH_RADIUS * (1 - WGS84_FLATTENING)
+
 
 def to_rad(x):
     return x / 180. * mod_math.pi
@@ -41,6 +49,10 @@ def haversine_distance(latitude_1, longitude_1, latitude_2, longitude_2):
 
     Implemented from http://www.movable-type.co.uk/scripts/latlong.html
     """
+    if mod_instrumentation.active[0] and mod_instrumentation.hook('geo.haversine_distance'):
+        return mod_instrumentation.call('geo.haversine_distance', haversine_distance,
+                                        latitude_1, longitude_1, latitude_2, longitude_2)
+
     d_lat = to_rad(latitude_1 - latitude_2)
     d_lon = to_rad(longitude_1 - longitude_2)
     lat1 = to_rad(latitude_1)
@@ -54,35 +66,95 @@ def haversine_distance(latitude_1, longitude_1, latitude_2, longitude_2):
     return d
 
 
-def length(locations=None, _3d=None):
+@mod_instrumentation.counted('geo.vincenty_distance')
+def vincenty_distance(latitude_1, longitude_1, latitude_2, longitude_2, max_iterations=200):
+    """
+    Distance between two points on the WGS84 ellipsoid (Vincenty's inverse
+    formula, accurate to less than a millimeter), expressed in meters. For
+    nearly antipodal points, where the formula doesn't converge, the
+    haversine distance is returned.
+    """
+    reduced_1 = mod_math.atan((1 - WGS84_FLATTENING) * mod_math.tan(to_rad(latitude_1)))
+    reduced_2 = mod_math.atan((1 - WGS84_FLATTENING) * mod_math.tan(to_rad(latitude_2)))
+    result = _vincenty(mod_math.sin(reduced_1), mod_math.cos(reduced_1),
+                       mod_math.sin(reduced_2), mod_math.cos(reduced_2),
+                       to_rad(longitude_2 - longitude_1), max_iterations)
+    if result is None:
+        return haversine_distance(latitude_1, longitude_1, latitude_2, longitude_2)
+    return result
+
+
+def _vincenty(sin_u1, cos_u1, sin_u2, cos_u2, longitude_difference, max_iterations):
+    """ Vincenty's inverse formula with sines and cosines of reduced latitudes (None if not converging) """
+    f = WGS84_FLATTENING
+    lambda_ = longitude_difference
+    for i in range(max_iterations):
+        sin_lambda = mod_math.sin(lambda_)
+        cos_lambda = mod_math.cos(lambda_)
+        sin_sigma = mod_math.sqrt((cos_u2 * sin_lambda) ** 2 +
+                                  (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lambda) ** 2)
+        if sin_sigma == 0:
+            # Same points:
+            return 0.
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lambda
+        sigma = mod_math.atan2(sin_sigma, cos_sigma)
+        sin_alpha = cos_u1 * cos_u2 * sin_lambda / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+        # cos2_alpha is 0 for points on the equator:
+        cos_2sigma_m = cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha if cos2_alpha else 0.
+        c = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+        previous_lambda = lambda_
+        lambda_ = longitude_difference + (1 - c) * f * sin_alpha * \
+            (sigma + c * sin_sigma * (cos_2sigma_m + c * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        if abs(lambda_ - previous_lambda) < 1e-12:
+            break
+    else:
+        return None
+
+    a, b = EARTH_RADIUS, WGS84_SEMI_MINOR_AXIS
+    u2 = cos2_alpha * (a * a - b * b) / (b * b)
+    big_a = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    big_b = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = big_b * sin_sigma * (cos_2sigma_m + big_b / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+        big_b / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    return b * big_a * (sigma - delta_sigma)
+
+
+def length(locations=None, _3d=None, geometry=None, distance_model=None):
     locations = locations or []
     if not locations:
         return 0
     length = 0
+    if geometry is not None:
+        # Geometry of locations:
+        for d in geometry.distances(_3d, distance_model):
+            length += d
+        return length
     for i in range(len(locations)):
         if i > 0:
             previous_location = locations[i - 1]
             location = locations[i]
 
             if _3d:
-                d = location.distance_3d(previous_location)
+                d = location.distance_3d(previous_location, distance_model)
             else:
-                d = location.distance_2d(previous_location)
+                d = location.distance_2d(previous_location, distance_model)
             if d:
                 length += d
     return length
 
 
-def length_2d(locations=None):
+def length_2d(locations=None, geometry=None, distance_model=None):
     """ 2-dimensional length (meters) of locations (only latitude and longitude, no elevation). """
     locations = locations or []
-    return length(locations, False)
+    return length(locations, False, geometry, distance_model)
 
 
-def length_3d(locations=None):
+def length_3d(locations=None, geometry=None, distance_model=None):
     """ 3-dimensional length (meters) of locations (it uses latitude, longitude, and elevation). """
     locations = locations or []
-    return length(locations, True)
+    return length(locations, True, geometry, distance_model)
 
 
 def calculate_max_speed(speeds_and_distances):
@@ -162,7 +234,7 @@ def calculate_uphill_downhill(elevations):
 
 
 def distance(latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elevation_2,
-             haversine=None):
+             haversine=None, latitude_1_cos=None, distance_model=None):
     """
     Distance between two points. If elevation is None compute a 2d distance
 
@@ -172,13 +244,32 @@ def distance(latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elev
     Haversine distance will be used for distant points where elevation makes a
     small difference, so it is ignored. That's because haversine is 5-6 times
     slower than the dummy distance algorithm (which is OK for most GPS tracks).
+
+    latitude_1_cos is the (precomputed, see Geometry) cosine of latitude_1.
+
+    distance_model (a DistanceModel or its name in DISTANCE_MODELS) can be
+    used to compute the distance with another model. The default is the
+    model set with set_distance_model() (the algorithm described above if
+    not set).
     """
+    if mod_instrumentation.active[0] and mod_instrumentation.hook('geo.distance'):
+        return mod_instrumentation.call('geo.distance', distance, latitude_1, longitude_1, elevation_1,
+                                        latitude_2, longitude_2, elevation_2, haversine,
+                                        latitude_1_cos, distance_model)
+
+    if (distance_model is not None or _distance_model is not None) and not haversine:
+        return get_distance_model(distance_model).distance(latitude_1, longitude_1, elevation_1,
+                                                           latitude_2, longitude_2, elevation_2)
 
     # If points too distant -- compute haversine distance:
     if haversine or (abs(latitude_1 - latitude_2) > .2 or abs(longitude_1 - longitude_2) > .2):
         return haversine_distance(latitude_1, longitude_1, latitude_2, longitude_2)
 
-    coef = mod_math.cos(latitude_1 / 180. * mod_math.pi)
+    # Same as _flat_distance() (inlined for speed):
+    if latitude_1_cos is None:
+        coef = mod_math.cos(latitude_1 / 180. * mod_math.pi)
+    else:
+        coef = latitude_1_cos
     x = latitude_1 - latitude_2
     y = (longitude_1 - longitude_2) * coef
 
@@ -190,6 +281,262 @@ def distance(latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elev
     return mod_math.sqrt(distance_2d ** 2 + (elevation_1 - elevation_2) ** 2)
 
 
+def _flat_distance(latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elevation_2):
+    coef = mod_math.cos(latitude_1 / 180. * mod_math.pi)
+    x = latitude_1 - latitude_2
+    y = (longitude_1 - longitude_2) * coef
+    return _add_elevation(mod_math.sqrt(x * x + y * y) * ONE_DEGREE, elevation_1, elevation_2)
+
+
+def _add_elevation(distance_2d, elevation_1, elevation_2):
+    if elevation_1 is None or elevation_2 is None or elevation_1 == elevation_2:
+        return distance_2d
+
+    return mod_math.sqrt(distance_2d ** 2 + (elevation_1 - elevation_2) ** 2)
+
+
+class DistanceModel:
+    """
+    Algorithm for the distances between points. Subclasses implement
+    distance_2d() and (optionally, for speed) the batch distances_2d() for
+    consecutive points. The elevation difference is added to 2d distances
+    as in distance().
+    """
+
+    name = None
+
+    def distance_2d(self, latitude_1, longitude_1, latitude_2, longitude_2):
+        """ Distance (meters) between two points """
+        raise Exception('Not implemented')
+
+    def distance(self, latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elevation_2):
+        """ Distance (meters) between two points, 3d if both elevations are given """
+        return _add_elevation(self.distance_2d(latitude_1, longitude_1, latitude_2, longitude_2),
+                              elevation_1, elevation_2)
+
+    def distances_2d(self, geometry):
+        """
+        Distances between consecutive points of geometry (a Geometry), the
+        i-th is the distance from point i + 1 to point i.
+        """
+        latitudes, longitudes = geometry.latitudes, geometry.longitudes
+        distance_2d = self.distance_2d
+        return mod_array.array('d', [distance_2d(latitudes[i], longitudes[i], latitudes[i - 1], longitudes[i - 1])
+                                     for i in range(1, len(latitudes))])
+
+    def distances(self, geometry, _3d=False):
+        """ Distances between consecutive points of geometry, 3d if _3d """
+        result = self.distances_2d(geometry)
+        if not _3d:
+            return result
+        elevations = geometry.elevations
+        for i in range(1, len(elevations)):
+            result[i - 1] = _add_elevation(result[i - 1], elevations[i], elevations[i - 1])
+        return result
+
+    def consecutive_distances(self, latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elevation_2):
+        """
+        The 2d and 3d distances from point 1 to the previous point 2, the
+        same values as the distances() of their Geometry (without creating
+        one, for a point appended to a track).
+        """
+        distance_2d = self.distance_2d(latitude_1, longitude_1, latitude_2, longitude_2)
+        return distance_2d, _add_elevation(distance_2d, elevation_1, elevation_2)
+
+    def __repr__(self):
+        return '%s()' % self.__class__.__name__
+
+
+class FlatDistanceModel(DistanceModel):
+    """
+    Equirectangular approximation (the longitude difference is scaled with
+    the cosine of the first latitude). The fastest model, good for points
+    closer than ~20km (the error is ~0.5% at most), but wrong for distant
+    ones and near the poles.
+    """
+
+    name = 'flat'
+
+    def distance_2d(self, latitude_1, longitude_1, latitude_2, longitude_2):
+        return _flat_distance(latitude_1, longitude_1, None, latitude_2, longitude_2, None)
+
+    def distance(self, latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elevation_2):
+        return _flat_distance(latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elevation_2)
+
+    def distances_2d(self, geometry):
+        latitudes, longitudes, cosines = geometry.latitudes, geometry.longitudes, geometry.cosines
+        sqrt = mod_math.sqrt
+        result = mod_array.array('d')
+        append = result.append
+        for i in range(1, len(latitudes)):
+            x = latitudes[i] - latitudes[i - 1]
+            y = (longitudes[i] - longitudes[i - 1]) * cosines[i]
+            append(sqrt(x * x + y * y) * ONE_DEGREE)
+        return result
+
+
+class HaversineDistanceModel(DistanceModel):
+    """ Great circle distance on a sphere (error up to ~0.5%) """
+
+    name = 'haversine'
+
+    def distance_2d(self, latitude_1, longitude_1, latitude_2, longitude_2):
+        return haversine_distance(latitude_1, longitude_1, latitude_2, longitude_2)
+
+    def distances_2d(self, geometry):
+        # The radians and cosines of the latitudes are computed once:
+        radians, cosines, longitudes = geometry.radians, geometry.cosines, geometry.longitudes
+        sin, sqrt, atan2 = mod_math.sin, mod_math.sqrt, mod_math.atan2
+        result = mod_array.array('d')
+        append = result.append
+        for i in range(1, len(radians)):
+            sin_d_lat = sin((radians[i] - radians[i - 1]) / 2)
+            sin_d_lon = sin(to_rad(longitudes[i] - longitudes[i - 1]) / 2)
+            a = sin_d_lat * sin_d_lat + sin_d_lon * sin_d_lon * cosines[i] * cosines[i - 1]
+            append(2 * atan2(sqrt(a), sqrt(1 - a)) * EARTH_RADIUS)
+        return result
+
+    def consecutive_distances(self, latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elevation_2):
+        # As distances_2d(), which doesn't round like haversine_distance():
+        radians_1, radians_2 = latitude_1 / 180. * mod_math.pi, latitude_2 / 180. * mod_math.pi
+        sin_d_lat = mod_math.sin((radians_1 - radians_2) / 2)
+        sin_d_lon = mod_math.sin(to_rad(longitude_1 - longitude_2) / 2)
+        a = sin_d_lat * sin_d_lat + sin_d_lon * sin_d_lon * mod_math.cos(radians_1) * mod_math.cos(radians_2)
+        distance_2d = 2 * mod_math.atan2(mod_math.sqrt(a), mod_math.sqrt(1 - a)) * EARTH_RADIUS
+        return distance_2d, _add_elevation(distance_2d, elevation_1, elevation_2)
+
+
+class VincentyDistanceModel(DistanceModel):
+    """ Distance on the WGS84 ellipsoid (the most accurate, and the slowest) """
+
+    name = 'vincenty'
+
+    def distance_2d(self, latitude_1, longitude_1, latitude_2, longitude_2):
+        return vincenty_distance(latitude_1, longitude_1, latitude_2, longitude_2)
+
+    def distances_2d(self, geometry):
+        latitudes, longitudes = geometry.latitudes, geometry.longitudes
+        # The reduced latitudes are computed once:
+        reduced = [mod_math.atan((1 - WGS84_FLATTENING) * mod_math.tan(radians)) for radians in geometry.radians]
+        sines = [mod_math.sin(latitude) for latitude in reduced]
+        cosines = [mod_math.cos(latitude) for latitude in reduced]
+        result = mod_array.array('d')
+        append = result.append
+        for i in range(1, len(latitudes)):
+            d = _vincenty(sines[i], cosines[i], sines[i - 1], cosines[i - 1],
+                          to_rad(longitudes[i - 1] - longitudes[i]), 200)
+            if d is None:
+                d = haversine_distance(latitudes[i], longitudes[i], latitudes[i - 1], longitudes[i - 1])
+            append(d)
+        return result
+
+    def consecutive_distances(self, latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elevation_2):
+        # As distances_2d():
+        reduced_1, reduced_2 = [mod_math.atan((1 - WGS84_FLATTENING) * mod_math.tan(latitude / 180. * mod_math.pi))
+                                for latitude in (latitude_1, latitude_2)]
+        distance_2d = _vincenty(mod_math.sin(reduced_1), mod_math.cos(reduced_1), mod_math.sin(reduced_2),
+                                mod_math.cos(reduced_2), to_rad(longitude_2 - longitude_1), 200)
+        if distance_2d is None:
+            distance_2d = haversine_distance(latitude_1, longitude_1, latitude_2, longitude_2)
+        return distance_2d, _add_elevation(distance_2d, elevation_1, elevation_2)
+
+
+class HybridDistanceModel(DistanceModel):
+    """
+    The default model: flat for points closer than threshold degrees and
+    haversine (without elevation) for the distant ones.
+    """
+
+    name = 'hybrid'
+
+    def __init__(self, threshold=.2):
+        self.threshold = threshold
+
+    def distance_2d(self, latitude_1, longitude_1, latitude_2, longitude_2):
+        return self.distance(latitude_1, longitude_1, None, latitude_2, longitude_2, None)
+
+    def distance(self, latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elevation_2):
+        threshold = self.threshold
+        if abs(latitude_1 - latitude_2) > threshold or abs(longitude_1 - longitude_2) > threshold:
+            return haversine_distance(latitude_1, longitude_1, latitude_2, longitude_2)
+        return _flat_distance(latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elevation_2)
+
+    def distances(self, geometry, _3d=False):
+        latitudes, longitudes, cosines = geometry.latitudes, geometry.longitudes, geometry.cosines
+        elevations = geometry.elevations if _3d else None
+        threshold = self.threshold
+        sqrt = mod_math.sqrt
+        result = mod_array.array('d')
+        append = result.append
+        for i in range(1, len(latitudes)):
+            latitude_1, longitude_1 = latitudes[i], longitudes[i]
+            latitude_2, longitude_2 = latitudes[i - 1], longitudes[i - 1]
+            if abs(latitude_1 - latitude_2) > threshold or abs(longitude_1 - longitude_2) > threshold:
+                append(haversine_distance(latitude_1, longitude_1, latitude_2, longitude_2))
+                continue
+            x = latitude_1 - latitude_2
+            y = (longitude_1 - longitude_2) * cosines[i]
+            d = sqrt(x * x + y * y) * ONE_DEGREE
+            if elevations is not None:
+                elevation_1, elevation_2 = elevations[i], elevations[i - 1]
+                if elevation_1 is not None and elevation_2 is not None and elevation_1 != elevation_2:
+                    d = sqrt(d ** 2 + (elevation_1 - elevation_2) ** 2)
+            append(d)
+        return result
+
+    def distances_2d(self, geometry):
+        return self.distances(geometry)
+
+    def consecutive_distances(self, latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elevation_2):
+        # The elevation isn't added to the haversine distances:
+        return (self.distance(latitude_1, longitude_1, None, latitude_2, longitude_2, None),
+                self.distance(latitude_1, longitude_1, elevation_1, latitude_2, longitude_2, elevation_2))
+
+    def __repr__(self):
+        return 'HybridDistanceModel(threshold=%s)' % self.threshold
+
+
+DEFAULT_DISTANCE_MODEL = HybridDistanceModel()
+
+DISTANCE_MODELS = {
+    'flat': FlatDistanceModel(),
+    'haversine': HaversineDistanceModel(),
+    'vincenty': VincentyDistanceModel(),
+    'hybrid': DEFAULT_DISTANCE_MODEL,
+}
+
+# Set with set_distance_model() (None for DEFAULT_DISTANCE_MODEL):
+_distance_model = None
+
+
+def get_distance_model(distance_model=None):
+    """
+    The DistanceModel for distance_model (a DistanceModel, a name in
+    DISTANCE_MODELS or None for the current default model).
+    """
+    if distance_model is None:
+        distance_model = _distance_model or DEFAULT_DISTANCE_MODEL
+    if isinstance(distance_model, DistanceModel):
+        return distance_model
+    try:
+        return DISTANCE_MODELS[distance_model]
+    except KeyError:
+        raise ValueError('Invalid distance model %r (use one of %s)' % (distance_model, sorted(DISTANCE_MODELS)))
+
+
+def set_distance_model(distance_model):
+    """
+    Set the model used by all distance computations (when not given in
+    the call). None restores DEFAULT_DISTANCE_MODEL.
+    """
+    global _distance_model
+    if distance_model is not None:
+        distance_model = get_distance_model(distance_model)
+        if distance_model is DEFAULT_DISTANCE_MODEL:
+            distance_model = None
+    _distance_model = distance_model
+
+
 def elevation_angle(location1, location2, radians=False):
     """ Uphill/downhill angle between two locations. """
     if location1.elevation is None or location2.elevation is None:
@@ -209,19 +556,29 @@ def elevation_angle(location1, location2, radians=False):
     return 180 * angle / mod_math.pi
 
 
-def distance_from_line(point, line_point_1, line_point_2):
-    """ Distance of point from a line given with two points. """
+def distance_from_line(point, line_point_1, line_point_2, line_point_1_cos=None, line_point_2_cos=None):
+    """
+    Distance of point from a line given with two points. The cosines of the
+    latitudes of the line points can be given if already computed.
+    """
+    if mod_instrumentation.active[0] and mod_instrumentation.hook('geo.distance_from_line'):
+        return mod_instrumentation.call('geo.distance_from_line', distance_from_line, point,
+                                        line_point_1, line_point_2, line_point_1_cos, line_point_2_cos)
+
     assert point, point
     assert line_point_1, line_point_1
     assert line_point_2, line_point_2
 
-    a = line_point_1.distance_2d(line_point_2)
+    a = distance(line_point_1.latitude, line_point_1.longitude, None,
+                 line_point_2.latitude, line_point_2.longitude, None, latitude_1_cos=line_point_1_cos)
+    b = distance(line_point_1.latitude, line_point_1.longitude, None,
+                 point.latitude, point.longitude, None, latitude_1_cos=line_point_1_cos)
 
     if a == 0:
-        return line_point_1.distance_2d(point)
+        return b
 
-    b = line_point_1.distance_2d(point)
-    c = line_point_2.distance_2d(point)
+    c = distance(line_point_2.latitude, line_point_2.longitude, None,
+                 point.latitude, point.longitude, None, latitude_1_cos=line_point_2_cos)
 
     s = (a + b + c) / 2.
 
@@ -244,6 +601,7 @@ def get_line_equation_coefficients(location1, location2):
         return float(1), float(-a), float(-b)
 
 
+@mod_instrumentation.counted('geo.simplify_polyline')
 def simplify_polyline(points, max_distance):
     """Does Ramer-Douglas-Peucker algorithm for simplification of polyline """
 
@@ -286,6 +644,263 @@ def simplify_polyline(points, max_distance):
             simplify_polyline(points[tmp_max_distance_position:], max_distance)[1:])
 
 
+class Geometry:
+    """
+    Coordinates of a list of locations with precomputed latitudes in radians
+    and their cosines (so that distance() doesn't compute the same cosine for
+    every pair of points) and the (lazily computed) distances between
+    consecutive locations. See get_geometry().
+    """
+
+    __slots__ = ('latitudes', 'longitudes', 'elevations', 'radians', 'cosines', 'computed_distances',
+                 'polyline_indexes', 'computed_blocks')
+
+    def __init__(self, latitudes, longitudes, elevations):
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.elevations = elevations
+        self.radians = mod_array.array('d', [latitude / 180. * mod_math.pi for latitude in latitudes])
+        self.cosines = mod_array.array('d', [mod_math.cos(radians) for radians in self.radians])
+        # Distances by (distance model, _3d):
+        self.computed_distances = {}
+        # PolylineIndex by distance model:
+        self.polyline_indexes = {}
+        # Bounding boxes by block size:
+        self.computed_blocks = {}
+
+    @mod_instrumentation.counted('geo.Geometry.distances')
+    def distances(self, _3d=False, distance_model=None):
+        """
+        Distances between consecutive locations (the i-th is the distance
+        from location i + 1 to location i), computed as distance() does.
+        """
+        distance_model = get_distance_model(distance_model)
+        key = distance_model, bool(_3d)
+        result = self.computed_distances.get(key)
+        if result is None:
+            result = self.computed_distances[key] = distance_model.distances(self, _3d)
+        return result
+
+    def blocks(self, block_size=64):
+        """
+        Bounding boxes of blocks of block_size consecutive locations, as
+        (start, end, min_latitude, max_latitude, min_longitude, max_longitude,
+        min_cosine) tuples (end excluded, min_cosine is the minimum cosine of
+        the latitudes in the block). See Block.min_distance().
+        """
+        result = self.computed_blocks.get(block_size)
+        if result is None:
+            result = self.computed_blocks[block_size] = []
+            for start in range(0, len(self.latitudes), block_size):
+                end = min(start + block_size, len(self.latitudes))
+                latitudes = self.latitudes[start:end]
+                longitudes = self.longitudes[start:end]
+                result.append(Block(start, end, min(latitudes), max(latitudes), min(longitudes),
+                                    max(longitudes), min(self.cosines[start:end])))
+        return result
+
+    def get_polyline_index(self, distance_model=None):
+        """ PolylineIndex of the locations (built once) """
+        distance_model = get_distance_model(distance_model)
+        result = self.polyline_indexes.get(distance_model)
+        if result is None:
+            result = self.polyline_indexes[distance_model] = PolylineIndex(self, distance_model)
+        return result
+
+
+def get_geometry(locations, geometry=None):
+    """
+    Geometry of locations. The given (previously computed) geometry is
+    returned if the coordinates of the locations didn't change since.
+    """
+    latitudes = [location.latitude for location in locations]
+    longitudes = [location.longitude for location in locations]
+    elevations = [location.elevation for location in locations]
+    if geometry is not None and geometry.latitudes == latitudes and geometry.longitudes == longitudes \
+            and geometry.elevations == elevations:
+        return geometry
+    return Geometry(latitudes, longitudes, elevations)
+
+
+class Block(mod_collections.namedtuple(
+        'Block',
+        ('start', 'end', 'min_latitude', 'max_latitude', 'min_longitude', 'max_longitude', 'min_cosine'))):
+    """ Bounding box of consecutive locations, see Geometry.blocks() """
+
+    __slots__ = ()
+
+    def min_distance(self, latitude, longitude, latitude_cos):
+        """
+        Lower bound (meters) of the distances (with any of the
+        DISTANCE_MODELS, 2d or 3d, but not with other models, see
+        has_block_lower_bound()) from the given location to the locations
+        in this block. latitude_cos is the cosine of the latitude.
+        """
+        d_latitude = max(self.min_latitude - latitude, 0, latitude - self.max_latitude)
+        if self.min_longitude <= longitude <= self.max_longitude:
+            d_longitude = 0
+        elif longitude > self.max_longitude:
+            d_longitude = min(longitude - self.max_longitude, self.min_longitude + 360 - longitude)
+        else:
+            d_longitude = min(self.min_longitude - longitude, longitude + 360 - self.max_longitude)
+        if d_longitude > 90:
+            # Far away, the equirectangular bound doesn't hold:
+            d_longitude = 0
+        d_longitude *= min(latitude_cos, self.min_cosine)
+        # With a margin for the ellipsoid (vincenty) and rounding:
+        return .99 * ONE_DEGREE * mod_math.sqrt(d_latitude * d_latitude + d_longitude * d_longitude)
+
+
+# Models for which Block.min_distance() is a lower bound of the distances
+# (only instances of exactly these classes, subclasses may compute other
+# distances):
+_BLOCK_BOUNDED_MODELS = (FlatDistanceModel, HaversineDistanceModel, VincentyDistanceModel,
+                         HybridDistanceModel)
+
+
+def has_block_lower_bound(distance_model=None):
+    """
+    Is Block.min_distance() a lower bound of the distances computed with
+    distance_model (see get_distance_model()), so that blocks can be
+    skipped with it
+    """
+    # (__class__, type() of old-style instances is "instance" on Python 2)
+    return get_distance_model(distance_model).__class__ in _BLOCK_BOUNDED_MODELS
+
+
+# Nearest location on a polyline, see PolylineIndex.project():
+PolylineProjection = mod_collections.namedtuple(
+    'PolylineProjection',
+    ('location', 'distance', 'point_no', 'ratio', 'distance_from_start'))
+
+
+class PolylineIndex:
+    """
+    Index of the lines between consecutive locations (a polyline), used to
+    find the nearest location on the polyline without computing the
+    distance to every line.
+
+    The lines are grouped in a tree of bounding boxes (leaves with up to
+    leaf_size consecutive lines). A query visits the boxes nearest first
+    and stops when the nearest remaining box is farther than the best line
+    found, so usually only a few leaves are visited.
+
+    The index doesn't follow changes of the locations, build a new one (or
+    use GPXTrackSegment.project(), which does it) after changing them.
+    """
+
+    def __init__(self, geometry, distance_model=None, leaf_size=16):
+        self.latitudes = geometry.latitudes
+        self.longitudes = geometry.longitudes
+        self.elevations = geometry.elevations
+
+        # Distances along the polyline:
+        self.distances = geometry.distances(False, distance_model)
+        self.distances_from_start = mod_array.array('d', [0.])
+        distance_from_start = 0.
+        for distance in self.distances:
+            distance_from_start += distance
+            self.distances_from_start.append(distance_from_start)
+
+        # Nodes are (min_latitude, max_latitude, min_longitude, max_longitude,
+        # children, first_line_no, last_line_no + 1); line i is from location i
+        # to location i + 1 (or the only location for one location):
+        nodes = []
+        lines_no = max(len(self.latitudes) - 1, 1)
+        for start in range(0, lines_no, leaf_size):
+            end = min(start + leaf_size, lines_no)
+            latitudes = self.latitudes[start:end + 1]
+            longitudes = self.longitudes[start:end + 1]
+            nodes.append((min(latitudes), max(latitudes), min(longitudes), max(longitudes), None, start, end))
+        while len(nodes) > 1:
+            parents = []
+            for i in range(0, len(nodes), 2):
+                children = nodes[i:i + 2]
+                parents.append((min(node[0] for node in children), max(node[1] for node in children),
+                                min(node[2] for node in children), max(node[3] for node in children),
+                                children, children[0][5], children[-1][6]))
+            nodes = parents
+        self.root = nodes[0] if self.latitudes else None
+
+    def project(self, location):
+        """
+        Nearest location on the polyline (a PolylineProjection):
+
+         * location: the nearest location (with interpolated elevation)
+         * distance: its distance (meters) from the given location
+         * point_no: number of the line (its first location)
+         * ratio: position on the line (0 is location point_no, 1 the next one)
+         * distance_from_start: distance (meters) along the polyline
+
+        Distances from the given location are computed with the flat
+        (equirectangular) approximation around it, so they are accurate
+        for locations not farther than a few tens of kilometers from the
+        polyline. None if there are no locations.
+        """
+        if self.root is None:
+            return None
+
+        latitude, longitude = location.latitude, location.longitude
+        coef = mod_math.cos(latitude / 180. * mod_math.pi)
+        latitudes, longitudes = self.latitudes, self.longitudes
+        last_point_no = len(latitudes) - 1
+
+        def bound(node):
+            """ Lower bound of the (squared, in degrees) distance to the lines in node """
+            d_latitude = max(node[0] - latitude, 0, latitude - node[1])
+            d_longitude = max(node[2] - longitude, 0, longitude - node[3]) * coef
+            return d_latitude * d_latitude + d_longitude * d_longitude
+
+        best_distance = None
+        best_line_no = best_ratio = None
+        heap = [(bound(self.root), 0, self.root)]
+        counter = 1
+        while heap:
+            node_bound, _, node = mod_heapq.heappop(heap)
+            if best_distance is not None and node_bound >= best_distance:
+                break
+            children = node[4]
+            if children:
+                for child in children:
+                    mod_heapq.heappush(heap, (bound(child), counter, child))
+                    counter += 1
+                continue
+            for line_no in range(node[5], node[6]):
+                # Coordinates relative to location (in degrees of latitude):
+                next_no = min(line_no + 1, last_point_no)
+                x1 = (longitudes[line_no] - longitude) * coef
+                y1 = latitudes[line_no] - latitude
+                dx = (longitudes[next_no] - longitude) * coef - x1
+                dy = latitudes[next_no] - latitude - y1
+                length = dx * dx + dy * dy
+                ratio = 0.
+                if length:
+                    ratio = min(max(-(x1 * dx + y1 * dy) / length, 0.), 1.)
+                x, y = x1 + ratio * dx, y1 + ratio * dy
+                distance = x * x + y * y
+                if best_distance is None or distance < best_distance:
+                    best_distance, best_line_no, best_ratio = distance, line_no, ratio
+
+        return self._projection(best_line_no, best_ratio, mod_math.sqrt(best_distance) * ONE_DEGREE)
+
+    def _projection(self, line_no, ratio, distance):
+        next_no = min(line_no + 1, len(self.latitudes) - 1)
+        latitude = self.latitudes[line_no] + ratio * (self.latitudes[next_no] - self.latitudes[line_no])
+        longitude = self.longitudes[line_no] + ratio * (self.longitudes[next_no] - self.longitudes[line_no])
+        elevation_1, elevation_2 = self.elevations[line_no], self.elevations[next_no]
+        if elevation_1 is not None and elevation_2 is not None:
+            elevation = elevation_1 + ratio * (elevation_2 - elevation_1)
+        else:
+            elevation = elevation_1 if ratio == 0 else elevation_2 if ratio == 1 else None
+
+        distance_from_start = self.distances_from_start[line_no]
+        if next_no != line_no:
+            distance_from_start += ratio * self.distances[line_no]
+
+        return PolylineProjection(Location(latitude, longitude, elevation), distance, line_no, ratio,
+                                  distance_from_start)
+
+
 class Location:
     """ Generic geographical location """
 
@@ -304,17 +919,19 @@ class Location:
     def remove_elevation(self):
         self.elevation = None
 
-    def distance_2d(self, location):
+    def distance_2d(self, location, distance_model=None):
         if not location:
             return None
 
-        return distance(self.latitude, self.longitude, None, location.latitude, location.longitude, None)
+        return distance(self.latitude, self.longitude, None, location.latitude, location.longitude, None,
+                        distance_model=distance_model)
 
-    def distance_3d(self, location):
+    def distance_3d(self, location, distance_model=None):
         if not location:
             return None
 
-        return distance(self.latitude, self.longitude, self.elevation, location.latitude, location.longitude, location.elevation)
+        return distance(self.latitude, self.longitude, self.elevation, location.latitude, location.longitude, location.elevation,
+                        distance_model=distance_model)
 
     def elevation_angle(self, location, radians=False):
         return elevation_angle(self, location, radians)
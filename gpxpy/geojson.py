@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Tomo Krajina
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Streaming GeoJSON writer.
+
+The GeoJSON is written in pieces (one per waypoint, route and segment)
+directly from the points, no dict with the whole document is built.
+"""
+
+import json as mod_json
+
+from . import gpxfield as mod_gpxfield
+from . import utils as mod_utils
+
+
+def write_geojson(gpx, output, precision=None, times=False):
+    """
+    Write gpx as a (compact) GeoJSON FeatureCollection.
+
+    Waypoints are written as Point features, routes as LineString features
+    and tracks as LineString (one segment) or MultiLineString features.
+    Coordinates are [longitude, latitude] or [longitude, latitude,
+    elevation] if the point has elevation. Points without latitude or
+    longitude (None or NaN) are skipped in lines (and their times), such
+    waypoints have a null geometry.
+
+    Parameters
+    ----------
+    gpx : GPX
+    output : text file-like object (with a write(str) method)
+    precision : int
+        Number of decimals of the coordinates (None for the full float
+        representation). 6 decimals are ~10cm.
+    times : bool
+        If True, route and track features will have a "times" property
+        with the times of the points as strings (or null). For
+        MultiLineString it is a list of lists, one per segment. Waypoint
+        features will have a "time" property.
+    """
+    _write_geojson(gpx, lambda text: output.write(mod_utils.make_str(text)), precision, times)
+
+
+def to_geojson(gpx, precision=None, times=False):
+    """ The GeoJSON of write_geojson() as a string """
+    parts = []
+    _write_geojson(gpx, parts.append, precision, times)
+    return ''.join(parts)
+
+
+def _write_geojson(gpx, write, precision, times):
+    format_point = _point_formatter(precision)
+
+    write('{"type":"FeatureCollection","features":[')
+    first = True
+    for waypoint in gpx.waypoints:
+        if not first:
+            write(',')
+        first = False
+        if _has_coordinates(waypoint):
+            write('{"type":"Feature","geometry":{"type":"Point","coordinates":')
+            write(format_point(waypoint))
+            write('},"properties":')
+        else:
+            write('{"type":"Feature","geometry":null,"properties":')
+        write(_properties(waypoint.name, 'time', times and _time(waypoint.time)))
+        write('}')
+
+    for route in gpx.routes:
+        if not first:
+            write(',')
+        first = False
+        write('{"type":"Feature","geometry":{"type":"LineString","coordinates":')
+        write(_line(route.points, format_point))
+        write('},"properties":')
+        write(_properties(route.name, 'times', times and _times(route.points)))
+        write('}')
+
+    for track in gpx.tracks:
+        if not first:
+            write(',')
+        first = False
+        if len(track.segments) == 1:
+            write('{"type":"Feature","geometry":{"type":"LineString","coordinates":')
+            write(_line(track.segments[0].points, format_point))
+            write('},"properties":')
+            write(_properties(track.name, 'times', times and _times(track.segments[0].points)))
+        else:
+            write('{"type":"Feature","geometry":{"type":"MultiLineString","coordinates":[')
+            for segment_no, segment in enumerate(track.segments):
+                if segment_no:
+                    write(',')
+                write(_line(segment.points, format_point))
+            write(']},"properties":')
+            segment_times = None
+            if times:
+                segment_times = '[' + ','.join(_times(segment.points) for segment in track.segments) + ']'
+            write(_properties(track.name, 'times', segment_times))
+        write('}')
+    write(']}')
+
+
+def _is_number(value):
+    # False for None, NaN and infinity (which are not valid JSON numbers):
+    return value is not None and value - value == 0
+
+
+def _has_coordinates(point):
+    return _is_number(point.latitude) and _is_number(point.longitude)
+
+
+def _located(points):
+    """ The points with coordinates """
+    for point in points:
+        if not _has_coordinates(point):
+            return [point for point in points if _has_coordinates(point)]
+    return points
+
+
+def _point_formatter(precision):
+    if precision is None:
+        # repr() of a float is the shortest string which is parsed back to
+        # the same float:
+        template_2d, template_3d = '[%r,%r]', '[%r,%r,%r]'
+    else:
+        template_2d = '[%%.%sf,%%.%sf]' % (precision, precision)
+        template_3d = '[%%.%sf,%%.%sf,%%.%sf]' % (precision, precision, precision)
+
+    def format_point(point):
+        if _is_number(point.elevation):
+            return template_3d % (float(point.longitude), float(point.latitude), float(point.elevation))
+        return template_2d % (float(point.longitude), float(point.latitude))
+    return format_point
+
+
+def _line(points, format_point):
+    return '[' + ','.join([format_point(point) for point in _located(points)]) + ']'
+
+
+def _time(time):
+    if time is None:
+        return 'null'
+    if time.microsecond == 0 and time.tzinfo is None:
+        # Same as TIME_TYPE.to_string() (but faster):
+        return '"' + time.isoformat() + 'Z"'
+    # Formatted times don't need JSON escaping:
+    return '"' + mod_gpxfield.TIME_TYPE.to_string(time) + '"'
+
+
+def _times(points):
+    return '[' + ','.join([_time(point.time) for point in _located(points)]) + ']'
+
+
+def _properties(name, times_key, times):
+    result = '{"name":' + _dumps(name)
+    if times:
+        result += ',"%s":%s' % (times_key, times)
+    return result + '}'
+
+
+def _dumps(value):
+    return mod_json.dumps(value, separators=(',', ':'))
@@ -20,12 +20,19 @@ GPX related stuff
 
 import logging as mod_logging
 import math as mod_math
+import array as mod_array
+import binascii as mod_binascii
 import collections as mod_collections
 import copy as mod_copy
 import datetime as mod_datetime
+import functools as mod_functools
+import os as mod_os
+import re as mod_re
+import types as mod_types
 
 from . import utils as mod_utils
 from . import geo as mod_geo
+from . import instrumentation as mod_instrumentation
 from . import gpxfield as mod_gpxfield
 
 log = mod_logging.getLogger(__name__)
@@ -101,6 +108,36 @@ GPX_11_POINT_FIELDS = [
         mod_gpxfield.GPXExtensionsField('extensions', is_list=True),
 ]
 
+# Point fields parsed with the gpxpy.parse() fields profiles (None for all):
+PARSE_PROFILES = {
+    'geometry': ('latitude', 'longitude', 'elevation', 'time'),
+    'full': None,
+}
+
+# Number of decimals of float fields written with the to_xml() precision
+# profiles (7 decimals are ~1cm for latitude and longitude):
+PRECISION_PROFILES = {
+    'compact': {'latitude': 7, 'longitude': 7, 'elevation': 2},
+}
+
+# Fields of the numpy structured arrays returned by the to_numpy() methods.
+# Time is in seconds since the epoch (UTC), the int64 minimum (which is NaT
+# when viewed as datetime64[s]) if the point has no time. Missing
+# elevations and speeds are NaN:
+NUMPY_POINT_DTYPE = [
+    ('latitude', 'f8'),
+    ('longitude', 'f8'),
+    ('elevation', 'f8'),
+    ('time', 'i8'),
+    ('speed', 'f8'),
+    ('track_no', 'i4'),
+    ('segment_no', 'i4'),
+    ('point_no', 'i4'),
+]
+NUMPY_NO_TIME = -2 ** 63
+
+_EPOCH = mod_datetime.datetime(1970, 1, 1)
+
 # GPX1.0 track points have two more fields after time
 # Note that this is not true for GPX1.1
 GPX_TRACK_POINT_FIELDS = GPX_10_POINT_FIELDS[:4] \
@@ -126,6 +163,9 @@ MinimumMaximum = mod_collections.namedtuple(
 NearestLocationData = mod_collections.namedtuple(
     'NearestLocationData',
     ('location', 'track_no', 'segment_no', 'point_no'))
+ProjectionData = mod_collections.namedtuple(
+    'ProjectionData',
+    ('projection', 'track_no', 'segment_no'))
 PointData = mod_collections.namedtuple(
     'PointData',
     ('point', 'distance_from_start', 'track_no', 'segment_no', 'point_no'))
@@ -388,16 +428,22 @@ class GPXRoute:
         for point in self.points:
             point.remove_elevation()
 
-    def length(self):
+    def length(self, distance_model=None):
         """
         Computes length (2-dimensional) of route.
 
+        Parameters
+        ----------
+        distance_model : DistanceModel or str
+            Model used for the distances (see geo.DISTANCE_MODELS, None for
+            the default)
+
         Returns:
         -----------
         length: float
             Length returned in meters
         """
-        return mod_geo.length_2d(self.points)
+        return mod_geo.length_2d(self.points, distance_model=distance_model)
 
     def get_center(self):
         """
@@ -495,7 +541,7 @@ class GPXTrackPoint(mod_geo.Location):
                  'symbol', 'type', 'type_of_gpx_fix', 'satellites',
                  'horizontal_dilution', 'vertical_dilution',
                  'position_dilution', 'age_of_dgps_data', 'dgps_id',
-                 'link_type', 'extensions')
+                 'link_type', 'extensions', 'extension_values')
 
     def __init__(self, latitude=None, longitude=None, elevation=None, time=None, symbol=None, comment=None,
                  horizontal_dilution=None, vertical_dilution=None, position_dilution=None, speed=None,
@@ -526,6 +572,9 @@ class GPXTrackPoint(mod_geo.Location):
         self.age_of_dgps_data = None
         self.dgps_id = None
         self.extensions = []
+        # Numeric extension values read while parsing, tag -> float (NaN if
+        # missing) for all the requested tags (see GPXParser.parse()):
+        self.extension_values = None
 
     def __repr__(self):
         representation = '%s, %s' % (self.latitude, self.longitude)
@@ -615,6 +664,319 @@ class GPXTrackPoint(mod_geo.Location):
         return '[trkpt:%s,%s@%s@%s]' % (self.latitude, self.longitude, self.elevation, self.time)
 
 
+# Values shared (not copied) by the clone() methods:
+# (type(u'') and type(2 ** 64) are unicode and long on Python 2)
+_IMMUTABLE_TYPES = frozenset((type(None), bool, int, type(2 ** 64), float, str, bytes, type(u''),
+                              mod_datetime.datetime, mod_datetime.date, mod_datetime.timedelta))
+
+# Type of the instances of old-style classes (Python 2 only):
+_INSTANCE_TYPE = getattr(mod_types, 'InstanceType', None)
+
+# Compiled functions copying the slots, by class (see _clone()):
+_SLOTS_COPIERS = {}
+
+
+def _clone(value):
+    """
+    Structural copy of gpxpy objects, much faster than copy.deepcopy(). The
+    slots of gpxpy objects, lists and dicts are copied, immutable values are
+    shared and anything else (for example extension elements) is deep
+    copied. Unlike deepcopy(), an object referenced twice will be copied
+    twice.
+    """
+    classs = type(value)
+    if classs in _IMMUTABLE_TYPES:
+        return value
+    if classs is list:
+        return [_clone(item) for item in value]
+    if classs is dict:
+        return dict((key, _clone(item)) for key, item in value.items())
+    if classs is _INSTANCE_TYPE:
+        # Instance of an old-style class (Python 2):
+        classs = value.__class__
+    if not classs.__module__.startswith('gpxpy.'):
+        return mod_copy.deepcopy(value)
+
+    copier = _SLOTS_COPIERS.get(classs)
+    if copier is None:
+        copier = _SLOTS_COPIERS[classs] = _compile_slots_copier(classs)
+    copy_slots, slots = copier
+
+    if isinstance(classs, type):
+        result = classs.__new__(classs)
+    else:
+        result = _INSTANCE_TYPE(classs)
+    copy_slots(value, result)
+    for attribute, item in getattr(value, '__dict__', {}).items():
+        # (On Python 2 the "slots" of old-style classes are in __dict__)
+        if attribute not in slots:
+            setattr(result, attribute, _clone(item))
+    return result
+
+
+def _compile_slots_copier(classs):
+    """
+    Function copying the slots of classs (an unrolled loop, twice as fast as
+    getattr()/setattr() in a loop) and the set of the slots.
+    """
+    slots = []
+    # The class and its superclasses (old-style classes have no __mro__):
+    classes = [classs]
+    for superclass in classes:
+        classes.extend(base for base in superclass.__bases__ if base not in classes)
+        slots.extend(slot for slot in getattr(superclass, '__slots__', ()) if slot not in slots)
+
+    lines = ['def copy_slots(value, result):', '    try:']
+    for slot in slots:
+        if slot.startswith('_'):
+            # Private slots are caches:
+            lines.append('        result.%s = None' % slot)
+            continue
+        lines.append('        item = value.%s' % slot)
+        lines.append('        result.%s = item if item.__class__ in immutable_types else clone(item)' % slot)
+    lines.append('    except AttributeError:')
+    # Some slots not set:
+    lines.append('        for slot in slots:')
+    lines.append("            if hasattr(value, slot) and not slot.startswith('_'):")
+    lines.append('                setattr(result, slot, clone(getattr(value, slot)))')
+
+    namespace = {'immutable_types': _IMMUTABLE_TYPES, 'clone': _clone, 'slots': slots}
+    exec('\n'.join(lines), namespace)
+    return namespace['copy_slots'], frozenset(slots)
+
+
+def _memoized(method):
+    """
+    Decorator of the statistics methods of GPXTrackSegment, GPXTrack and
+    GPX: while memoization is enabled (see GPX.memoize()) the results are
+    cached until the object changes. The arguments and the current default
+    distance model are the key. GPXBounds results (not immutable like the
+    other results) are copied.
+    """
+    name = method.__name__
+
+    @mod_functools.wraps(method)
+    def memoized_method(self, *args, **kwargs):
+        memo = self._get_memo()
+        if memo is None:
+            return method(self, *args, **kwargs)
+        key = (name, mod_geo.get_distance_model(), args, tuple(sorted(kwargs.items())))
+        if key not in memo:
+            memo[key] = method(self, *args, **kwargs)
+        result = memo[key]
+        if isinstance(result, GPXBounds):
+            return _clone(result)
+        return result
+    return memoized_method
+
+
+def _get_children_memo(owner, children):
+    """
+    The cache of a memoized GPX or GPXTrack (see GPX.memoize()), a new one if
+    any of its children (tracks or segments) changed, None if not memoized.
+    Children added later are memoized, too.
+    """
+    memo = owner._memo
+    if memo is None:
+        return None
+    children_memos = []
+    for child in children:
+        if child._memo is None:
+            child.memoize()
+        children_memos.append(child._get_memo())
+    # The caches of the children are replaced when they change:
+    previous = memo.get(None)
+    if previous is None or len(previous) != len(children_memos) \
+            or any(memo_1 is not memo_2 for memo_1, memo_2 in zip(previous, children_memos)):
+        memo = owner._memo = {None: children_memos}
+    return memo
+
+
+def _import_numpy():
+    try:
+        import numpy as mod_numpy
+    except ImportError:
+        raise GPXException('numpy is required for numpy arrays')
+    return mod_numpy
+
+
+def _points_to_numpy(numpy, points, track_no, segment_no):
+    result = numpy.empty(len(points), dtype=NUMPY_POINT_DTYPE)
+    if not points:
+        return result
+    result['latitude'] = [point.latitude for point in points]
+    result['longitude'] = [point.longitude for point in points]
+    # None is converted to NaN:
+    result['elevation'] = numpy.array([point.elevation for point in points], dtype='f8')
+    result['speed'] = numpy.array([point.speed for point in points], dtype='f8')
+    # Much faster than numpy's conversion of datetime objects:
+    result['time'] = [NUMPY_NO_TIME if point.time is None else _seconds_since_epoch(point.time)
+                      for point in points]
+    result['track_no'] = track_no
+    result['segment_no'] = segment_no
+    result['point_no'] = numpy.arange(len(points))
+    return result
+
+
+def _seconds_since_epoch(time):
+    """ Whole seconds since the epoch, naive times are UTC """
+    if time.tzinfo is not None:
+        time = time.replace(tzinfo=None) - time.utcoffset()
+    return mod_utils.total_seconds(time - _EPOCH)
+
+
+def _numpy_floats_to_list(numpy, values):
+    """ Floats as a list (with None instead of NaN) """
+    values = numpy.asarray(values, dtype='f8')
+    return numpy.where(numpy.isnan(values), None, values).tolist()
+
+
+class _SegmentTotals:
+    """
+    Running statistics of the points of a segment, updated in O(1) for
+    every point added with GPXTrackSegment.append_point() (only the max
+    speed is computed from all the speeds, see get_moving_data()). The
+    values are exactly the ones the GPXTrackSegment methods compute from
+    all the points (for the default stopped speed threshold and
+    distance_model).
+    """
+
+    __slots__ = ('points', 'points_no', 'distance_model', 'length_2d', 'length_3d',
+                 'min_latitude', 'max_latitude', 'min_longitude', 'max_longitude',
+                 'moving_time', 'stopped_time', 'moving_distance', 'stopped_distance',
+                 'speeds_and_distances', 'max_speed', 'uphill', 'downhill', 'smoothed_elevation')
+
+    def __init__(self, points, distance_model):
+        self.points = points
+        self.points_no = 0
+        self.distance_model = distance_model
+        self.length_2d = 0
+        self.length_3d = 0
+        self.min_latitude = None
+        self.max_latitude = None
+        self.min_longitude = None
+        self.max_longitude = None
+        self.moving_time = 0.
+        self.stopped_time = 0.
+        self.moving_distance = 0.
+        self.stopped_distance = 0.
+        self.speeds_and_distances = []
+        # (max speed, ) computed when needed, None if not computed yet:
+        self.max_speed = None
+        # Uphill and downhill of the smoothed elevations (see
+        # geo.calculate_uphill_downhill()) without the last point, whose
+        # smoothed elevation changes with the next point:
+        self.uphill = 0.
+        self.downhill = 0.
+        # Smoothed elevation of the last but one point:
+        self.smoothed_elevation = None
+        self.update()
+
+    def update(self):
+        """ Add the points appended to the list since the last update """
+        points = self.points
+        while self.points_no < len(points):
+            point_no = self.points_no
+            point = points[point_no]
+            self.points_no += 1
+
+            if self.min_latitude is None or point.latitude < self.min_latitude:
+                self.min_latitude = point.latitude
+            if self.max_latitude is None or point.latitude > self.max_latitude:
+                self.max_latitude = point.latitude
+            if self.min_longitude is None or point.longitude < self.min_longitude:
+                self.min_longitude = point.longitude
+            if self.max_longitude is None or point.longitude > self.max_longitude:
+                self.max_longitude = point.longitude
+
+            if point_no == 0:
+                continue
+            previous = points[point_no - 1]
+            self._add_distances(previous, point)
+            self._add_elevation(point_no)
+
+    def _add_distances(self, previous, point):
+        # The same values as the distances of all the points (see
+        # geo.Geometry.distances()), so that the sums are the same:
+        distance_2d, distance_3d = self.distance_model.consecutive_distances(
+            point.latitude, point.longitude, point.elevation, previous.latitude, previous.longitude, previous.elevation)
+        self.length_2d += distance_2d
+        self.length_3d += distance_3d
+
+        # As in GPXTrackSegment.get_moving_data():
+        if point.time and previous.time:
+            seconds = mod_utils.total_seconds(point.time - previous.time)
+            distance = distance_3d if point.elevation and previous.elevation else distance_2d
+            speed_kmh = 0
+            if seconds > 0:
+                speed_kmh = (distance / 1000.) / (seconds / 60. ** 2)
+            if speed_kmh <= DEFAULT_STOPPED_SPEED_THRESHOLD:
+                self.stopped_time += seconds
+                self.stopped_distance += distance
+            else:
+                self.moving_time += seconds
+                self.moving_distance += distance
+                if distance and self.moving_time:
+                    self.speeds_and_distances.append((distance / seconds, distance, ))
+                    self.max_speed = None
+
+    def _add_elevation(self, point_no):
+        # The point before point_no gets its final smoothed elevation:
+        points = self.points
+        smoothed_elevation = _smoothed_elevation(points, point_no - 1)
+        if point_no > 1:
+            self.uphill, self.downhill = _add_climb(self.uphill, self.downhill,
+                                                    smoothed_elevation - self.smoothed_elevation)
+        self.smoothed_elevation = smoothed_elevation
+
+    def get_bounds(self):
+        return GPXBounds(self.min_latitude, self.max_latitude, self.min_longitude, self.max_longitude)
+
+    def get_moving_data(self):
+        # O(n) after new speeds, calculate_max_speed() filters them all:
+        max_speed = None
+        if self.speeds_and_distances:
+            if self.max_speed is None:
+                self.max_speed = (mod_geo.calculate_max_speed(self.speeds_and_distances), )
+            max_speed = self.max_speed[0]
+        return MovingData(self.moving_time, self.stopped_time, self.moving_distance, self.stopped_distance,
+                          max_speed)
+
+    def get_uphill_downhill(self):
+        if not self.points_no:
+            return UphillDownhill(0, 0)
+        uphill, downhill = self.uphill, self.downhill
+        if self.points_no > 1:
+            last_point_no = self.points_no - 1
+            uphill, downhill = _add_climb(uphill, downhill, _smoothed_elevation(self.points, last_point_no)
+                                          - self.smoothed_elevation)
+        return UphillDownhill(uphill, downhill)
+
+
+def _smoothed_elevation(points, point_no):
+    """
+    Elevation of points[point_no] smoothed as in
+    geo.calculate_uphill_downhill() (with the points up to point_no + 1)
+    """
+    elevation = points[point_no].elevation
+    if elevation is None:
+        return False
+    if 0 < point_no < len(points) - 1:
+        previous_elevation = points[point_no - 1].elevation
+        next_elevation = points[point_no + 1].elevation
+        if previous_elevation is not None and next_elevation is not None:
+            return previous_elevation * .3 + elevation * .4 + next_elevation * .3
+    return elevation
+
+
+def _add_climb(uphill, downhill, d):
+    if d > 0:
+        uphill += d
+    else:
+        downhill -= d
+    return uphill, downhill
+
+
 class GPXTrackSegment:
     gpx_10_fields = [
             mod_gpxfield.GPXComplexField('points', tag='trkpt', classs=GPXTrackPoint, is_list=True),
@@ -624,49 +986,144 @@ class GPXTrackSegment:
             mod_gpxfield.GPXExtensionsField('extensions', is_list=True),
     ]
 
-    __slots__ = ('points', 'extensions', )
+    __slots__ = ('points', 'extensions', '_geometry', '_memo', '_totals', )
 
     def __init__(self, points=None):
         self.points = points if points else []
         self.extensions = []
+        self._geometry = None
+        self._memo = None
+        self._totals = None
+
+    def _get_geometry(self):
+        """ Geometry of the points, cached while their latitudes don't change """
+        self._geometry = mod_geo.get_geometry(self.points, self._geometry)
+        return self._geometry
+
+    def memoize(self, enabled=True):
+        """ See GPX.memoize() """
+        self._memo = {} if enabled else None
+
+    def _get_memo(self):
+        """ Cached statistics (see GPX.memoize()), None if not memoized """
+        memo = self._memo
+        if memo is None:
+            return None
+        points = self.points
+        # A new list or points added or removed (without the methods):
+        stamp = memo.get(None)
+        if stamp is None or stamp[0] is not points or stamp[1] != len(points):
+            memo = self._memo = {None: (points, len(points))}
+        return memo
+
+    def _set_dirty(self):
+        """ Called by the methods changing the points """
+        self._totals = None
+        if self._memo is not None:
+            # A new dict, so that the tracks and GPX see the change:
+            self._memo = {}
+
+    def append_point(self, point):
+        """
+        Appends a point (for example to a live track). The results of
+        length_2d(), length_3d(), get_moving_data(), get_uphill_downhill()
+        and get_bounds() are then updated in constant time instead of being
+        computed from all the points, except the max_speed of
+        get_moving_data(): it filters the speeds between all the points (see
+        geo.calculate_max_speed()), so the first get_moving_data() after
+        appending a moving point is O(n), and calling it after every
+        appended point is O(n^2) for the whole track.
+
+        Running totals are started by the first call (in time proportional
+        to the number of points) and kept while points are added with this
+        method. They are dropped by other changes of the list of points (or
+        by the methods changing the points), after which the results are
+        computed from all the points again. Changes of the points themselves
+        (setting point.elevation...) are not detected.
+
+        The totals are kept for the default distance model (and stopped
+        speed threshold), the results for other ones are always computed
+        from all the points.
+
+        Parameters
+        ----------
+        point : GPXTrackPoint
+        """
+        totals = self._get_totals()
+        if totals is None:
+            totals = self._totals = _SegmentTotals(self.points, mod_geo.get_distance_model())
+        self.points.append(point)
+        totals.update()
+
+    def _get_totals(self, distance_model=None):
+        """ The running totals (see append_point()), None if not valid """
+        totals = self._totals
+        if totals is None:
+            return None
+        if totals.points is not self.points or totals.points_no != len(self.points):
+            self._totals = None
+            return None
+        if totals.distance_model is not mod_geo.get_distance_model(distance_model):
+            return None
+        return totals
 
+    @mod_instrumentation.counted('GPXTrackSegment.simplify')
     def simplify(self, max_distance=None):
         """
         Simplify using the Ramer-Douglas-Peucker algorithm: http://en.wikipedia.org/wiki/Ramer-Douglas-Peucker_algorithm
+
+        Distances are computed with the global distance model (see
+        geo.set_distance_model()), there is no distance_model argument.
         """
         if not max_distance:
             max_distance = 10
 
         self.points = mod_geo.simplify_polyline(self.points, max_distance)
+        self._set_dirty()
 
+    @mod_instrumentation.counted('GPXTrackSegment.reduce_points')
     def reduce_points(self, min_distance):
         """
         Reduces the number of points in the track segment. Segment points will
         be updated in place.
 
+        Distances are computed with the global distance model (see
+        geo.set_distance_model()), there is no distance_model argument.
+
         Parameters
         ----------
         min_distance : float
             The minimum separation in meters between points
         """
+        cosines = self._get_geometry().cosines
         reduced_points = []
-        for point in self.points:
+        previous_no = None
+        for point_no, point in enumerate(self.points):
             if reduced_points:
-                distance = reduced_points[-1].distance_3d(point)
+                previous = reduced_points[-1]
+                distance = mod_geo.distance(previous.latitude, previous.longitude, previous.elevation,
+                                            point.latitude, point.longitude, point.elevation,
+                                            latitude_1_cos=cosines[previous_no])
                 if distance >= min_distance:
                     reduced_points.append(point)
+                    previous_no = point_no
             else:
                 # Leave first point:
                 reduced_points.append(point)
+                previous_no = point_no
 
         self.points = reduced_points
+        self._set_dirty()
 
     def _find_next_simplified_point(self, pos, max_distance):
+        cosines = self._get_geometry().cosines
         for candidate in range(pos + 1, len(self.points) - 1):
             for i in range(pos + 1, candidate):
                 d = mod_geo.distance_from_line(self.points[i],
                                                self.points[pos],
-                                               self.points[candidate])
+                                               self.points[candidate],
+                                               cosines[pos],
+                                               cosines[candidate])
                 if d > max_distance:
                     return candidate - 1
         return None
@@ -683,40 +1140,65 @@ class GPXTrackSegment:
         """
         for track_point in self.points:
             track_point.adjust_time(delta)
+        self._set_dirty()
 
     def remove_time(self):
         """ Removes time data for all points in the segment. """
         for track_point in self.points:
             track_point.remove_time()
+        self._set_dirty()
 
     def remove_elevation(self):
         """ Removes elevation data for all points in the segment. """
         for track_point in self.points:
             track_point.remove_elevation()
+        self._set_dirty()
 
-    def length_2d(self):
+    @mod_instrumentation.counted('GPXTrackSegment.length_2d')
+    @_memoized
+    def length_2d(self, distance_model=None):
         """
         Computes 2-dimensional length (meters) of segment (only latitude and
         longitude, no elevation).
 
+        Parameters
+        ----------
+        distance_model : DistanceModel or str
+            Model used for the distances (see geo.DISTANCE_MODELS, None for
+            the default)
+
         Returns
         ----------
         length : float
             Length returned in meters
         """
-        return mod_geo.length_2d(self.points)
+        totals = self._get_totals(distance_model)
+        if totals is not None:
+            return totals.length_2d
+        return mod_geo.length_2d(self.points, self._get_geometry(), distance_model)
 
-    def length_3d(self):
+    @mod_instrumentation.counted('GPXTrackSegment.length_3d')
+    @_memoized
+    def length_3d(self, distance_model=None):
         """
         Computes 3-dimensional length of segment (latitude, longitude, and
         elevation).
 
+        Parameters
+        ----------
+        distance_model : DistanceModel or str
+            Model used for the distances (see geo.DISTANCE_MODELS, None for
+            the default)
+
         Returns
         ----------
         length : float
             Length returned in meters
         """
-        return mod_geo.length_3d(self.points)
+        totals = self._get_totals(distance_model)
+        if totals is not None:
+            return totals.length_3d
+        return mod_geo.length_3d(self.points, self._get_geometry(), distance_model)
 
     def move(self, location_delta):
         """
@@ -730,6 +1212,7 @@ class GPXTrackSegment:
         """
         for track_point in self.points:
             track_point.move(location_delta)
+        self._set_dirty()
 
     def walk(self, only_points=False):
         """
@@ -766,6 +1249,62 @@ class GPXTrackSegment:
             return 0
         return len(self.points)
 
+    def to_numpy(self):
+        """
+        Points of the segment as a numpy structured array (see
+        NUMPY_POINT_DTYPE, track_no and segment_no are 0). Requires numpy.
+
+        Returns
+        ----------
+        points : numpy.ndarray
+        """
+        return _points_to_numpy(_import_numpy(), self.points, 0, 0)
+
+    @classmethod
+    def from_arrays(cls, latitudes, longitudes, elevations=None, times=None, speeds=None):
+        """
+        Creates a segment from arrays (or sequences) of point values. The
+        values are converted by numpy, only the points are created in Python.
+        Requires numpy.
+
+        Parameters
+        ----------
+        latitudes, longitudes : array of floats
+        elevations, speeds : array of floats
+            NaN for missing values
+        times : array of datetime64 or int64 seconds since the epoch (UTC)
+            NaT (or NUMPY_NO_TIME) for missing times
+
+        Returns
+        ----------
+        segment : GPXTrackSegment
+        """
+        numpy = _import_numpy()
+        latitudes = numpy.asarray(latitudes, dtype='f8').tolist()
+        longitudes = numpy.asarray(longitudes, dtype='f8').tolist()
+        no_values = [None] * len(latitudes)
+
+        if elevations is None:
+            elevations = no_values
+        else:
+            elevations = _numpy_floats_to_list(numpy, elevations)
+        if speeds is None:
+            speeds = no_values
+        else:
+            speeds = _numpy_floats_to_list(numpy, speeds)
+        if times is None:
+            times = no_values
+        else:
+            times = numpy.asarray(times)
+            if times.dtype.kind in 'iu':
+                times = times.astype('datetime64[s]')
+            # datetime64[us] is converted to datetime objects (None for NaT):
+            times = times.astype('datetime64[us]').tolist()
+
+        return cls([GPXTrackPoint(latitude, longitude, elevation=elevation, time=time, speed=speed)
+                    for latitude, longitude, elevation, time, speed
+                    in zip(latitudes, longitudes, elevations, times, speeds)])
+
     def split(self, point_no):
         """
         Splits the segment into two parts. If one of the split segments is
@@ -784,6 +1323,7 @@ class GPXTrackSegment:
     def join(self, track_segment):
         """ Joins with another segment """
         self.points += track_segment.points
+        self._set_dirty()
 
     def remove_point(self, point_no):
         """ Removes a point specificed by index from the segment """
@@ -794,8 +1334,11 @@ class GPXTrackSegment:
         part_2 = self.points[point_no + 1:]
 
         self.points = part_1 + part_2
+        self._set_dirty()
 
-    def get_moving_data(self, stopped_speed_threshold=None):
+    @mod_instrumentation.counted('GPXTrackSegment.get_moving_data')
+    @_memoized
+    def get_moving_data(self, stopped_speed_threshold=None, distance_model=None):
         """
         Return a tuple of (moving_time, stopped_time, moving_distance,
         stopped_distance, max_speed) that may be used for detecting the time
@@ -810,6 +1353,9 @@ class GPXTrackSegment:
         stopped_speed_threshold : float
             speeds (km/h) below this threshold are treated as if having no
             movement. Default is 1 km/h.
+        distance_model : DistanceModel or str
+            Model used for the distances (see geo.DISTANCE_MODELS, None for
+            the default)
 
         Returns
         ----------
@@ -828,6 +1374,10 @@ class GPXTrackSegment:
         if not stopped_speed_threshold:
             stopped_speed_threshold = DEFAULT_STOPPED_SPEED_THRESHOLD
 
+        totals = self._get_totals(distance_model)
+        if totals is not None and stopped_speed_threshold == DEFAULT_STOPPED_SPEED_THRESHOLD:
+            return totals.get_moving_data()
+
         moving_time = 0.
         stopped_time = 0.
 
@@ -835,6 +1385,9 @@ class GPXTrackSegment:
         stopped_distance = 0.
 
         speeds_and_distances = []
+        geometry = self._get_geometry()
+        distances_2d = geometry.distances(False, distance_model)
+        distances_3d = geometry.distances(True, distance_model)
 
         for i in range(1, len(self.points)):
 
@@ -848,9 +1401,9 @@ class GPXTrackSegment:
                 timedelta = point.time - previous.time
 
                 if point.elevation and previous.elevation:
-                    distance = point.distance_3d(previous)
+                    distance = distances_3d[i - 1]
                 else:
-                    distance = point.distance_2d(previous)
+                    distance = distances_2d[i - 1]
 
                 seconds = mod_utils.total_seconds(timedelta)
                 speed_kmh = 0
@@ -875,6 +1428,7 @@ class GPXTrackSegment:
 
         return MovingData(moving_time, stopped_time, moving_distance, stopped_distance, max_speed)
 
+    @_memoized
     def get_time_bounds(self):
         """
         Gets the time bound (start and end) of the segment.
@@ -899,6 +1453,7 @@ class GPXTrackSegment:
 
         return TimeBounds(start_time, end_time)
 
+    @_memoized
     def get_bounds(self):
         """
         Gets the latitude and longitude bounds of the segment.
@@ -915,6 +1470,10 @@ class GPXTrackSegment:
             max_longitude : float
                 Maximum longitude of segment in decimal degrees [-180, 180]
         """
+        totals = self._get_totals()
+        if totals is not None:
+            return totals.get_bounds()
+
         min_lat = None
         max_lat = None
         min_lon = None
@@ -992,7 +1551,9 @@ class GPXTrackSegment:
         for track_point in self.points:
             if track_point.elevation is not None:
                 track_point.elevation += delta
+        self._set_dirty()
 
+    @mod_instrumentation.counted('GPXTrackSegment.add_missing_data')
     def add_missing_data(self, get_data_function, add_missing_function):
         """
         Calculate missing data.
@@ -1032,6 +1593,7 @@ class GPXTrackSegment:
                     start_point = None
                     interval = []
             previous_point = track_point
+        self._set_dirty()
 
     def _get_interval_distances_ratios(self, interval, start, end):
         assert start, start
@@ -1055,6 +1617,7 @@ class GPXTrackSegment:
                 lambda distance: (distance / from_start_to_end) if from_start_to_end else 0,
                 distances))
 
+    @_memoized
     def get_duration(self):
         """
         Calculates duration or track segment
@@ -1086,6 +1649,8 @@ class GPXTrackSegment:
 
         return mod_utils.total_seconds(last.time - first.time)
 
+    @mod_instrumentation.counted('GPXTrackSegment.get_uphill_downhill')
+    @_memoized
     def get_uphill_downhill(self):
         """
         Calculates the uphill and downhill elevation climbs for the track
@@ -1100,6 +1665,10 @@ class GPXTrackSegment:
             downhill: float
                 Downhill elevation descent in meters
         """
+        totals = self._get_totals()
+        if totals is not None:
+            return totals.get_uphill_downhill()
+
         if not self.points:
             return UphillDownhill(0, 0)
 
@@ -1108,6 +1677,8 @@ class GPXTrackSegment:
 
         return UphillDownhill(uphill, downhill)
 
+    @mod_instrumentation.counted('GPXTrackSegment.get_elevation_extremes')
+    @_memoized
     def get_elevation_extremes(self):
         """
         Calculate elevation extremes of track segment
@@ -1132,6 +1703,7 @@ class GPXTrackSegment:
 
         return MinimumMaximum(min(elevations), max(elevations))
 
+    @mod_instrumentation.counted('GPXTrackSegment.get_location_at')
     def get_location_at(self, time):
         """
         Gets approx. location at given time. Note that, at the moment this
@@ -1162,8 +1734,12 @@ class GPXTrackSegment:
                 # return mod_geo.Location(point.latitude, point.longitude)
                 return point
 
-    def get_nearest_location(self, location):
-        """ Return the (location, track_point_no) on this track segment """
+    @mod_instrumentation.counted('GPXTrackSegment.get_nearest_location')
+    def get_nearest_location(self, location, distance_model=None):
+        """
+        Return the (location, track_point_no) on this track segment (the
+        distances are computed with distance_model, see geo.DISTANCE_MODELS)
+        """
         if not self.points:
             return None, None
 
@@ -1172,20 +1748,58 @@ class GPXTrackSegment:
         result_track_point_no = None
         for i in range(len(self.points)):
             track_point = self.points[i]
-            if not result:
+            distance = track_point.distance_2d(location, distance_model)
+            if current_distance is None or distance < current_distance:
+                current_distance = distance
                 result = track_point
-            else:
-                distance = track_point.distance_2d(location)
-                #print current_distance, distance
-                if not current_distance or distance < current_distance:
-                    current_distance = distance
-                    result = track_point
-                    result_track_point_no = i
+                result_track_point_no = i
 
         return result, result_track_point_no
 
+    def get_polyline_index(self, distance_model=None):
+        """
+        Index for projecting locations onto this segment, see
+        geo.PolylineIndex. It is built on the first call and reused while
+        the latitudes, longitudes and elevations of the points don't change.
+        """
+        return self._get_geometry().get_polyline_index(distance_model)
+
+    @mod_instrumentation.counted('GPXTrackSegment.project')
+    def project(self, location, distance_model=None):
+        """
+        Nearest location on the lines between the points of this segment
+        (not only on the points, see get_nearest_location()).
+
+        Every call checks (in linear time) that the points didn't change,
+        for many locations use get_polyline_index().project() (a query
+        visits only a few of the lines).
+
+        Parameters
+        ----------
+        location : Location
+        distance_model : str or geo.DistanceModel
+            Used for the distances along the segment (see geo.DISTANCE_MODELS)
+
+        Returns
+        ----------
+        projection : geo.PolylineProjection
+            (location, distance, point_no, ratio, distance_from_start), the
+            projected location lies between points point_no and point_no + 1
+            and distance_from_start is measured along the segment. None if
+            the segment has no points.
+        """
+        if not self.points:
+            return None
+        return self.get_polyline_index(distance_model).project(location)
+
+    @mod_instrumentation.counted('GPXTrackSegment.smooth')
     def smooth(self, vertical=True, horizontal=False, remove_extremes=False):
-        """ "Smooths" the elevation graph. Can be called multiple times. """
+        """
+        "Smooths" the elevation graph. Can be called multiple times.
+
+        Distances are computed with the global distance model (see
+        geo.set_distance_model()), there is no distance_model argument.
+        """
         if len(self.points) <= 3:
             return
 
@@ -1198,14 +1812,17 @@ class GPXTrackSegment:
             latitudes.append(point.latitude)
             longitudes.append(point.longitude)
 
+        # Geometry before smoothing:
+        geometry = self._get_geometry()
+        cosines = geometry.cosines
+
         avg_distance = 0
         avg_elevation_delta = 1
         if remove_extremes:
             # compute the average distance between two points:
-            distances = []
+            distances = list(geometry.distances())
             elevations_delta = []
             for i in range(len(self.points))[1:]:
-                distances.append(self.points[i].distance_2d(self.points[i - 1]))
                 elevation_1 = self.points[i].elevation
                 elevation_2 = self.points[i - 1].elevation
                 if elevation_1 is not None and elevation_2 is not None:
@@ -1270,14 +1887,18 @@ class GPXTrackSegment:
                 # TODO: This is not ideal.. Because if there are points A, B and C on the same
                 # line but B is very close to C... This would remove B (and possibly) A even though
                 # it is not an extreme. This is the reason for this algorithm:
-                d1 = mod_geo.distance(latitudes[i - 1], longitudes[i - 1], None, latitudes[i], longitudes[i], None)
-                d2 = mod_geo.distance(latitudes[i + 1], longitudes[i + 1], None, latitudes[i], longitudes[i], None)
-                d = mod_geo.distance(latitudes[i - 1], longitudes[i - 1], None, latitudes[i + 1], longitudes[i + 1], None)
+                d1 = mod_geo.distance(latitudes[i - 1], longitudes[i - 1], None, latitudes[i], longitudes[i], None,
+                                      latitude_1_cos=cosines[i - 1])
+                d2 = mod_geo.distance(latitudes[i + 1], longitudes[i + 1], None, latitudes[i], longitudes[i], None,
+                                      latitude_1_cos=cosines[i + 1])
+                d = mod_geo.distance(latitudes[i - 1], longitudes[i - 1], None, latitudes[i + 1], longitudes[i + 1], None,
+                                     latitude_1_cos=cosines[i - 1])
 
                 #print d1, d2, d, remove_extremes
 
                 if d1 + d2 > d * 1.5 and remove_extremes:
-                    d = mod_geo.distance(old_latitude, old_longitude, None, new_latitude, new_longitude, None)
+                    d = mod_geo.distance(old_latitude, old_longitude, None, new_latitude, new_longitude, None,
+                                         latitude_1_cos=cosines[i])
                     #print "d, threshold = ", d, remove_2d_extremes_threshold
                     if d < remove_2d_extremes_threshold:
                         new_point = self.points[i]
@@ -1295,6 +1916,7 @@ class GPXTrackSegment:
         #print 'len=', len(new_track_points)
 
         self.points = new_track_points
+        self._set_dirty()
 
     def has_times(self):
         """
@@ -1335,11 +1957,66 @@ class GPXTrackSegment:
         return len(self.points) > 2 and float(found) / float(len(self.points)) > .75
 
 
+    def get_extension_values(self, tags):
+        """
+        Collects the numeric values of extension tags (for example the
+        heart rate and cadence of Garmin's TrackPointExtension) of all
+        points in one pass.
+
+        Values read while parsing (see GPXParser.parse() extension_values)
+        are used if available, otherwise the extension Elements of the
+        points are searched. Points parsed with extension_values have no
+        extension Elements, so only the tags read while parsing can be
+        requested for them.
+
+        Parameters
+        ----------
+        tags : list of str
+            Local names (for example 'hr') which match in any namespace or
+            tags in Clark notation (for example
+            '{http://www.garmin.com/xmlschemas/TrackPointExtension/v1}hr')
+
+        Returns
+        ----------
+        values : dict
+            Tag -> array.array('d') with one value for every point. Missing
+            values are NaN.
+
+        Raises
+        ----------
+        GPXException
+            A tag wasn't in the extension_values of the parse of a point
+        """
+        tags_set = frozenset(tags)
+        result = {}
+        columns = []
+        for tag in tags_set:
+            result[tag] = mod_array.array('d')
+            columns.append((tag, result[tag]))
+
+        for point in self.points:
+            values = point.extension_values
+            if values is None:
+                if point.extensions:
+                    values = mod_gpxfield.find_extension_values(point.extensions, tags_set)
+                else:
+                    values = {}
+            elif not tags_set.issubset(values):
+                # All the read tags are in values (NaN if missing):
+                raise GPXException('Extension tags not read while parsing (see the extension_values argument): %s'
+                                   % ', '.join(sorted(tags_set.difference(values))))
+            for tag, column in columns:
+                column.append(values.get(tag, mod_gpxfield.NAN))
+
+        return result
+
     def __repr__(self):
         return 'GPXTrackSegment(points=[%s])' % ('...' if self.points else '')
 
+    @mod_instrumentation.counted('GPXTrackSegment.clone')
     def clone(self):
-        return mod_copy.deepcopy(self)
+        """ Copy (points and extensions included), faster than copy.deepcopy() """
+        return _clone(self)
 
 
 class GPXTrack:
@@ -1372,7 +2049,7 @@ class GPXTrack:
 
     __slots__ = ('name', 'comment', 'description', 'source', 'link',
                  'link_text', 'number', 'segments', 'link_type', 'type',
-                 'extensions')
+                 'extensions', '_memo')
 
     def __init__(self, name=None, description=None, number=None):
         self.name = name
@@ -1386,10 +2063,23 @@ class GPXTrack:
         self.link_type = None
         self.type = None
         self.extensions = []
+        self._memo = None
+
+    def memoize(self, enabled=True):
+        """ See GPX.memoize() """
+        self._memo = {} if enabled else None
+        for segment in self.segments:
+            segment.memoize(enabled)
+
+    def _get_memo(self):
+        return _get_children_memo(self, self.segments)
 
     def simplify(self, max_distance=None):
         """
         Simplify using the Ramer-Douglas-Peucker algorithm: http://en.wikipedia.org/wiki/Ramer-Douglas-Peucker_algorithm
+
+        Distances are computed with the global distance model (see
+        geo.set_distance_model()), there is no distance_model argument.
         """
         for segment in self.segments:
             segment.simplify(max_distance=max_distance)
@@ -1399,6 +2089,9 @@ class GPXTrack:
         Reduces the number of points in the track. Segment points will be
         updated in place.
 
+        Distances are computed with the global distance model (see
+        geo.set_distance_model()), there is no distance_model argument.
+
         Parameters
         ----------
         min_distance : float
@@ -1440,12 +2133,19 @@ class GPXTrack:
 
         self.segments = result
 
-    def length_2d(self):
+    @_memoized
+    def length_2d(self, distance_model=None):
         """
         Computes 2-dimensional length (meters) of track (only latitude and
         longitude, no elevation). This is the sum of the 2D length of all
         segments.
 
+        Parameters
+        ----------
+        distance_model : DistanceModel or str
+            Model used for the distances (see geo.DISTANCE_MODELS, None for
+            the default)
+
         Returns
         ----------
         length : float
@@ -1453,11 +2153,12 @@ class GPXTrack:
         """
         length = 0
         for track_segment in self.segments:
-            d = track_segment.length_2d()
+            d = track_segment.length_2d(distance_model)
             if d:
                 length += d
         return length
 
+    @_memoized
     def get_time_bounds(self):
         """
         Gets the time bound (start and end) of the track.
@@ -1482,6 +2183,7 @@ class GPXTrack:
 
         return TimeBounds(start_time, end_time)
 
+    @_memoized
     def get_bounds(self):
         """
         Gets the latitude and longitude bounds of the track.
@@ -1558,11 +2260,18 @@ class GPXTrack:
 
         return result
 
-    def length_3d(self):
+    @_memoized
+    def length_3d(self, distance_model=None):
         """
         Computes 3-dimensional length of track (latitude, longitude, and
         elevation). This is the sum of the 3D length of all segments.
 
+        Parameters
+        ----------
+        distance_model : DistanceModel or str
+            Model used for the distances (see geo.DISTANCE_MODELS, None for
+            the default)
+
         Returns
         ----------
         length : float
@@ -1570,7 +2279,7 @@ class GPXTrack:
         """
         length = 0
         for track_segment in self.segments:
-            d = track_segment.length_3d()
+            d = track_segment.length_3d(distance_model)
             if d:
                 length += d
         return length
@@ -1635,7 +2344,8 @@ class GPXTrack:
                 new_segments.append(segment)
         self.segments = new_segments
 
-    def get_moving_data(self, stopped_speed_threshold=None):
+    @_memoized
+    def get_moving_data(self, stopped_speed_threshold=None, distance_model=None):
         """
         Return a tuple of (moving_time, stopped_time, moving_distance,
         stopped_distance, max_speed) that may be used for detecting the time
@@ -1650,6 +2360,9 @@ class GPXTrack:
         stopped_speed_threshold : float
             speeds (km/h) below this threshold are treated as if having no
             movement. Default is 1 km/h.
+        distance_model : DistanceModel or str
+            Model used for the distances (see geo.DISTANCE_MODELS, None for
+            the default)
 
         Returns
         ----------
@@ -1674,7 +2387,7 @@ class GPXTrack:
         max_speed = 0.
 
         for segment in self.segments:
-            track_moving_time, track_stopped_time, track_moving_distance, track_stopped_distance, track_max_speed = segment.get_moving_data(stopped_speed_threshold)
+            track_moving_time, track_stopped_time, track_moving_distance, track_stopped_distance, track_max_speed = segment.get_moving_data(stopped_speed_threshold, distance_model)
             moving_time += track_moving_time
             stopped_time += track_stopped_time
             moving_distance += track_moving_distance
@@ -1714,6 +2427,7 @@ class GPXTrack:
         for track_segment in self.segments:
             track_segment.move(location_delta)
 
+    @_memoized
     def get_duration(self):
         """
         Calculates duration or track
@@ -1736,6 +2450,7 @@ class GPXTrack:
 
         return result
 
+    @_memoized
     def get_uphill_downhill(self):
         """
         Calculates the uphill and downhill elevation climbs for the track.
@@ -1778,6 +2493,7 @@ class GPXTrack:
 
         return result
 
+    @_memoized
     def get_elevation_extremes(self):
         """
         Calculate elevation extremes of track
@@ -1861,11 +2577,11 @@ class GPXTrack:
 
         return result
 
-    def get_nearest_location(self, location):
-        """ Returns (location, track_segment_no, track_point_no) for nearest location on track """
-        if not self.segments:
-            return None
-
+    def get_nearest_location(self, location, distance_model=None):
+        """
+        Returns (location, track_segment_no, track_point_no) for nearest
+        location on track (see GPXTrackSegment.get_nearest_location())
+        """
         result = None
         distance = None
         result_track_segment_no = None
@@ -1873,22 +2589,47 @@ class GPXTrack:
 
         for i in range(len(self.segments)):
             track_segment = self.segments[i]
-            nearest_location, track_point_no = track_segment.get_nearest_location(location)
-            nearest_location_distance = None
-            if nearest_location:
-                nearest_location_distance = nearest_location.distance_2d(location)
-
-            if not distance or nearest_location_distance < distance:
-                if nearest_location:
-                    distance = nearest_location_distance
-                    result = nearest_location
-                    result_track_segment_no = i
-                    result_track_point_no = track_point_no
+            nearest_location, track_point_no = track_segment.get_nearest_location(location, distance_model)
+            if nearest_location is None:
+                continue
+            nearest_location_distance = nearest_location.distance_2d(location, distance_model)
+            if distance is None or nearest_location_distance < distance:
+                distance = nearest_location_distance
+                result = nearest_location
+                result_track_segment_no = i
+                result_track_point_no = track_point_no
 
         return result, result_track_segment_no, result_track_point_no
 
+    def project(self, location, distance_model=None):
+        """
+        Returns (projection, track_segment_no) for the nearest location on
+        the lines of the segments (see GPXTrackSegment.project()), or
+        (None, None) if there are no points.
+        """
+        result = None
+        result_track_segment_no = None
+        for i, track_segment in enumerate(self.segments):
+            projection = track_segment.project(location, distance_model)
+            if projection is not None and (result is None or projection.distance < result.distance):
+                result = projection
+                result_track_segment_no = i
+        return result, result_track_segment_no
+
+    def get_extension_values(self, tags):
+        """
+        Collects the numeric values of extension tags of all points in the
+        track. See GPXTrackSegment.get_extension_values().
+        """
+        result = dict((tag, mod_array.array('d')) for tag in tags)
+        for segment in self.segments:
+            for tag, values in segment.get_extension_values(tags).items():
+                result[tag].extend(values)
+        return result
+
     def clone(self):
-        return mod_copy.deepcopy(self)
+        """ Copy (points and extensions included), faster than copy.deepcopy() """
+        return _clone(self)
 
 
     def __repr__(self):
@@ -1901,6 +2642,19 @@ class GPXTrack:
         return 'GPXTrack(%s)' % representation
 
 
+class _XMLPlaceholder:
+    """
+    Serialized by GPX.to_xml_chunks() instead of the points of a list, the
+    key is used to find it in the XML.
+    """
+    gpx_10_fields = gpx_11_fields = [mod_gpxfield.GPXField('key', attribute='key')]
+
+    __slots__ = ('key', )
+
+    def __init__(self, key=None):
+        self.key = key
+
+
 class GPX:
     gpx_10_fields = [
             mod_gpxfield.GPXField('version', attribute=True),
@@ -1967,7 +2721,7 @@ class GPX:
                  'author_link_text', 'author_link_type', 'copyright_author',
                  'copyright_year', 'copyright_license', 'link_type',
                  'metadata_extensions', 'extensions', 'nsmap',
-                 'schema_locations')
+                 'schema_locations', '_memo')
 
     def __init__(self):
         self.version = None
@@ -1995,10 +2749,42 @@ class GPX:
         self.tracks = []
         self.nsmap = {}
         self.schema_locations = []
+        self._memo = None
+
+    def memoize(self, enabled=True):
+        """
+        Enable (or disable) the caching of the results of length_2d(),
+        length_3d(), get_moving_data(), get_bounds(), get_time_bounds(),
+        get_duration(), get_uphill_downhill() and get_elevation_extremes() of
+        the GPX, its tracks and their segments (tracks and segments added
+        later included). Repeated calls (for example for a summary on every
+        request) are then answered from the cache, in time proportional to
+        the number of segments.
+
+        A segment's results are recomputed after it is changed by its methods
+        (or the methods of its track or GPX) or points are added to or
+        removed from its list. Changes of the points themselves (setting
+        point.elevation, point.move()...) are not detected: call memoize()
+        again after them, it drops all the cached results.
+
+        Parameters
+        ----------
+        enabled : bool
+            False disables the caching (and drops the cached results)
+        """
+        self._memo = {} if enabled else None
+        for track in self.tracks:
+            track.memoize(enabled)
+
+    def _get_memo(self):
+        return _get_children_memo(self, self.tracks)
 
     def simplify(self, max_distance=None):
         """
         Simplify using the Ramer-Douglas-Peucker algorithm: http://en.wikipedia.org/wiki/Ramer-Douglas-Peucker_algorithm
+
+        Distances are computed with the global distance model (see
+        geo.set_distance_model()), there is no distance_model argument.
         """
         for track in self.tracks:
             track.simplify(max_distance=max_distance)
@@ -2007,6 +2793,9 @@ class GPX:
         """
         Reduces the number of points. Points will be updated in place.
 
+        Distances are computed with the global distance model (see
+        geo.set_distance_model()), there is no distance_model argument.
+
         Parameters
         ----------
 
@@ -2098,6 +2887,7 @@ class GPX:
             for waypoint in self.waypoints:
                 waypoint.remove_elevation()
 
+    @_memoized
     def get_time_bounds(self):
         """
         Gets the time bounds (start and end) of the GPX file.
@@ -2122,6 +2912,7 @@ class GPX:
 
         return TimeBounds(start_time, end_time)
 
+    @_memoized
     def get_bounds(self):
         """
         Gets the latitude and longitude bounds of the GPX file.
@@ -2199,7 +2990,8 @@ class GPX:
         for track in self.tracks:
             track.remove_empty()
 
-    def get_moving_data(self, stopped_speed_threshold=None):
+    @_memoized
+    def get_moving_data(self, stopped_speed_threshold=None, distance_model=None):
         """
         Return a tuple of (moving_time, stopped_time, moving_distance, stopped_distance, max_speed)
         that may be used for detecting the time stopped, and max speed. Not that those values are not
@@ -2217,7 +3009,8 @@ class GPX:
 
         Experiment with your own variations to get the values you expect.
 
-        Max speed is in m/s.
+        Max speed is in m/s. The distances are computed with distance_model
+        (see geo.DISTANCE_MODELS, None for the default).
         """
         moving_time = 0.
         stopped_time = 0.
@@ -2228,7 +3021,7 @@ class GPX:
         max_speed = 0.
 
         for track in self.tracks:
-            track_moving_time, track_stopped_time, track_moving_distance, track_stopped_distance, track_max_speed = track.get_moving_data(stopped_speed_threshold)
+            track_moving_time, track_stopped_time, track_moving_distance, track_stopped_distance, track_max_speed = track.get_moving_data(stopped_speed_threshold, distance_model)
             moving_time += track_moving_time
             stopped_time += track_stopped_time
             moving_distance += track_moving_distance
@@ -2258,12 +3051,19 @@ class GPX:
 
         track.split(track_segment_no=track_segment_no, track_point_no=track_point_no)
 
-    def length_2d(self):
+    @_memoized
+    def length_2d(self, distance_model=None):
         """
         Computes 2-dimensional length of the GPX file (only latitude and
         longitude, no elevation). This is the sum of 2D length of all segments
         in all tracks.
 
+        Parameters
+        ----------
+        distance_model : DistanceModel or str
+            Model used for the distances (see geo.DISTANCE_MODELS, None for
+            the default)
+
         Returns
         ----------
         length : float
@@ -2271,16 +3071,23 @@ class GPX:
         """
         result = 0
         for track in self.tracks:
-            length = track.length_2d()
+            length = track.length_2d(distance_model)
             if length:
                 result += length
         return result
 
-    def length_3d(self):
+    @_memoized
+    def length_3d(self, distance_model=None):
         """
         Computes 3-dimensional length of the GPX file (latitude, longitude, and
         elevation). This is the sum of 3D length of all segments in all tracks.
 
+        Parameters
+        ----------
+        distance_model : DistanceModel or str
+            Model used for the distances (see geo.DISTANCE_MODELS, None for
+            the default)
+
         Returns
         ----------
         length : float
@@ -2288,7 +3095,7 @@ class GPX:
         """
         result = 0
         for track in self.tracks:
-            length = track.length_3d()
+            length = track.length_3d(distance_model)
             if length:
                 result += length
         return result
@@ -2323,6 +3130,23 @@ class GPX:
                     else:
                         yield point, track_no, segment_no, point_no
 
+    def to_numpy(self):
+        """
+        Track points as a numpy structured array (see NUMPY_POINT_DTYPE), for
+        example pandas.DataFrame(gpx.to_numpy()). Requires numpy.
+
+        Returns
+        ----------
+        points : numpy.ndarray
+        """
+        numpy = _import_numpy()
+        arrays = [_points_to_numpy(numpy, segment.points, track_no, segment_no)
+                  for track_no, track in enumerate(self.tracks)
+                  for segment_no, segment in enumerate(track.segments)]
+        if not arrays:
+            return numpy.empty(0, dtype=NUMPY_POINT_DTYPE)
+        return numpy.concatenate(arrays)
+
     def get_track_points_no(self):
         """ Number of track points, *without* route and waypoints """
         result = 0
@@ -2333,6 +3157,7 @@ class GPX:
 
         return result
 
+    @_memoized
     def get_duration(self):
         """
         Calculates duration of GPX file
@@ -2355,6 +3180,7 @@ class GPX:
 
         return result
 
+    @_memoized
     def get_uphill_downhill(self):
         """
         Calculates the uphill and downhill elevation climbs for the gpx file.
@@ -2397,6 +3223,7 @@ class GPX:
 
         return result
 
+    @_memoized
     def get_elevation_extremes(self):
         """
         Calculate elevation extremes of GPX file
@@ -2426,10 +3253,11 @@ class GPX:
 
         return MinimumMaximum(min(elevations), max(elevations))
 
-    def get_points_data(self, distance_2d=False):
+    def get_points_data(self, distance_2d=False, distance_model=None):
         """
         Returns a list of tuples containing the actual point, its distance from the start,
-        track_no, segment_no, and segment_point_no
+        track_no, segment_no, and segment_point_no. The distances are computed with
+        distance_model (see geo.DISTANCE_MODELS, None for the default).
         """
         distance_from_start = 0
         previous_point = None
@@ -2445,9 +3273,9 @@ class GPX:
                     point = segment.points[point_no]
                     if previous_point and point_no > 0:
                         if distance_2d:
-                            distance = point.distance_2d(previous_point)
+                            distance = point.distance_2d(previous_point, distance_model)
                         else:
-                            distance = point.distance_3d(previous_point)
+                            distance = point.distance_3d(previous_point, distance_model)
 
                         distance_from_start += distance
 
@@ -2457,7 +3285,7 @@ class GPX:
 
         return points
 
-    def get_nearest_locations(self, location, threshold_distance=0.01):
+    def get_nearest_locations(self, location, threshold_distance=0.01, distance_model=None):
         """
         Returns a list of locations of elements like
         consisting of points where the location may be on the track
@@ -2465,6 +3293,11 @@ class GPX:
         threshold_distance is the minimum distance from the track
         so that the point *may* be counted as to be "on the track".
         For example 0.01 means 1% of the track distance.
+
+        The distances are computed with distance_model (see
+        geo.DISTANCE_MODELS, None for the default). With other models
+        (DistanceModel subclasses) the distances to all the points are
+        computed.
         """
 
         assert location
@@ -2472,47 +3305,59 @@ class GPX:
 
         result = []
 
-        points = self.get_points_data()
+        # Distances between the points of the segments (cached, see
+        # GPXTrackSegment._get_geometry()):
+        segments = []
+        distance = 0
+        for track_no, track in enumerate(self.tracks):
+            for segment_no, segment in enumerate(track.segments):
+                if segment.points:
+                    geometry = segment._get_geometry()
+                    distances = geometry.distances(True, distance_model)
+                    segments.append((track_no, segment_no, segment, geometry, distances, distance))
+                    distance += sum(distances)
 
-        if not points:
+        if not segments:
             return ()
 
-        distance = points[- 1][1]
-
         threshold = distance * threshold_distance
+        latitude_cos = mod_math.cos(mod_math.radians(location.latitude))
+        # Far blocks are skipped only if the bound holds for the model:
+        prune = mod_geo.has_block_lower_bound(distance_model)
 
         min_distance_candidate = None
-        distance_from_start_candidate = None
-        track_no_candidate = None
-        segment_no_candidate = None
-        point_no_candidate = None
-
-        for point, distance_from_start, track_no, segment_no, point_no in points:
-            distance = location.distance_3d(point)
-            if distance < threshold:
-                if min_distance_candidate is None or distance < min_distance_candidate:
-                    min_distance_candidate = distance
-                    distance_from_start_candidate = distance_from_start
-                    track_no_candidate = track_no
-                    segment_no_candidate = segment_no
-                    point_no_candidate = point_no
-            else:
-                if distance_from_start_candidate is not None:
-                    result.append((distance_from_start_candidate, track_no_candidate, segment_no_candidate, point_no_candidate))
-                min_distance_candidate = None
-                distance_from_start_candidate = None
-                track_no_candidate = None
-                segment_no_candidate = None
-                point_no_candidate = None
+        candidate = None
+
+        for track_no, segment_no, segment, geometry, distances, distance_from_start in segments:
+            for block in geometry.blocks():
+                # Skip (and end the current candidate) if all the points are too far:
+                if prune and block.min_distance(location.latitude, location.longitude, latitude_cos) >= threshold:
+                    if candidate is not None:
+                        result.append(candidate)
+                    min_distance_candidate = candidate = None
+                    distance_from_start += sum(distances[max(block.start - 1, 0):block.end - 1])
+                    continue
+                for point_no in range(block.start, block.end):
+                    if point_no > 0:
+                        distance_from_start += distances[point_no - 1]
+                    distance = location.distance_3d(segment.points[point_no], distance_model)
+                    if distance < threshold:
+                        if min_distance_candidate is None or distance < min_distance_candidate:
+                            min_distance_candidate = distance
+                            candidate = NearestLocationData(distance_from_start, track_no, segment_no, point_no)
+                    else:
+                        if candidate is not None:
+                            result.append(candidate)
+                        min_distance_candidate = candidate = None
 
-        if distance_from_start_candidate is not None:
-            result.append(NearestLocationData(distance_from_start_candidate, track_no_candidate, segment_no_candidate, point_no_candidate))
+        if candidate is not None:
+            result.append(candidate)
 
         return result
 
-    def get_nearest_location(self, location):
+    def get_nearest_location(self, location, distance_model=None):
         """ Returns (location, track_no, track_segment_no, track_point_no) for the
-        nearest location on map """
+        nearest location on map (see GPXTrackSegment.get_nearest_location()) """
         if not self.tracks:
             return None
 
@@ -2523,11 +3368,11 @@ class GPX:
         result_point_no = None
         for i in range(len(self.tracks)):
             track = self.tracks[i]
-            nearest_location, track_segment_no, track_point_no = track.get_nearest_location(location)
-            nearest_location_distance = None
-            if nearest_location:
-                nearest_location_distance = nearest_location.distance_2d(location)
-            if not distance or nearest_location_distance < distance:
+            nearest_location, track_segment_no, track_point_no = track.get_nearest_location(location, distance_model)
+            if nearest_location is None:
+                continue
+            nearest_location_distance = nearest_location.distance_2d(location, distance_model)
+            if distance is None or nearest_location_distance < distance:
                 result = nearest_location
                 distance = nearest_location_distance
                 result_track_no = i
@@ -2536,6 +3381,27 @@ class GPX:
 
         return NearestLocationData(result, result_track_no, result_segment_no, result_point_no)
 
+    def project(self, location, distance_model=None):
+        """
+        Projects location onto the tracks (see GPXTrackSegment.project()).
+
+        Returns
+        ----------
+        projection_data : ProjectionData
+            (projection, track_no, segment_no) of the nearest projection,
+            with all three None if there are no track points.
+        """
+        result = None
+        result_track_no = None
+        result_segment_no = None
+        for i, track in enumerate(self.tracks):
+            projection, track_segment_no = track.project(location, distance_model)
+            if projection is not None and (result is None or projection.distance < result.distance):
+                result = projection
+                result_track_no = i
+                result_segment_no = track_segment_no
+        return ProjectionData(result, result_track_no, result_segment_no)
+
     def add_elevation(self, delta):
         """
         Adjusts elevation data of GPX data.
@@ -2667,6 +3533,10 @@ class GPX:
                 point.time = start_time + i * time_delta
             i += 1
 
+        for track in self.tracks:
+            for segment in track.segments:
+                segment._set_dirty()
+
     def move(self, location_delta):
         """
         Moves each point in the gpx file (routes, waypoints, tracks).
@@ -2685,9 +3555,23 @@ class GPX:
         for track in self.tracks:
             track.move(location_delta)
 
-    def to_xml(self, version=None, prettyprint=True):
+    def to_xml(self, version=None, prettyprint=True, precision=None, workers=None):
         """
         FIXME: Note, this method will change self.version
+
+        precision may be a dict of float field names and their number of
+        decimals (for example {'latitude': 7, 'longitude': 7,
+        'elevation': 2}) or the name of a profile from PRECISION_PROFILES.
+        Those fields are written with a fixed number of decimals instead
+        of the shortest exact representation.
+
+        With workers > 1 the waypoints, routes and tracks are serialized
+        in a pool of that many forked processes (at most one per CPU). The
+        workers argument is ignored (and the lists are serialized
+        sequentially) for lists with less than gpxfield.PARALLEL_MIN_POINTS
+        (20000) points, on systems without fork() and when the process has
+        more than one thread (forking it could deadlock). The result is the
+        same.
         """
         if not version:
             if self.version:
@@ -2698,6 +3582,11 @@ class GPX:
         if version != '1.0' and version != '1.1':
             raise GPXException('Invalid version %s' % version)
 
+        if isinstance(precision, str):
+            if precision not in PRECISION_PROFILES:
+                raise GPXException('Invalid precision profile: %s' % precision)
+            precision = PRECISION_PROFILES[precision]
+
         self.version = version
         if not self.creator:
             self.creator = 'gpx.py -- https://github.com/tkrajina/gpxpy'
@@ -2724,11 +3613,91 @@ class GPX:
                 'xsi:schemaLocation': ' '.join(self.schema_locations)
             },
             nsmap=self.nsmap,
-            prettyprint=prettyprint
+            prettyprint=prettyprint,
+            precision=precision,
+            workers=workers
         )
 
         return '<?xml version="1.0" encoding="UTF-8"?>\n' + content.strip()
 
+    def to_xml_chunks(self, version=None, prettyprint=True, precision=None, points_per_chunk=10000):
+        """
+        Generator of the XML of to_xml() in parts (joined, they are the same
+        string), for writing big files without building the whole XML in
+        memory (see also aio.write_xml()).
+
+        The waypoints, route points and track points are serialized in
+        parts of at most points_per_chunk points, the rest of the document
+        (metadata, route and track headers) between them. Like to_xml(), it
+        changes self.version when the first part is generated.
+        """
+        token = mod_binascii.hexlify(mod_os.urandom(8)).decode('ascii')
+        # (field name, points, class) of the placeholders:
+        lists = []
+
+        def placeholder(field_name, points, classs):
+            lists.append((field_name, points, classs))
+            return [_XMLPlaceholder('%s-%s' % (token, len(lists) - 1))]
+
+        # Shallow copies with placeholders instead of the points:
+        skeleton = mod_copy.copy(self)
+        skeleton.waypoints = placeholder('waypoints', self.waypoints, GPX)
+        skeleton.routes = []
+        for route in self.routes:
+            route_copy = mod_copy.copy(route)
+            route_copy.points = placeholder('points', route.points, GPXRoute)
+            skeleton.routes.append(route_copy)
+        skeleton.tracks = []
+        for track in self.tracks:
+            track_copy = mod_copy.copy(track)
+            track_copy.segments = []
+            for segment in track.segments:
+                segment_copy = mod_copy.copy(segment)
+                segment_copy.points = placeholder('points', segment.points, GPXTrackSegment)
+                track_copy.segments.append(segment_copy)
+            skeleton.tracks.append(track_copy)
+
+        xml = skeleton.to_xml(version, prettyprint, precision)
+        self.version = skeleton.version
+        self.creator = skeleton.creator
+        self.schema_locations = skeleton.schema_locations
+        if isinstance(precision, str):
+            precision = PRECISION_PROFILES[precision]
+
+        # Split into [text, indent, key, text, indent, key, ..., text]:
+        parts = mod_re.split(r'\n( *)<\w+ key="%s-(\d+)">\n *</\w+>' % token, xml)
+        yield parts[0]
+        for i in range(1, len(parts), 3):
+            field_name, points, classs = lists[int(parts[i + 1])]
+            fields = classs.gpx_11_fields if self.version == '1.1' else classs.gpx_10_fields
+            field = [f for f in fields if not isinstance(f, str) and f.name == field_name][0]
+            for start in range(0, len(points), points_per_chunk):
+                yield field.to_xml(points[start:start + points_per_chunk], self.version,
+                                   self.nsmap, prettyprint=prettyprint, indent=parts[i],
+                                   precision=precision)
+            yield parts[i + 2]
+
+    def to_geojson(self, precision=None, times=False):
+        """
+        GeoJSON FeatureCollection with the waypoints, routes and tracks
+        (see geojson.write_geojson() for writing it directly into a file).
+
+        Parameters
+        ----------
+        precision : int
+            Number of decimals of the coordinates (None for the full float
+            representation)
+        times : bool
+            Add the times of the points as properties
+
+        Returns
+        ----------
+        geojson : str
+        """
+        from . import geojson as mod_geojson
+
+        return mod_geojson.to_geojson(self, precision=precision, times=times)
+
     def has_times(self):
         """ See GPXTrackSegment.has_times() """
         if not self.tracks:
@@ -2740,6 +3709,18 @@ class GPX:
 
         return result
 
+    def get_extension_values(self, tags):
+        """
+        Collects the numeric values of extension tags of all track points,
+        in the same order as walk(). See
+        GPXTrackSegment.get_extension_values().
+        """
+        result = dict((tag, mod_array.array('d')) for tag in tags)
+        for track in self.tracks:
+            for tag, values in track.get_extension_values(tags).items():
+                result[tag].extend(values)
+        return result
+
     def has_elevations(self):
         """ See GPXTrackSegment.has_elevations()) """
         if not self.tracks:
@@ -2760,11 +3741,16 @@ class GPX:
         return 'GPX(%s)' % representation
 
     def clone(self):
-        return mod_copy.deepcopy(self)
-
-# Add attributes and fill default values (lists or None) for all GPX elements:
-for var_name in dir():
-    var_value = vars()[var_name]
-    if hasattr(var_value, 'gpx_10_fields') or hasattr(var_value, 'gpx_11_fields'):
-        #print('Check/fill %s' % var_value)
-        mod_gpxfield.gpx_check_slots_and_default_values(var_value)
+        """ Copy (points and extensions included), faster than copy.deepcopy() """
+        return _clone(self)
+
+def check_gpx_classes():
+    """
+    Check the slots and default values (lists or None) of all the GPX
+    element classes against their fields, see
+    gpxfield.gpx_check_slots_and_default_values(). This is run by the
+    tests (and not on every import, which should be fast).
+    """
+    for value in list(globals().values()):
+        if hasattr(value, 'gpx_10_fields') or hasattr(value, 'gpx_11_fields'):
+            mod_gpxfield.gpx_check_slots_and_default_values(value)
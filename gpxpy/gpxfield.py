@@ -14,12 +14,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import inspect as mod_inspect
+import types as mod_types
 import datetime as mod_datetime
+import os as mod_os
 import re as mod_re
+import threading as mod_threading
 import copy as mod_copy
 
 from . import utils as mod_utils
+from . import geo as mod_geo
+
+NAN = float('nan')
+
+# Values formatted with a fixed number of decimals when precision is given:
+NUMBER_TYPES = (float, int)
 
 
 class GPXFieldTypeConverter:
@@ -102,7 +110,7 @@ class AbstractGPXField:
         self.is_list = is_list
         self.attribute = False
 
-    def from_xml(self, node, version):
+    def from_xml(self, node, version, options=None):
         raise Exception('Not implemented')
 
     def to_xml(self, value, version, nsmap):
@@ -133,7 +141,7 @@ class GPXField(AbstractGPXField):
         self.possible = possible
         self.mandatory = mandatory
 
-    def from_xml(self, node, version):
+    def from_xml(self, node, version, options=None):
         if self.attribute:
             if node is not None:
                 result = node.get(self.attribute)
@@ -163,12 +171,17 @@ class GPXField(AbstractGPXField):
 
         return result
 
-    def to_xml(self, value, version, nsmap=None, prettyprint=True, indent=''):
+    def to_xml(self, value, version, nsmap=None, prettyprint=True, indent='', precision=None):
         if value is None:
             return ''
         if not prettyprint:
             indent = ''
-        if self.attribute:
+        if precision and self.type_converter is FLOAT_TYPE and self.name in precision \
+                and isinstance(value, NUMBER_TYPES):
+            value = '%.*f' % (precision[self.name], value)
+            if self.attribute:
+                return '{0}="{1}"'.format(self.attribute, value)
+        elif self.attribute:
             return '{0}="{1}"'.format(self.attribute, mod_utils.make_str(value))
         elif self.type_converter:
             value = self.type_converter.to_string(value)
@@ -183,34 +196,147 @@ class GPXComplexField(AbstractGPXField):
         self.tag = tag or name
         self.classs = classs
 
-    def from_xml(self, node, version):
+    def from_xml(self, node, version, options=None):
         if self.is_list:
             result = []
+            filtered = options is not None and options.filters(self.tag)
+            index = 0
             for child in node:
                 if child.tag == self.tag:
-                    result.append(gpx_fields_from_xml(self.classs, child,
-                                                      version))
+                    if not filtered or options.accepts(child, index):
+                        result.append(gpx_fields_from_xml(self.classs, child,
+                                                          version, options))
+                    index += 1
             return result
         else:
             field_node = node.find(self.tag)
             if field_node is None:
                 return None
-            return gpx_fields_from_xml(self.classs, field_node, version)
+            return gpx_fields_from_xml(self.classs, field_node, version,
+                                       options)
 
-    def to_xml(self, value, version, nsmap=None, prettyprint=True, indent=''):
+    def to_xml(self, value, version, nsmap=None, prettyprint=True, indent='', precision=None,
+               workers=None):
         if not prettyprint:
             indent = ''
+        if self.is_list and workers:
+            workers = _get_pool_size(value, workers)
+            if workers > 1:
+                return self._to_xml_in_pool(value, version, nsmap, prettyprint, indent, precision,
+                                            workers)
         if self.is_list:
             result = []
+            serializer = None
+            if value:
+                serializer = gpx_fields_serializer(self.classs, self.tag, version, prettyprint,
+                                                   precision)
             for obj in value:
-                result.append(gpx_fields_to_xml(obj, self.tag, version,
-                                                nsmap=nsmap,
-                                                prettyprint=prettyprint,
-                                                indent=indent))
+                if serializer and obj.__class__ is self.classs:
+                    result.append(serializer(obj, nsmap, indent))
+                else:
+                    result.append(gpx_fields_to_xml(obj, self.tag, version,
+                                                    nsmap=nsmap,
+                                                    prettyprint=prettyprint,
+                                                    indent=indent,
+                                                    precision=precision))
             return ''.join(result)
         else:
             return gpx_fields_to_xml(value, self.tag, version,
-                                     prettyprint=prettyprint, indent=indent)
+                                     prettyprint=prettyprint, indent=indent,
+                                     precision=precision)
+
+
+    def _to_xml_in_pool(self, value, version, nsmap, prettyprint, indent, precision, workers):
+        """
+        Serialize the list in chunks in a pool of forked worker processes.
+
+        The workers inherit the list when forked, only the (start, end)
+        indexes of the chunks are sent to them (pickling the objects is
+        slower than serializing them). The fragments are joined in order,
+        so the result is the same as with the sequential serialization.
+        """
+        import multiprocessing as mod_multiprocessing
+
+        # More chunks than workers, so that the work is balanced when the
+        # objects are of different sizes:
+        chunks_no = min(len(value), workers * 2)
+        chunk_size, remainder = divmod(len(value), chunks_no)
+        arguments = []
+        start = 0
+        for chunk_no in range(chunks_no):
+            end = start + chunk_size + (1 if chunk_no < remainder else 0)
+            arguments.append((self, start, end, version, nsmap, prettyprint, indent, precision))
+            start = end
+
+        if hasattr(mod_multiprocessing, 'get_context'):
+            context = mod_multiprocessing.get_context('fork')
+        else: # Python 2 (always forks on posix)
+            context = mod_multiprocessing
+
+        # The list is given to the initializer (the arguments of forked
+        # processes are inherited, not pickled):
+        pool = context.Pool(workers, _set_forked_list, (value, ))
+        try:
+            fragments = pool.map(_complex_field_to_xml, arguments)
+        finally:
+            pool.terminate()
+            pool.join()
+        return ''.join(fragments)
+
+
+# Minimum number of points (or other objects) of a list serialized in a
+# pool of processes, smaller lists are serialized faster sequentially:
+PARALLEL_MIN_POINTS = 20000
+
+
+def _cpu_count():
+    import multiprocessing as mod_multiprocessing
+    try:
+        return mod_multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def _get_pool_size(value, workers):
+    """
+    Number of worker processes for serializing the list value (1 for the
+    sequential serialization): at most one per CPU, and only for lists with
+    at least PARALLEL_MIN_POINTS points, on systems with fork() and in
+    processes with only one thread (forking a process with more threads
+    may deadlock, for example in aio.write_xml(), which serializes in an
+    executor).
+    """
+    if workers < 2 or len(value) < 2 or not hasattr(mod_os, 'fork') or mod_threading.active_count() > 1:
+        return 1
+    points_no = 0
+    for obj in value:
+        if hasattr(obj, 'segments'):
+            points_no += sum(len(segment.points) for segment in obj.segments)
+        elif hasattr(obj, 'points'):
+            points_no += len(obj.points)
+        else:
+            points_no += 1
+    if points_no < PARALLEL_MIN_POINTS:
+        return 1
+    return min(workers, len(value), _cpu_count())
+
+
+# The list serialized by GPXComplexField._to_xml_in_pool() (set only in the
+# worker processes):
+_forked_list = None
+
+
+def _set_forked_list(value):
+    """ Initializer of the worker processes of GPXComplexField._to_xml_in_pool() """
+    global _forked_list
+    _forked_list = value
+
+
+def _complex_field_to_xml(arguments):
+    """ Used by GPXComplexField._to_xml_in_pool() in the worker processes """
+    field, start, end, version, nsmap, prettyprint, indent, precision = arguments
+    return field.to_xml(_forked_list[start:end], version, nsmap, prettyprint=prettyprint,
+                        indent=indent, precision=precision)
 
 
 class GPXEmailField(AbstractGPXField):
@@ -222,13 +348,14 @@ class GPXEmailField(AbstractGPXField):
         self.name = name
         self.tag = tag or name
 
-    def from_xml(self, node, version):
+    def from_xml(self, node, version, options=None):
         """
         Extract email address.
 
         Args:
             node: ETree node with child node containing self.tag
             version: str of the gpx output version "1.0" or "1.1"
+            options: unused
 
         Returns:
             A string containing the email address.
@@ -241,13 +368,14 @@ class GPXEmailField(AbstractGPXField):
         email_domain = email_node.get('domain')
         return '{0}@{1}'.format(email_id, email_domain)
 
-    def to_xml(self, value, version, nsmap=None, prettyprint=True, indent=''):
+    def to_xml(self, value, version, nsmap=None, prettyprint=True, indent='', precision=None):
         """
         Write email address to XML
 
         Args:
             value: str representing an email address
             version: str of the gpx output version "1.0" or "1.1"
+            precision: unused
 
         Returns:
             None if value is empty or str of XML representation of the
@@ -281,13 +409,14 @@ class GPXExtensionsField(AbstractGPXField):
         self.name = name
         self.tag = tag or 'extensions'
 
-    def from_xml(self, node, version):
+    def from_xml(self, node, version, options=None):
         """
         Build a list of extension Elements.
 
         Args:
             node: Element at the root of the extensions
             version: unused, only 1.1 supports extensions
+            options: unused
 
         Returns:
             a list of Element objects
@@ -377,7 +506,7 @@ class GPXExtensionsField(AbstractGPXField):
 
         return ''.join(result)
 
-    def to_xml(self, value, version, nsmap=None, prettyprint=True, indent=''):
+    def to_xml(self, value, version, nsmap=None, prettyprint=True, indent='', precision=None):
         """
         Serialize list of ETree.
 
@@ -390,6 +519,7 @@ class GPXExtensionsField(AbstractGPXField):
             nsmap: dict of prefixes and URIs
             prettyprint: boolean, when true, indent line
             indent: string prepended to tag, usually 2 spaces per level
+            precision: unused
 
         Returns:
             string with all the prefixed tags and data for each node
@@ -409,10 +539,195 @@ class GPXExtensionsField(AbstractGPXField):
         result.append('\n' + indent + '</' + self.tag + '>')
         return ''.join(result)
 
+class GPXParseOptions:
+    """
+    Options passed by the parser down to every gpx_fields_from_xml() call.
+
+    Attributes:
+        extension_values: set of extension tags whose values are read into
+            GPXTrackPoint.extension_values instead of copying the extension
+            Elements (see find_extension_values())
+        point_fields: set of field names parsed for waypoints, route and
+            track points, or None for all fields
+        selections: dict of 'wpt', 'rte' or 'trk' -> index (int), name (str)
+            or a collection of indexes and names of the elements to be parsed
+        bounds: (min_latitude, max_latitude, min_longitude, max_longitude)
+            or None. Only waypoints inside and routes and tracks with at
+            least one point inside are parsed.
+        time_bounds: (start_time, end_time) or None. Only waypoints with
+            time in this interval and routes and tracks whose time
+            interval overlaps are parsed. Any bound may be None. Aware
+            bounds are converted to naive UTC times, like the parsed ones.
+    """
+    def __init__(self, extension_values=None, point_fields=None,
+                 selections=None, bounds=None, time_bounds=None):
+        self.extension_values = frozenset(extension_values or ())
+        self.point_fields = None
+        if point_fields is not None:
+            self.point_fields = set(point_fields)
+            if self.extension_values:
+                self.point_fields.add('extensions')
+        self.selections = {}
+        for tag, selection in (selections or {}).items():
+            if selection is None:
+                continue
+            if not isinstance(selection, (list, tuple, set, frozenset)):
+                selection = (selection,)
+            self.selections[tag] = frozenset(selection)
+        self.bounds = tuple(bounds) if bounds is not None else None
+        self.time_bounds = None
+        if time_bounds is not None:
+            # The parsed times are naive:
+            self.time_bounds = tuple(_to_naive_utc(time) for time in time_bounds)
+        self._filtered_fields = {}
+
+    def filters(self, tag):
+        """ True if elements with this tag must be checked with accepts() """
+        if tag not in _POINT_TAGS:
+            return False
+        return tag in self.selections or self.bounds is not None or self.time_bounds is not None
+
+    def accepts(self, node, index):
+        """
+        Check (without building the GPX object) if the wpt, rte or trk node
+        (the index-th of its kind) is to be parsed.
+        """
+        selection = self.selections.get(node.tag)
+        if selection is not None and index not in selection:
+            name_node = node.find('name')
+            if name_node is None or name_node.text not in selection:
+                return False
+
+        if node.tag == 'wpt':
+            point_nodes = [node]
+        else:
+            point_nodes = list(node.iter(_POINT_TAGS[node.tag]))
+
+        if self.bounds is not None:
+            min_lat, max_lat, min_lon, max_lon = self.bounds
+            for point_node in point_nodes:
+                latitude = mod_utils.to_number(point_node.get('lat'), None)
+                longitude = mod_utils.to_number(point_node.get('lon'), None)
+                if latitude is not None and longitude is not None \
+                        and min_lat <= latitude <= max_lat and min_lon <= longitude <= max_lon:
+                    break
+            else:
+                return False
+
+        if self.time_bounds is not None:
+            start_time, end_time = self.time_bounds
+            time_nodes = [point_node.find('time') for point_node in point_nodes]
+            min_time, max_time = _get_min_max_time([time_node.text for time_node in time_nodes
+                                                    if time_node is not None and time_node.text])
+            if min_time is None:
+                return False
+            if start_time and max_time < start_time:
+                return False
+            if end_time and min_time > end_time:
+                return False
+
+        return True
+
+    def get_fields(self, instance, fields):
+        """
+        Return the fields to be parsed for instance (fields without the
+        point fields which are not in point_fields).
+        """
+        if self.point_fields is None or not isinstance(instance, mod_geo.Location):
+            return fields
+        key = id(fields)
+        if key not in self._filtered_fields:
+            self._filtered_fields[key] = _filter_fields(fields, self.point_fields)
+        return self._filtered_fields[key]
+
 # ----------------------------------------------------------------------------------------------------
 # Utility methods:
 # ----------------------------------------------------------------------------------------------------
 
+# Point tags for element tags filtered by GPXParseOptions:
+_POINT_TAGS = {'wpt': 'wpt', 'rte': 'rtept', 'trk': 'trkpt'}
+
+# Start of the times which are ordered like strings (if of the same length):
+_ISO_TIME_RE = mod_re.compile(r'\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d')
+
+
+def _to_naive_utc(time):
+    """ time (datetime or None) without the timezone, converted to UTC if aware """
+    if time is None or time.tzinfo is None:
+        return time
+    return time.replace(tzinfo=None) - time.utcoffset()
+
+
+def _get_min_max_time(texts):
+    """
+    The minimum and maximum time (None, None if none is valid) of the time
+    strings texts, which may be in any order. When all of them are ISO
+    times of the same length, only the minimum and maximum string are
+    parsed.
+    """
+    if texts and len(set(len(text) for text in texts)) == 1 \
+            and all(_ISO_TIME_RE.match(text) for text in texts):
+        min_time, max_time = TIME_TYPE.from_string(min(texts)), TIME_TYPE.from_string(max(texts))
+        if min_time and max_time:
+            return min_time, max_time
+    times = [time for time in (TIME_TYPE.from_string(text) for text in texts) if time]
+    if not times:
+        return None, None
+    return min(times), max(times)
+
+
+def _filter_fields(fields, names):
+    """
+    Return fields without the fields whose name is not in names. Container
+    tags ('tag:dep1:dep2' ... '/tag') left without fields are removed, too.
+    """
+    result = []
+    containers = []
+    for field in fields:
+        if isinstance(field, str):
+            if field.startswith('/'):
+                start = containers.pop()
+                if len(result) == start + 1:
+                    result.pop()
+                    continue
+            else:
+                containers.append(len(result))
+            result.append(field)
+        elif field.name in names:
+            result.append(field)
+    return result
+
+
+def find_extension_values(elements, tags):
+    """
+    Find the numeric values of the given tags in extension elements.
+
+    Args:
+        elements: iterable of extension Elements (their subelements are
+            searched, too)
+        tags: set of tags, either local names ('hr') which match in any
+            namespace or tags in Clark notation ('{namespace}hr')
+
+    Returns:
+        A dict of tag -> float for every tag found. The first occurrence of
+        a tag wins, values which are not numbers are NaN.
+    """
+    result = {}
+    for element in elements:
+        for subelement in element.iter():
+            tag = subelement.tag
+            if callable(tag):
+                # Comments and processing instructions
+                continue
+            if tag not in tags:
+                tag = tag.partition('}')[2]
+                if tag not in tags:
+                    continue
+            if tag not in result:
+                result[tag] = mod_utils.to_number(subelement.text, default=NAN, nan_value=NAN)
+    return result
+
+
 def _check_dependents(gpx_object, fieldname):
     """
     Check for data in subelements.
@@ -441,7 +756,8 @@ def _check_dependents(gpx_object, fieldname):
     return '', fieldname # No children
 
 def gpx_fields_to_xml(instance, tag, version, custom_attributes=None,
-                      nsmap=None, prettyprint=True, indent=''):
+                      nsmap=None, prettyprint=True, indent='', precision=None,
+                      workers=None):
     if not prettyprint:
         indent = ''
     fields = instance.gpx_10_fields
@@ -493,14 +809,25 @@ def gpx_fields_to_xml(instance, tag, version, custom_attributes=None,
             if gpx_field.attribute:
                 body.append(' ' + gpx_field.to_xml(value, version, nsmap,
                                                    prettyprint=prettyprint,
-                                                   indent=indent + '  '))
+                                                   indent=indent + '  ',
+                                                   precision=precision))
             elif value is not None:
                 if tag_open:
                     body.append('>')
                     tag_open = False
-                xml_value = gpx_field.to_xml(value, version, nsmap,
-                                             prettyprint=prettyprint,
-                                             indent=indent + '  ')
+                if workers and isinstance(gpx_field, GPXComplexField) and gpx_field.is_list:
+                    # Only the lists of this object are serialized in
+                    # parallel, their elements are serialized sequentially:
+                    xml_value = gpx_field.to_xml(value, version, nsmap,
+                                                 prettyprint=prettyprint,
+                                                 indent=indent + '  ',
+                                                 precision=precision,
+                                                 workers=workers)
+                else:
+                    xml_value = gpx_field.to_xml(value, version, nsmap,
+                                                 prettyprint=prettyprint,
+                                                 indent=indent + '  ',
+                                                 precision=precision)
                 if xml_value:
                     body.append(xml_value)
 
@@ -512,8 +839,207 @@ def gpx_fields_to_xml(instance, tag, version, custom_attributes=None,
     return ''.join(body)
 
 
-def gpx_fields_from_xml(class_or_instance, node, version):
-    if mod_inspect.isclass(class_or_instance):
+# Serializers compiled by gpx_fields_serializer():
+_serializers = {}
+
+
+def gpx_fields_serializer(classs, tag, version, prettyprint=True, precision=None):
+    """
+    Get the serializer compiled for (simple) objects like points.
+
+    The serializer is a function serializer(instance, nsmap, indent)
+    returning exactly the same string as gpx_fields_to_xml(instance, tag,
+    version, nsmap=nsmap, prettyprint=prettyprint, indent=indent,
+    precision=precision) but without the per-field dispatch. It is
+    generated once for every class, tag, version, prettyprint mode and
+    precision.
+
+    Args:
+        classs: class with gpx_10_fields and gpx_11_fields
+        tag: the tag of the serialized element
+        version: str of the gpx output version "1.0" or "1.1"
+        prettyprint: boolean, when true, indent lines
+        precision: dict of float field names and number of decimals
+
+    Returns:
+        The serializer function or None if the class contains fields which
+        can not be compiled (gpx_fields_to_xml() must be used for them).
+    """
+    key = (classs, tag, version, prettyprint, tuple(sorted(precision.items())) if precision else None)
+    try:
+        return _serializers[key]
+    except KeyError:
+        pass
+    serializer = _compile_serializer(classs, tag, version, prettyprint, precision or {})
+    _serializers[key] = serializer
+    return serializer
+
+
+def _compile_serializer(classs, tag, version, prettyprint, precision):
+    fields = classs.gpx_10_fields
+    if version == '1.1':
+        fields = classs.gpx_11_fields
+
+    # Fixed number of decimals of the (float) fields:
+    decimals = dict((field.name, precision[field.name]) for field in fields
+                    if isinstance(field, GPXField) and field.type_converter is FLOAT_TYPE
+                    and field.name in precision)
+
+    # Converters whose output never needs escaping:
+    safe_converters = (FLOAT_TYPE, INT_TYPE, TIME_TYPE)
+    py2 = mod_utils.PYTHON_VERSION[0] == '2'
+
+    namespace = {
+        'escape': mod_utils.xml_escape,
+        'make_str': mod_utils.make_str,
+        'version': version,
+        'prettyprint': prettyprint,
+        'precision': precision,
+        'number_types': NUMBER_TYPES,
+    }
+    lines = []
+
+    def emit(line):
+        lines.append('    ' * (len(containers) + len(blocks) + 1) + line)
+
+    def indent_variable(depth):
+        return 'indent%s' % depth
+
+    def attribute(gpx_field, variable):
+        emit('if %s is None:' % variable)
+        emit("    body.append(' ')")
+        if gpx_field.name in decimals:
+            emit('elif isinstance(%s, number_types):' % variable)
+            emit("    body.append(' %s=\"%%.%sf\"' %% %s)" % (gpx_field.attribute, decimals[gpx_field.name], variable))
+        emit('else:')
+        emit("    body.append(' %s=\"{0}\"'.format(make_str(%s)))" % (gpx_field.attribute, variable))
+
+    def element(xml_tag):
+        # Return value of utils.to_xml() (for not None content)
+        result = "'\\n' + %s + '<%s>' + %s + '</%s>'" % (indent_variable(len(containers) + 1), xml_tag,
+                                                          '%s', xml_tag)
+        return 'make_str(%s)' % result if py2 else result
+
+    containers = []
+    # Additional python blocks (if/else) around the emitted code:
+    blocks = []
+    tag_open = True
+    batched = set()
+    for field_no, gpx_field in enumerate(fields):
+        if field_no in batched:
+            continue
+        if isinstance(gpx_field, str):
+            if tag_open:
+                emit("body.append('>')")
+                tag_open = False
+            if gpx_field.startswith('/'):
+                if not containers or containers[-1] != gpx_field[1:]:
+                    return None
+                emit("body.append('\\n' + %s + '<%s>')" % (indent_variable(len(containers)), gpx_field))
+                containers.pop()
+                tag_open = False
+            else:
+                container_tag, _, dependents = gpx_field.partition(':')
+                dependents = [dependent.lstrip('@') for dependent in dependents.split(':') if dependent]
+                if not dependents or len(containers) >= 2:
+                    return None
+                emit('if %s:' % ' or '.join('instance.%s' % dependent for dependent in dependents))
+                containers.append(container_tag)
+                emit("body.append('\\n' + %s + '<%s')" % (indent_variable(len(containers)), container_tag))
+                tag_open = True
+            continue
+
+        field_variable = 'field%s' % field_no
+        namespace[field_variable] = gpx_field
+        if isinstance(gpx_field, GPXField):
+            if gpx_field.attribute:
+                if not tag_open:
+                    # Attribute after a subelement, not supported
+                    return None
+                # Following float attributes with fixed decimals (latitude
+                # and longitude) are formatted together with one template:
+                run = [gpx_field]
+                while gpx_field.name in decimals and field_no + len(run) < len(fields):
+                    next_field = fields[field_no + len(run)]
+                    if not isinstance(next_field, GPXField) or not next_field.attribute \
+                            or next_field.name not in decimals:
+                        break
+                    run.append(next_field)
+                if len(run) > 1:
+                    variables = ['value%s' % (field_no + n) for n in range(len(run))]
+                    for field, variable in zip(run, variables):
+                        emit('%s = instance.%s' % (variable, field.name))
+                    emit('if %s:' % ' and '.join('%s.__class__ is float' % variable for variable in variables))
+                    emit("    body.append('%s' %% (%s,))" % (
+                        ''.join(' %s="%%.%sf"' % (field.attribute, decimals[field.name]) for field in run),
+                        ', '.join(variables)))
+                    emit('else:')
+                    blocks.append('else')
+                    for field, variable in zip(run, variables):
+                        attribute(field, variable)
+                    blocks.pop()
+                    batched.update(range(field_no, field_no + len(run)))
+                else:
+                    emit('value = instance.%s' % gpx_field.name)
+                    attribute(gpx_field, 'value')
+                continue
+            emit('value = instance.%s' % gpx_field.name)
+            if tag_open:
+                emit("body.append('>')")
+                tag_open = False
+            emit('if value is not None:')
+            if gpx_field.name in decimals:
+                emit('    if isinstance(value, number_types):')
+                emit("        value = '%%.%sf' %% value" % decimals[gpx_field.name])
+                emit('    else:')
+                emit('        value = %s.type_converter.to_string(value)' % field_variable)
+            elif gpx_field.type_converter:
+                emit('    value = %s.type_converter.to_string(value)' % field_variable)
+            emit('    if value is None:')
+            emit("        body.append('\\n' + %s + '<%s/>')" % (indent_variable(len(containers) + 1), gpx_field.tag))
+            emit('    else:')
+            if gpx_field.type_converter in safe_converters:
+                emit('        body.append(%s)' % (element(gpx_field.tag) % 'value'))
+            else:
+                emit('        body.append(%s)' % (element(gpx_field.tag) % 'escape(value)'))
+        elif isinstance(gpx_field, GPXExtensionsField):
+            if tag_open:
+                emit("body.append('>')")
+                tag_open = False
+            emit('value = instance.%s' % gpx_field.name)
+            emit('if value is not None:')
+            emit('    xml_value = %s.to_xml(value, version, nsmap, prettyprint=prettyprint, indent=%s,'
+                 ' precision=precision)' % (field_variable, indent_variable(len(containers) + 1)))
+            emit('    if xml_value:')
+            emit('        body.append(xml_value)')
+        else:
+            return None
+
+    if containers:
+        return None
+    if tag_open:
+        emit("body.append('>')")
+    emit("body.append('\\n' + indent0 + '</%s>')" % tag)
+    emit("return ''.join(body)")
+
+    header = ['def serializer(instance, nsmap, indent0):']
+    if prettyprint:
+        for depth in range(1, 4):
+            header.append("    %s = indent0 + '%s'" % (indent_variable(depth), '  ' * depth))
+    else:
+        header.append("    indent0 = indent1 = indent2 = indent3 = ''")
+    header.append("    body = ['\\n' + indent0 + '<%s']" % tag)
+
+    exec('\n'.join(header + lines), namespace)
+    return namespace['serializer']
+
+
+# Types of classes (old-style classes in Python 2, too):
+_CLASS_TYPES = (type, mod_types.ClassType) if hasattr(mod_types, 'ClassType') else (type, )
+
+
+def gpx_fields_from_xml(class_or_instance, node, version, options=None):
+    if isinstance(class_or_instance, _CLASS_TYPES):
         result = class_or_instance()
     else:
         result = class_or_instance
@@ -521,6 +1047,8 @@ def gpx_fields_from_xml(class_or_instance, node, version):
     fields = result.gpx_10_fields
     if version == '1.1':
         fields = result.gpx_11_fields
+    if options is not None:
+        fields = options.get_fields(result, fields)
 
     node_path = [node]
 
@@ -537,10 +1065,21 @@ def gpx_fields_from_xml(class_or_instance, node, version):
                     node_path.append(current_node.find(gpx_field))
         else:
             if current_node is not None:
-                value = gpx_field.from_xml(current_node, version)
+                if options is not None and options.extension_values \
+                        and isinstance(gpx_field, GPXExtensionsField) \
+                        and hasattr(result, 'extension_values'):
+                    # Read only the requested values (NaN if missing), the
+                    # extension Elements are never copied into the object:
+                    values = dict.fromkeys(options.extension_values, NAN)
+                    extensions_node = current_node.find(gpx_field.tag)
+                    if extensions_node is not None:
+                        values.update(find_extension_values(extensions_node, options.extension_values))
+                    result.extension_values = values
+                    continue
+                value = gpx_field.from_xml(current_node, version, options)
                 setattr(result, gpx_field.name, value)
             elif gpx_field.attribute:
-                value = gpx_field.from_xml(node, version)
+                value = gpx_field.from_xml(node, version, options)
                 setattr(result, gpx_field.name, value)
 
     return result
@@ -566,7 +1105,8 @@ def gpx_check_slots_and_default_values(classs):
         raise Exception('Error reading attributes for %s: %s' % (classs.__name__, e))
 
     attributes.sort()
-    slots = list(classs.__slots__)
+    # Private slots (caches) are not attributes:
+    slots = [slot for slot in classs.__slots__ if slot[0] != '_']
     slots.sort()
 
     if attributes != slots:
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Tomo Krajina
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Byte offset index of the tracks and track segments of (big) GPX files.
+
+The index is built with one streaming pass over the file (see
+gpxxml.scan()) and can be saved in a (JSON) sidecar file. With it a single
+track or segment can be parsed by reading only its bytes from the file:
+
+    index = gpxindex.get_index('archive.gpx')
+    for track_no in index.find_tracks(time_bounds=(start, end)):
+        gpx = index.parse_track('archive.gpx', track_no)
+"""
+
+import collections as mod_collections
+import json as mod_json
+import os as mod_os
+
+from . import gpx as mod_gpx
+from . import gpxfield as mod_gpxfield
+from . import gpxxml as mod_gpxxml
+from . import parser as mod_parser
+from . import utils as mod_utils
+
+# Extension appended to the GPX file name for the sidecar index file:
+INDEX_FILE_EXTENSION = '.idx'
+
+# Version of the sidecar file format:
+INDEX_FORMAT_VERSION = 1
+
+GPXIndexSegment = mod_collections.namedtuple(
+    'GPXIndexSegment',
+    ('start', 'end', 'points_no', 'bounds', 'time_bounds'))
+GPXIndexTrack = mod_collections.namedtuple(
+    'GPXIndexTrack',
+    ('start', 'end', 'name', 'points_no', 'bounds', 'time_bounds', 'segments'))
+
+
+class GPXIndex:
+    """
+    Index of the tracks in a GPX file.
+
+    tracks is a list of GPXIndexTrack (each with a list of GPXIndexSegment).
+    start and end are byte offsets of the <trk>/<trkseg> elements in the
+    file, bounds are GPXBounds (None if there are no points) and
+    time_bounds are TimeBounds of the first and last point with time.
+    """
+
+    def __init__(self, header_end, tracks, encoding=None, size=None):
+        # Byte offset of the first element inside <gpx>:
+        self.header_end = header_end
+        self.tracks = tracks
+        self.encoding = encoding or 'utf-8'
+        # Size of the indexed file (used to detect stale sidecar files):
+        self.size = size
+
+    def find_tracks(self, bounds=None, time_bounds=None):
+        """
+        Find tracks whose bounds intersect bounds (GPXBounds or
+        (min_latitude, max_latitude, min_longitude, max_longitude)) and
+        whose time bounds overlap time_bounds ((start_time, end_time), any
+        of them may be None).
+
+        Returns
+        ----------
+        track_numbers : list of int
+        """
+        result = []
+        for track_no, track in enumerate(self.tracks):
+            if bounds is not None:
+                if not track.bounds:
+                    continue
+                min_lat, max_lat, min_lon, max_lon = bounds
+                if track.bounds.max_latitude < min_lat or track.bounds.min_latitude > max_lat \
+                        or track.bounds.max_longitude < min_lon or track.bounds.min_longitude > max_lon:
+                    continue
+            if time_bounds is not None:
+                # Aware times in UTC, like the parsed (naive) ones:
+                start_time, end_time = [mod_gpxfield._to_naive_utc(time) for time in time_bounds]
+                if not track.time_bounds.start_time:
+                    continue
+                if start_time and track.time_bounds.end_time < start_time:
+                    continue
+                if end_time and track.time_bounds.start_time > end_time:
+                    continue
+            result.append(track_no)
+        return result
+
+    def read_track(self, gpx_file, track_no):
+        """
+        Return the XML of a GPX document with only the track_no-th track
+        of gpx_file (file name or binary file object).
+        """
+        track = self.tracks[track_no]
+        return self._read(gpx_file, track.start, track.end)
+
+    def read_segment(self, gpx_file, track_no, segment_no):
+        """
+        Return the XML of a GPX document with only one track with only the
+        segment_no-th segment of the track_no-th track of gpx_file.
+        """
+        track = self.tracks[track_no]
+        segment = track.segments[segment_no]
+        return self._read(gpx_file, segment.start, segment.end, track.start)
+
+    def parse_track(self, gpx_file, track_no, **kwargs):
+        """
+        Parse only the track_no-th track of gpx_file. The other arguments
+        are passed to GPXParser.parse().
+        """
+        return mod_parser.GPXParser(self.read_track(gpx_file, track_no)).parse(**kwargs)
+
+    def parse_segment(self, gpx_file, track_no, segment_no, **kwargs):
+        """
+        Parse only one segment of gpx_file (in a GPX with one track). The
+        other arguments are passed to GPXParser.parse().
+        """
+        return mod_parser.GPXParser(self.read_segment(gpx_file, track_no, segment_no)).parse(**kwargs)
+
+    def _read(self, gpx_file, start, end, track_start=None):
+        if hasattr(gpx_file, 'read'):
+            return self._read_from_file(gpx_file, start, end, track_start)
+        with open(gpx_file, 'rb') as f:
+            return self._read_from_file(f, start, end, track_start)
+
+    def _read_from_file(self, f, start, end, track_start):
+        """
+        The header (with the gpx start tag), the bytes from start to end
+        and the closing tags. If track_start is given, the content is
+        wrapped in the start tag of that track (the tags are copied with
+        their namespace prefixes).
+        """
+        f.seek(0)
+        header = f.read(self.header_end)
+        before = after = b''
+        if track_start is not None:
+            before = _read_start_tag(f, track_start, start)
+            after = b'</' + mod_gpxxml.START_TAG_RE.match(before).group(1) + b'>'
+        f.seek(start)
+        content = f.read(end - start)
+        root_tags = [match for match in mod_gpxxml.START_TAG_RE.finditer(header)
+                     if match.group(1)[:1] not in (b'!', b'?')]
+        after += b'</' + root_tags[-1].group(1) + b'>'
+        return (header + before + content + after).decode(self.encoding)
+
+    def save(self, index_file):
+        """ Save the index in index_file (file name or text file object). """
+        data = {
+            'version': INDEX_FORMAT_VERSION,
+            'header_end': self.header_end,
+            'encoding': self.encoding,
+            'size': self.size,
+            'tracks': [_track_to_json(track) for track in self.tracks],
+        }
+        if hasattr(index_file, 'write'):
+            mod_json.dump(data, index_file)
+        else:
+            with open(index_file, 'w') as f:
+                mod_json.dump(data, f)
+
+
+def build_index(gpx_file, chunk_size=mod_gpxxml.CHUNK_SIZE):
+    """
+    Build the index of gpx_file (file name, binary file object or bytes)
+    with a single streaming pass.
+    """
+    header_end = None
+    encoding = None
+    tracks = []
+    segments = []
+    segment = None
+    track_start = track_name = None
+
+    path = []
+    text = None
+    for event, name, value, offset in mod_gpxxml.scan(gpx_file, text=True, chunk_size=chunk_size):
+        if event == 'start':
+            parent = path[-1] if path else None
+            path.append(name)
+            if len(path) == 2 and header_end is None:
+                header_end = offset
+            if name == 'trkpt' and parent == 'trkseg' and segment is not None:
+                segment.add_point(mod_utils.to_number(value.get('lat'), None),
+                                  mod_utils.to_number(value.get('lon'), None))
+            elif name == 'time' and parent == 'trkpt':
+                text = []
+            elif name == 'name' and parent == 'trk' and len(path) == 3:
+                text = []
+            elif name == 'trkseg' and parent == 'trk' and len(path) == 3:
+                segment = _SegmentBuilder(offset)
+            elif name == 'trk' and len(path) == 2:
+                track_start, track_name, segments = offset, None, []
+        elif event == 'end':
+            path.pop()
+            parent = path[-1] if path else None
+            if name == 'time' and parent == 'trkpt' and text is not None:
+                if segment is not None:
+                    segment.add_time(''.join(text).strip())
+                text = None
+            elif name == 'name' and parent == 'trk' and text is not None:
+                track_name = ''.join(text) or None
+                text = None
+            elif name == 'trkseg' and parent == 'trk' and segment is not None:
+                segments.append(segment.build(offset))
+                segment = None
+            elif name == 'trk' and len(path) == 1:
+                tracks.append(_make_track(track_start, offset, track_name, segments))
+        elif event == 'text':
+            if text is not None:
+                text.append(value)
+        elif event == 'declaration':
+            encoding = value
+
+    size = None
+    if not hasattr(gpx_file, 'read') and not gpx_file.lstrip()[:1] in (b'<', u'<'):
+        size = mod_os.path.getsize(gpx_file)
+
+    return GPXIndex(header_end, tracks, encoding, size)
+
+
+def load_index(index_file):
+    """ Load an index saved with GPXIndex.save(). """
+    if hasattr(index_file, 'read'):
+        data = mod_json.load(index_file)
+    else:
+        with open(index_file) as f:
+            data = mod_json.load(f)
+    if data.get('version') != INDEX_FORMAT_VERSION:
+        raise mod_gpx.GPXException('Invalid index version: %s' % data.get('version'))
+    return GPXIndex(data['header_end'], [_track_from_json(track) for track in data['tracks']],
+                    data['encoding'], data['size'])
+
+
+def get_index(file_name, index_file_name=None):
+    """
+    Load the sidecar index of file_name (by default file_name + '.idx').
+    If it does not exist or is stale -- build the index and save it.
+    """
+    if index_file_name is None:
+        index_file_name = file_name + INDEX_FILE_EXTENSION
+
+    if mod_os.path.exists(index_file_name) \
+            and mod_os.path.getmtime(index_file_name) >= mod_os.path.getmtime(file_name):
+        try:
+            index = load_index(index_file_name)
+            if index.size == mod_os.path.getsize(file_name):
+                return index
+        except (ValueError, KeyError, mod_gpx.GPXException):
+            pass
+
+    index = build_index(file_name)
+    index.save(index_file_name)
+    return index
+
+
+class _SegmentBuilder:
+    def __init__(self, start):
+        self.start = start
+        self.points_no = 0
+        self.bounds = None
+        self.first_time = None
+        self.last_time = None
+
+    def add_point(self, latitude, longitude):
+        self.points_no += 1
+        if latitude is None or longitude is None:
+            return
+        if self.bounds is None:
+            self.bounds = mod_gpx.GPXBounds(latitude, latitude, longitude, longitude)
+            return
+        self.bounds.min_latitude = min(self.bounds.min_latitude, latitude)
+        self.bounds.max_latitude = max(self.bounds.max_latitude, latitude)
+        self.bounds.min_longitude = min(self.bounds.min_longitude, longitude)
+        self.bounds.max_longitude = max(self.bounds.max_longitude, longitude)
+
+    def add_time(self, time):
+        if not time:
+            return
+        if self.first_time is None:
+            self.first_time = time
+        self.last_time = time
+
+    def build(self, end):
+        # Only the first and last time need to be parsed:
+        time_bounds = mod_gpx.TimeBounds(mod_gpxfield.TIME_TYPE.from_string(self.first_time),
+                                         mod_gpxfield.TIME_TYPE.from_string(self.last_time))
+        return GPXIndexSegment(self.start, end, self.points_no, self.bounds, time_bounds)
+
+
+def _read_start_tag(f, start, end):
+    """ The start tag at the start offset (and before end) """
+    size = mod_gpxxml.CHUNK_SIZE
+    while True:
+        f.seek(start)
+        data = f.read(min(size, end - start))
+        match = mod_gpxxml.START_TAG_RE.match(data)
+        if match:
+            return match.group(0)
+        if size >= end - start:
+            raise mod_gpx.GPXException('No start tag at offset %s' % start)
+        size *= 2
+
+
+def _make_track(start, end, name, segments):
+    bounds = None
+    for segment in segments:
+        if segment.bounds is None:
+            continue
+        if bounds is None:
+            bounds = mod_gpx.GPXBounds(*segment.bounds)
+            continue
+        bounds.min_latitude = min(bounds.min_latitude, segment.bounds.min_latitude)
+        bounds.max_latitude = max(bounds.max_latitude, segment.bounds.max_latitude)
+        bounds.min_longitude = min(bounds.min_longitude, segment.bounds.min_longitude)
+        bounds.max_longitude = max(bounds.max_longitude, segment.bounds.max_longitude)
+
+    start_times = [segment.time_bounds.start_time for segment in segments if segment.time_bounds.start_time]
+    end_times = [segment.time_bounds.end_time for segment in segments if segment.time_bounds.end_time]
+    time_bounds = mod_gpx.TimeBounds(start_times[0] if start_times else None,
+                                     end_times[-1] if end_times else None)
+
+    return GPXIndexTrack(start, end, name, sum(segment.points_no for segment in segments),
+                         bounds, time_bounds, segments)
+
+
+def _bounds_to_json(bounds):
+    return list(bounds) if bounds is not None else None
+
+
+def _bounds_from_json(bounds):
+    return mod_gpx.GPXBounds(*bounds) if bounds is not None else None
+
+
+def _time_bounds_to_json(time_bounds):
+    return [mod_gpxfield.TIME_TYPE.to_string(time) for time in time_bounds]
+
+
+def _time_bounds_from_json(time_bounds):
+    return mod_gpx.TimeBounds(*[mod_gpxfield.TIME_TYPE.from_string(time) for time in time_bounds])
+
+
+def _track_to_json(track):
+    return {
+        'start': track.start,
+        'end': track.end,
+        'name': track.name,
+        'points_no': track.points_no,
+        'bounds': _bounds_to_json(track.bounds),
+        'time_bounds': _time_bounds_to_json(track.time_bounds),
+        'segments': [[segment.start, segment.end, segment.points_no,
+                      _bounds_to_json(segment.bounds), _time_bounds_to_json(segment.time_bounds)]
+                     for segment in track.segments],
+    }
+
+
+def _track_from_json(data):
+    segments = [GPXIndexSegment(start, end, points_no, _bounds_from_json(bounds), _time_bounds_from_json(time_bounds))
+                for start, end, points_no, bounds, time_bounds in data['segments']]
+    return GPXIndexTrack(data['start'], data['end'], data['name'], data['points_no'],
+                         _bounds_from_json(data['bounds']), _time_bounds_from_json(data['time_bounds']),
+                         segments)
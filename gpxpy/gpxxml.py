@@ -1,66 +1,315 @@
 # -*- coding: utf-8 -*-
 
-import xml.dom.minidom as mod_minidom
+import codecs as mod_codecs
+import collections as mod_collections
+import contextlib as mod_contextlib
+import io as mod_io
+import re as mod_re
+import xml.parsers.expat as mod_expat
+import xml.sax.saxutils as mod_saxutils
 
-def split_gpxs(xml):
-    """
-    Split single tracks from this one, without parsing with gpxpy
+# Size of the chunks read while scanning and copying files:
+CHUNK_SIZE = 64 * 1024
+
+# Start tag with attributes (attribute values can contain '>' but not '<'):
+START_TAG_RE = mod_re.compile(b'<([^\\s/>]+)(?:\\s+[^\\s=/>]+\\s*=\\s*(?:"[^"]*"|\'[^\']*\'))*\\s*(/?)>')
+
+# Elements moved by join_gpxs() (in the order required by the GPX schema):
+JOINED_ELEMENTS = ('wpt', 'rte', 'trk')
+
+def split_gpxs(xml, output=None):
     """
-    dom = mod_minidom.parseString(xml)
-    gpx_node = _find_gpx_node(dom)
-    gpx_track_nodes = []
-    if gpx_node:
-        for child_node in gpx_node.childNodes:
-            if child_node.nodeName == 'trk':
-                gpx_track_nodes.append(child_node)
-                gpx_node.removeChild(child_node)
-
-    for gpx_track_node in gpx_track_nodes:
-        gpx_node.appendChild(gpx_track_node)
-        yield dom.toxml()
-        gpx_node.removeChild(gpx_track_node)
-
-def join_gpxs(xmls):
+    Split single tracks from this one, without parsing with gpxpy.
+
+    Every yielded document is the original one (all the bytes are copied
+    as they are) without the other tracks. The input is scanned once and
+    never loaded into a DOM.
+
+    xml may be a string, bytes, a file name or a binary file object. If
+    output is given, it must be a function returning a new binary file
+    object for every track; the documents are written there (in chunks)
+    and the file objects are yielded instead of the strings.
     """
-    Utility to join GPX files without parsing them with gpxpy
+    with _open(xml) as (f, encoding):
+        layout = _read_layout(f, encoding)
+        tracks = [child for child in layout.children if child.name == 'trk']
+        for track in tracks:
+            ranges = []
+            position = 0
+            for other_track in tracks:
+                if other_track is not track:
+                    ranges.append((position, other_track.start))
+                    position = other_track.end
+            ranges.append((position, layout.size))
+
+            if output:
+                result = output()
+                for start, end in ranges:
+                    _copy(f, start, end, result.write)
+                yield result
+            else:
+                yield ''.join(_read(f, start, end).decode(layout.encoding) for start, end in ranges)
+
+def join_gpxs(xmls, output=None):
     """
-    result = None
+    Utility to join GPX files without parsing them with gpxpy.
+
+    The result is the first document with the waypoints, routes and tracks
+    of all the documents. Namespaces declared in the gpx nodes of the other
+    documents are added to the gpx node of the result. The documents are
+    scanned (not loaded into a DOM) and their elements are copied in
+    chunks.
 
-    wpt_elements = []
-    rte_elements = []
-    trk_elements = []
+    xmls may be strings, bytes, file names or binary file objects. If
+    output (a binary file object) is given the result is written there
+    (encoded like the first document) and None is returned.
+    """
+    xmls = list(xmls)
+    if not xmls:
+        return None
 
+    layouts = []
     for xml in xmls:
-        dom = mod_minidom.parseString(xml)
-        if not result:
-            result = dom
-
-        gpx_node = _find_gpx_node(dom)
-        if gpx_node:
-            for child_node in gpx_node.childNodes:
-                if child_node.nodeName == 'wpt':
-                    wpt_elements.append(child_node)
-                    gpx_node.removeChild(child_node)
-                elif child_node.nodeName == 'rte':
-                    rte_elements.append(child_node)
-                    gpx_node.removeChild(child_node)
-                elif child_node.nodeName == 'trk':
-                    trk_elements.append(child_node)
-                    gpx_node.removeChild(child_node)
-
-    gpx_node = _find_gpx_node(result)
-    if gpx_node:
-        for wpt_element in wpt_elements:
-            gpx_node.appendChild(wpt_element)
-        for rte_element in rte_elements:
-            gpx_node.appendChild(rte_element)
-        for trk_element in trk_elements:
-            gpx_node.appendChild(trk_element)
-
-    return result.toxml()
-
-def _find_gpx_node(dom):
-    for gpx_candidate_node in dom.childNodes:
-        if gpx_candidate_node.nodeName == 'gpx':
-            return gpx_candidate_node
-    return None
+        with _open(xml) as (f, encoding):
+            layouts.append(_read_layout(f, encoding))
+
+    first_layout = layouts[0]
+    result = []
+    if output:
+        encoder = mod_codecs.getincrementalencoder(first_layout.encoding)('xmlcharrefreplace')
+        write = lambda text: output.write(encoder.encode(text))
+    else:
+        write = result.append
+
+    with _open(xmls[0]) as (f, encoding):
+        # Namespaces missing in the first gpx node:
+        namespaces = []
+        for layout in layouts[1:]:
+            for attribute, uri in sorted(layout.namespaces.items()):
+                if attribute not in first_layout.namespaces and attribute not in dict(namespaces):
+                    namespaces.append((attribute, uri))
+        start_tag = _read(f, first_layout.root_start, first_layout.content_start).decode(first_layout.encoding)
+        start_tag = mod_re.sub(r'\s*/?>$', '', start_tag)
+        start_tag += ''.join(' %s=%s' % (attribute, mod_saxutils.quoteattr(uri)) for attribute, uri in namespaces)
+
+        _copy(f, 0, first_layout.root_start, write, first_layout.encoding)
+        write(start_tag + '>')
+
+        # The joined elements are inserted where the first one was in the
+        # first document, or before the extensions, or at the end:
+        position = first_layout.content_start
+        inserted = False
+        for child in first_layout.children:
+            if not inserted and child.name in JOINED_ELEMENTS + ('extensions',):
+                _copy(f, position, child.start, write, first_layout.encoding)
+                _write_joined_elements(xmls, layouts, write)
+                inserted = True
+                position = child.start
+            if child.name in JOINED_ELEMENTS:
+                _copy(f, position, child.start, write, first_layout.encoding)
+                position = child.end
+        _copy(f, position, first_layout.content_end, write, first_layout.encoding)
+        if not inserted:
+            _write_joined_elements(xmls, layouts, write)
+
+        if first_layout.empty:
+            write('</%s>' % first_layout.root_name)
+        _copy(f, first_layout.content_end, first_layout.size, write, first_layout.encoding)
+
+    if output:
+        output.write(encoder.encode('', True))
+        return None
+    return ''.join(result)
+
+def _write_joined_elements(xmls, layouts, write):
+    for name in JOINED_ELEMENTS:
+        for xml, layout in zip(xmls, layouts):
+            with _open(xml) as (f, encoding):
+                for child in layout.children:
+                    if child.name == name:
+                        _copy(f, child.start, child.end, write, layout.encoding)
+                        write('\n')
+
+_GPXChild = mod_collections.namedtuple('_GPXChild', ('name', 'start', 'end'))
+
+_GPXLayout = mod_collections.namedtuple(
+    '_GPXLayout',
+    ('encoding', 'size', 'root_name', 'root_start', 'content_start', 'content_end', 'empty',
+     'namespaces', 'children'))
+
+def _read_layout(f, encoding):
+    """
+    Scan the document and find the byte offsets of the gpx node, its content
+    and its children.
+    """
+    document_encoding = None
+    root_start = root_end = None
+    namespaces = {}
+    children = []
+    depth = 0
+    child_name = child_start = None
+    for event, name, value, offset in _XMLScanner(f, False, CHUNK_SIZE, encoding).events():
+        if event == 'start':
+            depth += 1
+            if depth == 1:
+                root_start = offset
+                namespaces = dict((attribute, uri) for attribute, uri in value.items()
+                                  if attribute == 'xmlns' or attribute.startswith('xmlns:'))
+            elif depth == 2:
+                child_name, child_start = name, offset
+        elif event == 'end':
+            if depth == 2:
+                children.append(_GPXChild(child_name, child_start, offset))
+            elif depth == 1:
+                root_end = offset
+            depth -= 1
+        elif event == 'declaration':
+            document_encoding = value
+
+    if root_start is None:
+        from . import gpx as mod_gpx
+        raise mod_gpx.GPXException('Document must have a `gpx` root node.')
+
+    size = f.seek(0, mod_io.SEEK_END)
+    if size is None: # Python 2 files
+        size = f.tell()
+
+    start_tag = _read(f, root_start, min(root_start + CHUNK_SIZE, root_end))
+    match = START_TAG_RE.match(start_tag)
+    root_name = match.group(1).decode('utf-8')
+    content_start = root_start + match.end()
+    empty = bool(match.group(2))
+    if empty:
+        content_end = root_end
+    else:
+        closing_tag_start = max(content_start, root_end - 256)
+        content_end = closing_tag_start + _read(f, closing_tag_start, root_end).rindex(b'</')
+
+    return _GPXLayout(document_encoding or 'utf-8', size, root_name, root_start, content_start,
+                      content_end, empty, namespaces, children)
+
+def _read(f, start, end):
+    f.seek(start)
+    return f.read(end - start)
+
+def _copy(f, start, end, write, encoding=None):
+    """ Copy the bytes from start to end in chunks (decoded if encoding given) """
+    decoder = mod_codecs.getincrementaldecoder(encoding)() if encoding else None
+    f.seek(start)
+    position = start
+    while position < end:
+        chunk = f.read(min(CHUNK_SIZE, end - position))
+        if not chunk:
+            break
+        position += len(chunk)
+        write(decoder.decode(chunk) if decoder else chunk)
+    if decoder:
+        write(decoder.decode(b'', True))
+
+@mod_contextlib.contextmanager
+def _open(xml_or_file):
+    """
+    Yield a binary file object for xml_or_file and the encoding of the
+    bytes if known (unicode strings are utf-8 encoded).
+    """
+    if hasattr(xml_or_file, 'read'):
+        yield xml_or_file, None
+    elif xml_or_file.lstrip()[:1] in (b'<', u'<'):
+        if isinstance(xml_or_file, bytes):
+            yield mod_io.BytesIO(xml_or_file), None
+        else:
+            yield mod_io.BytesIO(xml_or_file.encode('utf-8')), 'utf-8'
+    else:
+        with open(xml_or_file, 'rb') as f:
+            yield f, None
+
+def scan(xml_or_file, text=False, chunk_size=CHUNK_SIZE):
+    """
+    Scan the XML in chunks (without building any tree) and yield its events
+    as (event, name, value, offset) tuples:
+
+     * ('start', name, attributes, offset of the '<' of the start tag)
+     * ('end', name, None, offset just after the '>' of the end tag)
+     * ('text', None, text, None) -- only if text is True
+     * ('declaration', None, encoding, None)
+
+    Names are local names (without namespace prefixes) and offsets are
+    byte offsets in the (encoded) document, so they can be used to seek()
+    into the file. The memory used does not depend on the document size.
+
+    xml_or_file may be a file name, a binary file object, bytes or an
+    unicode string (which will be utf-8 encoded).
+    """
+    with _open(xml_or_file) as (f, encoding):
+        for event in _XMLScanner(f, text, chunk_size, encoding).events():
+            yield event
+
+class _XMLScanner:
+    def __init__(self, f, text, chunk_size, encoding=None):
+        self.file = f
+        self.chunk_size = chunk_size
+        self.encoding = encoding
+        self.events_buffer = []
+        # The parsed bytes from the offset of the last event (the end tags
+        # and empty elements after it are read from there, an end tag may
+        # span any number of chunks):
+        self.buffer = b''
+        self.buffer_offset = 0
+        self.last_offset = 0
+        # Offset of the last start tag if no other element started or ended
+        # after it (the end event of an empty element follows its start):
+        self.last_start = None
+
+        self.parser = mod_expat.ParserCreate(encoding)
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.parser.XmlDeclHandler = self.declaration
+        if text:
+            self.parser.CharacterDataHandler = self.text
+
+    def start(self, name, attributes):
+        self.last_start = self.last_offset = self.parser.CurrentByteIndex
+        self.events_buffer.append(('start', name.rpartition(':')[2], attributes, self.last_start))
+
+    def end(self, name):
+        offset = self.parser.CurrentByteIndex
+        # For empty elements (<trk/>) expat already points after the tag
+        # (where the next end tag may be), otherwise to the end tag:
+        if not self._is_empty_element(offset):
+            position = offset - self.buffer_offset
+            offset = self.buffer_offset + self.buffer.index(b'>', position) + 1
+        self.last_start = None
+        self.last_offset = offset
+        self.events_buffer.append(('end', name.rpartition(':')[2], None, offset))
+
+    def _is_empty_element(self, offset):
+        """ Is the element ending at offset a <.../> started at last_start """
+        if self.last_start is None:
+            return False
+        match = START_TAG_RE.match(self.buffer, self.last_start - self.buffer_offset)
+        return bool(match and match.group(2)) and self.buffer_offset + match.end() == offset
+
+    def text(self, data):
+        self.events_buffer.append(('text', None, data, None))
+
+    def declaration(self, version, encoding, standalone):
+        self.events_buffer.append(('declaration', None, self.encoding or encoding, None))
+
+    def events(self):
+        self.file.seek(0)
+        while True:
+            chunk = self.file.read(self.chunk_size)
+            self.buffer += chunk
+            try:
+                self.parser.Parse(chunk, not chunk)
+            except mod_expat.ExpatError as e:
+                from . import gpx as mod_gpx
+                raise mod_gpx.GPXXMLSyntaxException('Error parsing XML: %s' % str(e), e)
+            for event in self.events_buffer:
+                yield event
+            del self.events_buffer[:]
+            if not chunk:
+                return
+            self.buffer = self.buffer[self.last_offset - self.buffer_offset:]
+            self.buffer_offset = self.last_offset
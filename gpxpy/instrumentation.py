@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2011 Tomo Krajina
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Opt-in counters of calls (and their wall time) of the distance functions
+and the heavy GPXTrackSegment methods.
+
+    with gpxpy.instrumentation.instrumented() as measurement:
+        gpx.get_moving_data()
+    print(measurement.snapshot()['geo.distance'].calls)
+
+The instrumented functions have permanent hooks (the counted() decorator,
+or a check of the active flag inlined in the small distance functions),
+which only check one flag while nothing is counted. instrumented() blocks
+count the calls of their own thread only, enable() and disable() the
+global counters (of all threads) returned by snapshot().
+
+Times are cumulative: a method's time includes the time of the distances
+it computes (and the time of a recursive function like simplify_polyline()
+is added for every level of the recursion).
+"""
+
+import collections as mod_collections
+import contextlib as mod_contextlib
+import functools as mod_functools
+import threading as mod_threading
+import time as mod_time
+
+# Names of the instrumented functions and methods:
+INSTRUMENTED = [
+    'geo.distance', 'geo.haversine_distance', 'geo.vincenty_distance', 'geo.distance_from_line',
+    'geo.simplify_polyline', 'geo.Geometry.distances',
+] + ['GPXTrackSegment.' + method for method in (
+    'length_2d', 'length_3d', 'get_moving_data', 'simplify', 'reduce_points', 'smooth',
+    'get_nearest_location', 'project', 'get_uphill_downhill', 'get_elevation_extremes',
+    'get_location_at', 'add_missing_data', 'clone',
+)]
+
+# Counter values returned by snapshot():
+OperationStats = mod_collections.namedtuple(
+    'OperationStats',
+    ('calls', 'seconds'))
+
+_timer = getattr(mod_time, 'perf_counter', mod_time.time)
+
+_lock = mod_threading.Lock()
+# Number of enable() calls not yet disabled:
+_enabled = 0
+# Name -> [calls, seconds] of the global counters:
+_counters = dict((name, [0, 0.]) for name in INSTRUMENTED)
+# Number of enable() calls and open instrumented() blocks (in all threads),
+# the hooks do nothing while it is 0:
+active = [0]
+# measurements: the Measurements of the open instrumented() blocks of the
+# thread, bypass: name of the function called by call() (see hook()):
+_local = mod_threading.local()
+
+
+def counted(name):
+    """ Decorator adding the hook to an instrumented function or method """
+    def decorator(function):
+        @mod_functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not active[0]:
+                return function(*args, **kwargs)
+            start = _timer()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _count(name, _timer() - start)
+        return wrapper
+    return decorator
+
+
+def hook(name):
+    """
+    The hook inlined in small functions (where a wrapper would be
+    relatively slow), after checking active[0]:
+
+        if mod_instrumentation.active[0] and mod_instrumentation.hook('geo.distance'):
+            return mod_instrumentation.call('geo.distance', distance, ...)
+
+    False if this is the call made by call() (which counts it).
+    """
+    if getattr(_local, 'bypass', None) == name:
+        _local.bypass = None
+        return False
+    return True
+
+
+def call(name, function, *args, **kwargs):
+    """ Call and count a function with an inlined hook() """
+    start = _timer()
+    _local.bypass = name
+    try:
+        return function(*args, **kwargs)
+    finally:
+        _local.bypass = None
+        _count(name, _timer() - start)
+
+
+def _count(name, seconds):
+    if _enabled:
+        counter = _counters[name]
+        with _lock:
+            counter[0] += 1
+            counter[1] += seconds
+    for measurement in getattr(_local, 'measurements', ()):
+        counter = measurement.counters[name]
+        counter[0] += 1
+        counter[1] += seconds
+
+
+def enable():
+    """
+    Start counting the calls of all threads in the global counters. Calls
+    can be nested, counting stops after the same number of disable()
+    calls.
+    """
+    global _enabled
+    with _lock:
+        _enabled += 1
+        active[0] += 1
+
+
+def disable():
+    """ Stop counting (the counts are kept) """
+    global _enabled
+    with _lock:
+        if not _enabled:
+            return
+        _enabled -= 1
+        active[0] -= 1
+
+
+def is_enabled():
+    """ Are the calls of this thread counted """
+    return _enabled > 0 or bool(getattr(_local, 'measurements', None))
+
+
+def reset():
+    """ Set all the global counters to zero """
+    with _lock:
+        for counter in _counters.values():
+            counter[0], counter[1] = 0, 0.
+
+
+def snapshot():
+    """
+    Returns a dict of name (for example 'geo.distance' or
+    'GPXTrackSegment.smooth') -> OperationStats(calls, seconds) for all
+    the instrumented functions, with the calls counted while enabled. The
+    counters only grow (until reset()), so they can be exported as
+    monotonic counters.
+    """
+    with _lock:
+        return dict((name, OperationStats(*counter)) for name, counter in _counters.items())
+
+
+class Measurement:
+    """ Counts of the calls made inside an instrumented() block """
+
+    def __init__(self):
+        self.counters = dict((name, [0, 0.]) for name in INSTRUMENTED)
+
+    def snapshot(self):
+        """ Like the module snapshot(), but only with the calls of the block """
+        return dict((name, OperationStats(*counter)) for name, counter in self.counters.items())
+
+
+@mod_contextlib.contextmanager
+def instrumented():
+    """
+    Context manager counting the calls of the current thread inside the
+    with block. It gives a Measurement whose snapshot() has only the calls
+    from the block (nested blocks count their calls in all the open
+    blocks).
+    """
+    measurement = Measurement()
+    if not hasattr(_local, 'measurements'):
+        _local.measurements = []
+    _local.measurements.append(measurement)
+    with _lock:
+        active[0] += 1
+    try:
+        yield measurement
+    finally:
+        with _lock:
+            active[0] -= 1
+        _local.measurements.remove(measurement)
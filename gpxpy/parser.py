@@ -14,8 +14,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections as mod_collections
 import logging as mod_logging
 import re as mod_re
+import timeit as mod_timeit
 
 try:
     import lxml.etree as mod_etree  # Load LXML or fallback to cET or ET
@@ -31,6 +33,116 @@ from . import gpxfield as mod_gpxfield
 
 log = mod_logging.getLogger(__name__)
 
+def _read_namespaces(gpx, xml):
+    """ Read the namespaces and schema locations declared in xml into gpx """
+    # Build prefix map for reserialization and extension handlings
+    for namespace in mod_re.findall(r'\sxmlns:?[^=]*="[^"]+"', xml):
+        prefix, _, URI = namespace[6:].partition('=')
+        prefix = prefix.lstrip(':')
+        if prefix == '':
+            prefix = 'defaultns'  # alias default for easier handling
+        else:
+            if prefix.startswith("ns"):
+                mod_etree.register_namespace("noglobal_" + prefix, URI.strip('"'))
+            else:
+                mod_etree.register_namespace(prefix, URI.strip('"'))
+        gpx.nsmap[prefix] = URI.strip('"')
+
+    schema_loc = mod_re.search(r'\sxsi:schemaLocation="[^"]+"', xml)
+    if schema_loc:
+        _, _, value = schema_loc.group(0).partition('=')
+        gpx.schema_locations = value.strip('"').split()
+
+def _remove_default_namespace(xml):
+    return mod_re.sub(r"""\sxmlns=(['"])[^'"]+\1""", '', xml, count=1)
+
+def _get_parse_options(extension_values, fields, selections=None, bounds=None, time_bounds=None):
+    """ GPXParseOptions for the GPXParser.parse() arguments, None if not needed """
+    if mod_utils.is_string(fields):
+        if fields not in mod_gpx.PARSE_PROFILES:
+            raise mod_gpx.GPXException('Invalid fields profile: %s' % fields)
+        fields = mod_gpx.PARSE_PROFILES[fields]
+    if fields is not None:
+        unknown_fields = set(fields) - _get_point_field_names()
+        if unknown_fields:
+            raise mod_gpx.GPXException('Invalid point fields: %s' % ', '.join(sorted(unknown_fields)))
+
+    selections = selections or {}
+    if extension_values or fields is not None or bounds is not None or time_bounds is not None \
+            or any(selection is not None for selection in selections.values()):
+        return mod_gpxfield.GPXParseOptions(extension_values=extension_values,
+                                            point_fields=fields,
+                                            selections=selections,
+                                            bounds=bounds,
+                                            time_bounds=time_bounds)
+    return None
+
+def _get_point_field_names():
+    """ Names of the fields of waypoints, route points and track points """
+    result = set()
+    for classs in (mod_gpx.GPXWaypoint, mod_gpx.GPXRoutePoint, mod_gpx.GPXTrackPoint):
+        for field in classs.gpx_10_fields + classs.gpx_11_fields:
+            if not mod_utils.is_string(field):
+                result.add(field.name)
+    return result
+
+class GPXParseStats:
+    """
+    Time and item counts of the phases of a parse, filled by GPXParser when
+    given (see gpxpy.parse()). Nothing is measured or counted without it.
+
+    Attributes:
+        phase_times: dict of phase name -> seconds, the phases are 'read'
+            (reading and decoding the file), 'namespaces' (namespace and
+            schema location regexes), 'tree' (building the ElementTree)
+            and 'fields' (building the GPX objects)
+        bytes_read: size of the read XML (characters if it was given as
+            a unicode string)
+        elements: number of XML elements in the tree
+        points: waypoints, route points and track points built
+        times: points with a (successfully parsed) time
+        extensions: extension Elements copied (of all the GPX objects)
+    """
+
+    PHASES = ('read', 'namespaces', 'tree', 'fields')
+
+    def __init__(self):
+        self.phase_times = mod_collections.OrderedDict((phase, 0.) for phase in self.PHASES)
+        self.bytes_read = 0
+        self.elements = 0
+        self.points = 0
+        self.times = 0
+        self.extensions = 0
+
+    @property
+    def total_time(self):
+        return sum(self.phase_times.values())
+
+    def count_objects(self, gpx):
+        """ Count the points, times and extensions of the parsed gpx """
+        self.extensions += len(gpx.extensions) + len(gpx.metadata_extensions)
+        point_lists = [gpx.waypoints]
+        for route in gpx.routes:
+            self.extensions += len(route.extensions)
+            point_lists.append(route.points)
+        for track in gpx.tracks:
+            self.extensions += len(track.extensions)
+            for segment in track.segments:
+                self.extensions += len(segment.extensions)
+                point_lists.append(segment.points)
+        for points in point_lists:
+            self.points += len(points)
+            for point in points:
+                if point.time is not None:
+                    self.times += 1
+                if point.extensions:
+                    self.extensions += len(point.extensions)
+
+    def __repr__(self):
+        return 'GPXParseStats(%s, bytes_read=%s, elements=%s, points=%s, times=%s, extensions=%s)' % (
+            ', '.join('%s=%.4fs' % item for item in self.phase_times.items()),
+            self.bytes_read, self.elements, self.points, self.times, self.extensions)
+
 class GPXParser:
     """
     Parse the XML and provide new GPX instance.
@@ -46,15 +158,18 @@ class GPXParser:
 
     """
 
-    def __init__(self, xml_or_file=None):
+    def __init__(self, xml_or_file=None, stats=None):
         """
         Initialize new GPXParser instance.
 
         Arguments:
             xml_or_file: string or file object containing the gpx
                 formatted xml
+            stats: GPXParseStats to be filled with the time and item
+                counts of reading and parsing, or None
 
         """
+        self.stats = stats
         self.init(xml_or_file)
         self.gpx = mod_gpx.GPX()
 
@@ -67,10 +182,17 @@ class GPXParser:
                 formatted xml
 
         """
+        stats = self.stats
+        if stats is not None:
+            start = mod_timeit.default_timer()
         text = xml_or_file.read() if hasattr(xml_or_file, 'read') else xml_or_file
         self.xml = mod_utils.make_str(text)
+        if stats is not None:
+            stats.phase_times['read'] += mod_timeit.default_timer() - start
+            stats.bytes_read += len(text) if text else 0
 
-    def parse(self, version=None):
+    def parse(self, version=None, extension_values=None, fields=None,
+              tracks=None, routes=None, waypoints=None, bounds=None, time_bounds=None):
         """
         Parse the XML and return a GPX object.
 
@@ -78,35 +200,52 @@ class GPXParser:
             version: str or None indicating the GPX Schema to use.
                 Options are '1.0', '1.1' and None. When version is None
                 the version is read from the file or falls back on 1.0.
+            extension_values: list of extension tags (local names like
+                'hr' or '{namespace}hr'). When given, the numeric values
+                of those tags are read into GPXTrackPoint.extension_values
+                (NaN for missing values) and the extension Elements of track
+                points are not copied (so they are not written back by
+                to_xml(), and get_extension_values() raises GPXException
+                for other tags).
+            fields: the names of the waypoint, route point and track point
+                fields to parse (for example {'latitude', 'longitude',
+                'time'}) or the name of a profile from
+                gpx.PARSE_PROFILES ('geometry' or 'full'). Other point
+                fields are skipped and keep their default values. None
+                means all fields.
+            tracks: index (int), name (str) or a list of indexes and names
+                of the tracks to parse. Other tracks are skipped before
+                any GPXTrack object is created. None means all tracks.
+            routes: same as tracks, but for routes.
+            waypoints: same as tracks, but for waypoints.
+            bounds: GPXBounds or (min_latitude, max_latitude,
+                min_longitude, max_longitude). Only waypoints inside the
+                bounds and routes/tracks with at least one point inside
+                are parsed.
+            time_bounds: (start_time, end_time) datetimes (any of them may
+                be None). Only waypoints, routes and tracks with time
+                overlapping this interval are parsed.
 
         Returns:
             A GPX object loaded from the xml
 
         Raises:
             GPXXMLSyntaxException: XML file is invalid
-            GPXException: XML is valid but GPX data contains errors
+            GPXException: XML is valid but GPX data contains errors, or
+                fields has an unknown profile or field name
 
         """
-        # Build prefix map for reserialization and extension handlings
-        for namespace in mod_re.findall(r'\sxmlns:?[^=]*="[^"]+"', self.xml):
-            prefix, _, URI = namespace[6:].partition('=')
-            prefix = prefix.lstrip(':')
-            if prefix == '':
-                prefix = 'defaultns'  # alias default for easier handling
-            else:
-                if prefix.startswith("ns"):
-                    mod_etree.register_namespace("noglobal_" + prefix, URI.strip('"'))
-                else:
-                    mod_etree.register_namespace(prefix, URI.strip('"'))
-            self.gpx.nsmap[prefix] = URI.strip('"')
+        stats = self.stats
+        if stats is not None:
+            start = mod_timeit.default_timer()
 
-        schema_loc = mod_re.search(r'\sxsi:schemaLocation="[^"]+"', self.xml)
-        if schema_loc:
-            _, _, value = schema_loc.group(0).partition('=')
-            self.gpx.schema_locations = value.strip('"').split()
+        _read_namespaces(self.gpx, self.xml)
 
         # Remove default namespace to simplify processing later
-        self.xml = mod_re.sub(r"""\sxmlns=(['"])[^'"]+\1""", '', self.xml, count=1)
+        self.xml = _remove_default_namespace(self.xml)
+
+        if stats is not None:
+            start = self._end_phase('namespaces', start)
 
         # Build tree
         try:
@@ -137,12 +276,31 @@ class GPXParser:
         if root is None:
             raise mod_gpx.GPXException('Document must have a `gpx` root node.')
 
+        if stats is not None:
+            self._end_phase('tree', start)
+            stats.elements += sum(1 for element in root.iter())
+            start = mod_timeit.default_timer()
+
         if version is None:
             version = root.get('version')
 
-        mod_gpxfield.gpx_fields_from_xml(self.gpx, root, version)
+        options = _get_parse_options(extension_values, fields, {'trk': tracks, 'rte': routes, 'wpt': waypoints},
+                                     bounds, time_bounds)
+
+        mod_gpxfield.gpx_fields_from_xml(self.gpx, root, version, options)
+
+        if stats is not None:
+            self._end_phase('fields', start)
+            stats.count_objects(self.gpx)
+
         return self.gpx
 
+    def _end_phase(self, phase, start):
+        """ Add the time since start to phase, returns the current time """
+        now = mod_timeit.default_timer()
+        self.stats.phase_times[phase] += now - start
+        return now
+
     @staticmethod
     def __library():
         """
@@ -153,3 +311,226 @@ class GPXParser:
         if "lxml" in str(mod_etree):
             return "LXML"
         return "STDLIB"
+
+# Closing tags not parsed by GPXFollowParser.poll() until something follows
+# them (loggers often overwrite them with every new point):
+_HELD_BACK_TAG_RE = mod_re.compile(br'</(?:[^\s>:]+:)?(?:trkseg|trk|gpx)\s*>$')
+
+# Start of the gpx root element:
+_ROOT_START_RE = mod_re.compile(br'<(?:[^\s>:/?!]+:)?gpx[\s/>]')
+
+def _get_complete_length(data):
+    """
+    Length of the part of data GPXFollowParser.poll() parses: without an
+    incomplete tag (or text) at the end and without the closing tags of
+    the trkseg, trk and gpx elements after the last complete element.
+    """
+    end = data.rfind(b'>') + 1
+    while end:
+        start = data.rfind(b'<', 0, end)
+        if start < 0 or not _HELD_BACK_TAG_RE.match(data[start:end]):
+            break
+        end = start
+        while end and data[end - 1:end].isspace():
+            end -= 1
+    return end
+
+def _create_pull_parser():
+    if not hasattr(mod_etree, 'XMLPullParser'):
+        raise mod_gpx.GPXException('Incremental parsing requires lxml or Python 3.4+')
+    if hasattr(mod_etree, 'LXML_VERSION'):
+        # Comments would be elements with a callable .tag:
+        return mod_etree.XMLPullParser(events=('start', 'end'), remove_comments=True)
+    return mod_etree.XMLPullParser(events=('start', 'end'))
+
+class GPXFollowParser:
+    """
+    Incremental parser, for GPX files still being written (for example by
+    a GPS logger):
+
+        follower = GPXFollowParser('track.gpx')
+        while logging:
+            for point in follower.poll():
+                ...
+            time.sleep(1)
+
+    Every poll() reads only the bytes appended to the file since the
+    previous one and feeds them to an incremental XML parser (which keeps
+    its state between the polls). The elements completed by them are added
+    to the gpx attribute, the track points with
+    GPXTrackSegment.append_point() (so that the statistics of the segments
+    are updated in constant time).
+
+    The file doesn't have to be complete: an incomplete element at the end
+    waits for the next poll, and the closing trkseg, trk and gpx tags are
+    only parsed when something follows them (loggers often overwrite them
+    with every new point). close() parses the rest.
+
+    Bytes (for example from a socket) can be given to feed() instead.
+
+    Attributes:
+        gpx: the GPX object with the elements parsed so far
+        offset: number of bytes of the file parsed (or given to feed())
+    """
+
+    def __init__(self, file_or_name=None, version=None, extension_values=None, fields=None):
+        """
+        Arguments:
+            file_or_name: file name or binary file object of the followed
+                file, None if the data is given to feed()
+            version, extension_values, fields: see GPXParser.parse()
+        """
+        self.file = file_or_name
+        self.version = version
+        self.options = _get_parse_options(extension_values, fields)
+        self.gpx = mod_gpx.GPX()
+        self.offset = 0
+
+        # The bytes before the end of the gpx start tag:
+        self._header = b''
+        self._parser = None
+        # Open elements:
+        self._elements = []
+        self._header_parsed = False
+
+    def poll(self):
+        """
+        Parse the bytes appended to the file since the previous call.
+
+        Returns:
+            The new track points (already added to gpx)
+
+        Raises:
+            GPXXMLSyntaxException: the XML is invalid
+            GPXException: the file is shorter than the parsed part
+        """
+        data = self._read()
+        return self.feed(data[:_get_complete_length(data)])
+
+    def feed(self, data):
+        """
+        Parse the next bytes of the document.
+
+        Returns:
+            The new track points (already added to gpx)
+        """
+        self.offset += len(data)
+        if self._parser is None:
+            self._header += data
+            match = _ROOT_START_RE.search(self._header)
+            # The start tag must be complete to read its namespaces:
+            if match is None or self._header.find(b'>', match.start()) < 0:
+                return []
+            self._parser = _create_pull_parser()
+            data, self._header = self._header, None
+            # Latin-1 decodes (and encodes back) any bytes:
+            text = data.decode('latin-1')
+            _read_namespaces(self.gpx, text)
+            data = _remove_default_namespace(text).encode('latin-1')
+        else:
+            # Namespaces declared in extensions:
+            _read_namespaces(self.gpx, data.decode('latin-1'))
+
+        try:
+            self._parser.feed(data)
+        except Exception as e:
+            raise mod_gpx.GPXXMLSyntaxException('Error parsing XML: %s' % str(e), e)
+        return self._read_events()
+
+    def close(self):
+        """
+        Parse the rest of the file (the closing tags included) and check
+        that the document is complete.
+
+        Returns:
+            gpx
+        """
+        if self.file is not None:
+            self.feed(self._read())
+        if self._parser is None:
+            raise mod_gpx.GPXException('Document must have a `gpx` root node.')
+        try:
+            self._parser.close()
+        except Exception as e:
+            raise mod_gpx.GPXXMLSyntaxException('Error parsing XML: %s' % str(e), e)
+        self._read_events()
+        return self.gpx
+
+    def _read(self):
+        """ The bytes of the file after offset """
+        if hasattr(self.file, 'read'):
+            return self._read_from_file(self.file)
+        with open(self.file, 'rb') as f:
+            return self._read_from_file(f)
+
+    def _read_from_file(self, f):
+        f.seek(0, 2)
+        if f.tell() < self.offset:
+            raise mod_gpx.GPXException('The file is shorter than the parsed part (%s < %s bytes)'
+                                       % (f.tell(), self.offset))
+        f.seek(self.offset)
+        return f.read()
+
+    def _read_events(self):
+        """ Add the completed elements to gpx, returns the new track points """
+        result = []
+        elements = self._elements
+        gpx = self.gpx
+        for event, element in self._parser.read_events():
+            if event == 'start':
+                elements.append(element)
+                depth = len(elements)
+                if depth == 1:
+                    if self.version is None:
+                        self.version = element.get('version')
+                elif depth == 2 and element.tag in ('wpt', 'rte', 'trk'):
+                    if not self._header_parsed:
+                        # Metadata precedes waypoints, routes and tracks:
+                        self._parse_fields(gpx, elements[0], ('waypoints', 'routes', 'tracks'))
+                        self._header_parsed = True
+                    if element.tag == 'trk':
+                        gpx.tracks.append(mod_gpx.GPXTrack())
+                elif depth == 3 and element.tag == 'trkseg' and elements[1].tag == 'trk':
+                    track = gpx.tracks[-1]
+                    if not track.segments:
+                        self._parse_fields(track, elements[1], ('segments', ))
+                    track.segments.append(mod_gpx.GPXTrackSegment())
+                continue
+
+            elements.pop()
+            depth = len(elements) + 1
+            if depth == 4 and element.tag == 'trkpt' and elements[1].tag == 'trk' \
+                    and elements[2].tag == 'trkseg':
+                point = mod_gpxfield.gpx_fields_from_xml(mod_gpx.GPXTrackPoint, element, self.version,
+                                                         self.options)
+                gpx.tracks[-1].segments[-1].append_point(point)
+                result.append(point)
+                # Parsed elements are removed, so that the tree doesn't grow:
+                elements[-1].remove(element)
+            elif depth == 3 and element.tag == 'trkseg' and elements[1].tag == 'trk':
+                self._parse_fields(gpx.tracks[-1].segments[-1], element, ('points', ))
+                elements[-1].remove(element)
+            elif depth == 2 and element.tag in ('wpt', 'rte', 'trk'):
+                if element.tag == 'wpt':
+                    gpx.waypoints.append(mod_gpxfield.gpx_fields_from_xml(
+                        mod_gpx.GPXWaypoint, element, self.version, self.options))
+                elif element.tag == 'rte':
+                    gpx.routes.append(mod_gpxfield.gpx_fields_from_xml(
+                        mod_gpx.GPXRoute, element, self.version, self.options))
+                else:
+                    # The fields after the (already removed) segments, too:
+                    self._parse_fields(gpx.tracks[-1], element, ('segments', ))
+                elements[-1].remove(element)
+            elif depth == 1:
+                self._parse_fields(gpx, element, ('waypoints', 'routes', 'tracks'))
+        return result
+
+    def _parse_fields(self, instance, element, excluded):
+        """
+        Set the fields of instance (but the excluded ones and the namespaces)
+        to the values parsed from the (possibly incomplete) element
+        """
+        parsed = mod_gpxfield.gpx_fields_from_xml(instance.__class__, element, self.version, self.options)
+        for slot in instance.__slots__:
+            if not slot.startswith('_') and slot not in excluded + ('nsmap', 'schema_locations'):
+                setattr(instance, slot, getattr(parsed, slot))
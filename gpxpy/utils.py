@@ -16,11 +16,19 @@
 
 import sys as mod_sys
 import math as mod_math
-import xml.sax.saxutils as mod_saxutils
 
 PYTHON_VERSION = mod_sys.version.split(' ')[0]
 
 
+def xml_escape(data):
+    """
+    Escape &, < and > in data, same as xml.sax.saxutils.escape() (which
+    is not imported because it imports urllib, slow for short-lived
+    processes)
+    """
+    return data.replace('&', '&amp;').replace('>', '&gt;').replace('<', '&lt;')
+
+
 def to_xml(tag, attributes=None, content=None, default=None, escape=False, prettyprint=True, indent=''):
     if not prettyprint:
         indent = ''
@@ -39,7 +47,7 @@ def to_xml(tag, attributes=None, content=None, default=None, escape=False, prett
         result.append('/>')
     else:
         if escape:
-            result.append(make_str('>%s</%s>' % (mod_saxutils.escape(content), tag)))
+            result.append(make_str('>%s</%s>' % (xml_escape(content), tag)))
         else:
             result.append(make_str('>%s</%s>' % (content, tag)))
 
@@ -71,6 +79,11 @@ def to_number(s, default=0, nan_value=None):
     return default
 
 
+def is_string(value):
+    """ Is value a str (or a unicode string on Python 2) """
+    return isinstance(value, (str, type(u'')))
+
+
 def total_seconds(timedelta):
     """ Some versions of python don't have the timedelta.total_seconds() method. """
     if timedelta is None:
@@ -85,7 +98,7 @@ def make_str(s):
         if not 'e' in result:
             return result
         # scientific notation is illegal in GPX 1/1
-        return format(s, '.10f').rstrip('0.')
+        return format(s, '.10f').rstrip('0').rstrip('.')
     if PYTHON_VERSION[0] == '2':
         if isinstance(s, unicode):
             return s.encode("utf-8")
@@ -14,7 +14,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import sys
+
 from setuptools import setup
+from setuptools.command.build_py import build_py
+
+
+class BuildPy(build_py):
+    """ gpxpy/aio.py (with async def) is installed only on Python 3.5+ """
+
+    def find_package_modules(self, package, package_dir):
+        modules = build_py.find_package_modules(self, package, package_dir)
+        if sys.version_info < (3, 5):
+            modules = [module for module in modules if module[:2] != ('gpxpy', 'aio')]
+        return modules
 
 
 with open('README.md') as f:
@@ -42,5 +55,6 @@ setup(
         "Programming Language :: Python :: 3.6",
         "Programming Language :: Python :: 3.7",
     ],
-    scripts=['gpxinfo']
+    scripts=['gpxinfo'],
+    cmdclass={'build_py': BuildPy},
 )
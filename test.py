@@ -31,11 +31,15 @@ import logging as mod_logging
 import os as mod_os
 import time as mod_time
 import codecs as mod_codecs
+import io as mod_io
+import json as mod_json
 import copy as mod_copy
 import datetime as mod_datetime
 import random as mod_random
 import math as mod_math
 import sys as mod_sys
+import tempfile as mod_tempfile
+import threading as mod_threading
 import unittest as mod_unittest
 import xml.dom.minidom as mod_minidom
 
@@ -47,11 +51,17 @@ except:
     except:
         import xml.etree.ElementTree as mod_etree
 
+try:
+    import numpy as mod_numpy
+except ImportError:
+    mod_numpy = None
+
 import gpxpy as mod_gpxpy
 import gpxpy.gpx as mod_gpx
 import gpxpy.gpxfield as mod_gpxfield
 import gpxpy.parser as mod_parser
 import gpxpy.geo as mod_geo
+import gpxpy.instrumentation as mod_instrumentation
 
 from gpxpy.utils import make_str
 from gpxpy.utils import total_seconds
@@ -504,6 +514,33 @@ class GPXTests(mod_unittest.TestCase):
         self.assertTrue(gpx.length_3d() > cloned_gpx.length_3d())
         self.assertTrue(gpx.length_2d() > cloned_gpx.length_2d())
 
+    def test_clone_copies_everything(self):
+        with open('test_files/gpx1.1_with_all_fields.gpx') as f:
+            gpx = mod_gpxpy.parse(f)
+        xml = gpx.to_xml()
+
+        cloned_gpx = gpx.clone()
+        self.assertTrue(equals(gpx, cloned_gpx))
+        self.assertEqual(xml, cloned_gpx.to_xml())
+
+        point = cloned_gpx.tracks[0].segments[0].points[0]
+        self.assertIsNot(gpx.tracks[0].segments[0].points[0], point)
+        self.assertIsNot(gpx.tracks[0].segments[0].points[0].extensions[0], point.extensions[0])
+        point.latitude += 1
+        point.extensions[0].text = 'changed'
+        cloned_gpx.tracks[0].segments[0].points.append(mod_gpx.GPXTrackPoint(1, 2))
+        cloned_gpx.nsmap['changed'] = 'changed'
+        self.assertEqual(xml, gpx.to_xml())
+
+        # Strings (also unicode on Python 2) are shared, caches aren't copied:
+        self.assertIs(gpx.name, cloned_gpx.name)
+        self.assertIs(gpx.tracks[0].name, cloned_gpx.tracks[0].name)
+        gpx.tracks[0].segments[0]._get_geometry()
+        segment = gpx.tracks[0].segments[0].clone()
+        self.assertIsNone(segment._geometry)
+        self.assertEqual(len(gpx.tracks[0].segments[0].points), len(segment.points))
+        self.assertTrue(equals(gpx.tracks[0], gpx.tracks[0].clone()))
+
     def test_reduce_by_min_distance(self):
         with open('test_files/cerknicko-jezero.gpx') as f:
             gpx = mod_gpxpy.parse(f)
@@ -528,6 +565,220 @@ class GPXTests(mod_unittest.TestCase):
         self.assertTrue(min_distance_before_reduce < 10)
         self.assertTrue(10 < min_distance_after_reduce)
 
+    def test_segment_geometry_cache(self):
+        gpx = self.parse('cerknicko-jezero.gpx')
+        segment = gpx.tracks[1].segments[0]
+
+        self.assertEqual(mod_geo.length(segment.points, _3d=False), segment.length_2d())
+        self.assertEqual(mod_geo.length(segment.points, _3d=True), segment.length_3d())
+        geometry = segment._get_geometry()
+        self.assertIs(geometry, segment._get_geometry())
+        self.assertEqual(mod_math.cos(segment.points[3].latitude / 180. * mod_math.pi), geometry.cosines[3])
+
+        # Changed points must invalidate the cached geometry:
+        length_3d = segment.length_3d()
+        segment.points[3].elevation += 100
+        self.assertTrue(segment.length_3d() > length_3d)
+        segment.points[3].latitude += 0.01
+        self.assertIsNot(geometry, segment._get_geometry())
+        self.assertEqual(mod_geo.length(segment.points, _3d=False), segment.length_2d())
+        del segment.points[3]
+        self.assertEqual(mod_geo.length(segment.points, _3d=True), segment.length_3d())
+        self.assertIsNone(segment.clone()._geometry)
+
+    def test_distance_models(self):
+        # Flinders Peak -> Buninyong (from Vincenty's paper):
+        self.assertAlmostEqual(54972.271, mod_geo.vincenty_distance(-37.95103342, 144.42486789, -37.65282114, 143.92649554), 3)
+        self.assertEqual(0, mod_geo.vincenty_distance(10, 10, 10, 10))
+
+        gpx = self.parse('cerknicko-jezero.gpx')
+        segment = gpx.tracks[1].segments[0]
+        geometry = segment._get_geometry()
+        for name, model in mod_geo.DISTANCE_MODELS.items():
+            distances = [model.distance(point.latitude, point.longitude, point.elevation,
+                                        previous.latitude, previous.longitude, previous.elevation)
+                         for previous, point in zip(segment.points, segment.points[1:])]
+            for distance, batch_distance in zip(distances, model.distances(geometry, True)):
+                self.assertAlmostEqual(distance, batch_distance, 6)
+            # Exactly the same values for pairs (appended points):
+            far_geometry = mod_geo.Geometry([45, 46, 46.001], [13, 14, 14.001], [100, 200, 220])
+            for geometry_ in geometry, far_geometry:
+                pairs = [model.consecutive_distances(geometry_.latitudes[i], geometry_.longitudes[i],
+                                                     geometry_.elevations[i], geometry_.latitudes[i - 1],
+                                                     geometry_.longitudes[i - 1], geometry_.elevations[i - 1])
+                         for i in range(1, len(geometry_.latitudes))]
+                self.assertEqual(list(model.distances(geometry_)), [pair[0] for pair in pairs])
+                self.assertEqual(list(model.distances(geometry_, True)), [pair[1] for pair in pairs])
+            self.assertAlmostEqual(sum(distances), segment.length_3d(name), 6)
+            self.assertAlmostEqual(gpx.length_2d(), gpx.length_2d(model), delta=gpx.length_2d() * 0.005)
+
+        self.assertEqual(gpx.length_2d(), gpx.length_2d('hybrid'))
+        vincenty_length = gpx.length_2d('vincenty')
+        self.assertNotEqual(gpx.length_2d(), vincenty_length)
+        mod_geo.set_distance_model('vincenty')
+        try:
+            self.assertEqual(vincenty_length, gpx.length_2d())
+            self.assertEqual(vincenty_length, sum(track.length_2d() for track in gpx.tracks))
+        finally:
+            mod_geo.set_distance_model(None)
+        self.assertNotEqual(vincenty_length, gpx.length_2d())
+
+        with self.assertRaises(ValueError):
+            gpx.length_2d('unknown')
+
+    def test_instrumentation(self):
+        gpx = self.parse('cerknicko-jezero.gpx')
+        segment = gpx.tracks[1].segments[0]
+        before = mod_instrumentation.snapshot()
+
+        with mod_instrumentation.instrumented() as measurement:
+            self.assertTrue(mod_instrumentation.is_enabled())
+            segment.get_nearest_location(segment.points[10])
+            segment.get_nearest_location(segment.points[20])
+            segment.simplify()
+            # Calls from other threads are not counted in the block:
+            thread = mod_threading.Thread(target=segment.clone)
+            thread.start()
+            thread.join()
+
+        self.assertFalse(mod_instrumentation.is_enabled())
+        stats = measurement.snapshot()
+        self.assertEqual(2, stats['GPXTrackSegment.get_nearest_location'].calls)
+        self.assertEqual(1, stats['GPXTrackSegment.simplify'].calls)
+        self.assertEqual(0, stats['GPXTrackSegment.clone'].calls)
+        self.assertTrue(stats['geo.distance'].calls >= 2 * len(segment.points))
+        self.assertTrue(stats['geo.distance_from_line'].calls > 0)
+        self.assertEqual(0, stats['geo.vincenty_distance'].calls)
+
+        # Not counted after the block, the global counters only while enabled:
+        segment.get_nearest_location(segment.points[10])
+        self.assertEqual(stats, measurement.snapshot())
+        self.assertEqual(before, mod_instrumentation.snapshot())
+
+        mod_instrumentation.enable()
+        mod_instrumentation.enable()
+        mod_instrumentation.disable()
+        try:
+            segment.clone()
+            thread = mod_threading.Thread(target=segment.clone)
+            thread.start()
+            thread.join()
+        finally:
+            mod_instrumentation.disable()
+        self.assertFalse(mod_instrumentation.is_enabled())
+        segment.clone()
+        self.assertEqual(before['GPXTrackSegment.clone'].calls + 2,
+                         mod_instrumentation.snapshot()['GPXTrackSegment.clone'].calls)
+
+    def test_memoize(self):
+        gpx = self.parse('cerknicko-jezero.gpx')
+        gpx.memoize()
+        segment = gpx.tracks[1].segments[0]
+
+        def summary():
+            return (gpx.length_2d(), gpx.length_3d('haversine'), gpx.get_moving_data(), tuple(gpx.get_bounds()),
+                    gpx.get_time_bounds(), gpx.get_duration(), gpx.get_uphill_downhill(),
+                    gpx.get_elevation_extremes())
+
+        def expected_summary():
+            clone = gpx.clone()
+            self.assertIsNone(clone._memo)
+            return (clone.length_2d(), clone.length_3d('haversine'), clone.get_moving_data(), tuple(clone.get_bounds()),
+                    clone.get_time_bounds(), clone.get_duration(), clone.get_uphill_downhill(),
+                    clone.get_elevation_extremes())
+
+        self.assertEqual(expected_summary(), summary())
+        with mod_instrumentation.instrumented() as measurement:
+            summary()
+        self.assertEqual(0, measurement.snapshot()['GPXTrackSegment.length_2d'].calls)
+        self.assertEqual(0, measurement.snapshot()['GPXTrackSegment.get_moving_data'].calls)
+        gpx.get_bounds().min_latitude = 0
+        self.assertEqual(expected_summary(), summary())
+
+        # Changed by the methods:
+        for change in (lambda: gpx.add_elevation(10), lambda: gpx.adjust_time(mod_datetime.timedelta(hours=1)),
+                       lambda: gpx.move(mod_geo.LocationDelta(latitude_diff=0.1, longitude_diff=0.1)),
+                       lambda: segment.remove_point(3), lambda: segment.points.append(mod_copy.copy(segment.points[0])),
+                       lambda: gpx.tracks[1].split(0, 5), lambda: gpx.smooth(), lambda: gpx.reduce_points(50),
+                       lambda: gpx.tracks.pop(), lambda: gpx.remove_elevation()):
+            change()
+            self.assertEqual(expected_summary(), summary())
+
+        # Changes of the points must be followed by memoize():
+        gpx.tracks[1].segments[0].points[0].latitude += 1
+        self.assertNotEqual(expected_summary()[3], summary()[3])
+        gpx.memoize()
+        self.assertEqual(expected_summary(), summary())
+
+    def test_append_point(self):
+        points = self.parse('cerknicko-jezero.gpx').tracks[1].segments[0].points
+        points[10].elevation = None
+        points[20].time = None
+        # Stopped:
+        points[30].latitude, points[30].longitude = points[29].latitude, points[29].longitude
+
+        def statistics(segment):
+            return (segment.length_2d(), segment.length_3d(), segment.get_moving_data(),
+                    tuple(segment.get_bounds()), segment.get_uphill_downhill())
+
+        segment = mod_gpx.GPXTrackSegment()
+        self.assertEqual(statistics(mod_gpx.GPXTrackSegment()), statistics(segment))
+        for point_no, point in enumerate(points):
+            segment.append_point(point)
+            self.assertEqual(statistics(mod_gpx.GPXTrackSegment(points[:point_no + 1])), statistics(segment))
+        self.assertIsNotNone(segment._get_totals())
+        self.assertIsNone(segment._get_totals('vincenty'))
+        self.assertEqual(mod_gpx.GPXTrackSegment(points).length_2d('vincenty'), segment.length_2d('vincenty'))
+
+        # Other changes drop the running totals:
+        segment.points.pop()
+        self.assertEqual(statistics(mod_gpx.GPXTrackSegment(points[:-1])), statistics(segment))
+        self.assertIsNone(segment._get_totals())
+        segment.append_point(points[-1])
+        segment.add_elevation(10)
+        self.assertIsNone(segment._get_totals())
+        self.assertEqual(statistics(segment.clone()), statistics(segment))
+
+    def test_nearest_location_first_point(self):
+        segment = mod_gpx.GPXTrackSegment([mod_gpx.GPXTrackPoint(45, 13), mod_gpx.GPXTrackPoint(45, 13.1)])
+        location, point_no = segment.get_nearest_location(mod_geo.Location(45.001, 12.99))
+        self.assertIs(segment.points[0], location)
+        self.assertEqual(0, point_no)
+
+    def test_project(self):
+        segment = mod_gpx.GPXTrackSegment([mod_gpx.GPXTrackPoint(45, 13, elevation=100),
+                                           mod_gpx.GPXTrackPoint(45, 13.1, elevation=200),
+                                           mod_gpx.GPXTrackPoint(45.1, 13.1)])
+        projection = segment.project(mod_geo.Location(45.01, 13.025))
+        self.assertEqual(0, projection.point_no)
+        self.assertAlmostEqual(0.25, projection.ratio, 3)
+        self.assertAlmostEqual(45, projection.location.latitude, 4)
+        self.assertAlmostEqual(125, projection.location.elevation, 0)
+        self.assertAlmostEqual(0.01 * mod_geo.ONE_DEGREE, projection.distance, delta=10)
+        self.assertAlmostEqual(segment.points[0].distance_2d(segment.points[1]) * 0.25, projection.distance_from_start, 0)
+        self.assertIsNone(mod_gpx.GPXTrackSegment().project(mod_geo.Location(45, 13)))
+
+        # Same as checking all the lines:
+        gpx = self.parse('cerknicko-jezero.gpx')
+        random = mod_random.Random(1)
+        for i in range(20):
+            point = random.choice(gpx.tracks[1].segments[0].points)
+            location = mod_geo.Location(point.latitude + random.uniform(-0.01, 0.01),
+                                        point.longitude + random.uniform(-0.01, 0.01))
+            projection, track_no, segment_no = gpx.project(location)
+            self.assertAlmostEqual(projection.distance, projection.location.distance_2d(location), delta=1)
+            # One leaf with all the lines:
+            self.assertEqual(projection.distance, min(
+                mod_geo.PolylineIndex(segment._get_geometry(), leaf_size=10 ** 9).project(location).distance
+                for track in gpx.tracks for segment in track.segments if segment.points))
+            segment = gpx.tracks[track_no].segments[segment_no]
+            self.assertAlmostEqual(mod_geo.length_2d(segment.points[:projection.point_no + 1]),
+                                   projection.distance_from_start - projection.ratio * mod_geo.distance(
+                                       segment.points[projection.point_no].latitude,
+                                       segment.points[projection.point_no].longitude, None,
+                                       segment.points[projection.point_no + 1].latitude,
+                                       segment.points[projection.point_no + 1].longitude, None), 2)
+
     def test_moving_stopped_times(self):
         f = open('test_files/cerknicko-jezero.gpx')
         parser = mod_parser.GPXParser(f)
@@ -792,6 +1043,64 @@ class GPXTests(mod_unittest.TestCase):
 
         self.assertTrue(len(result) == 2)
 
+    def test_positions_on_track_laps(self):
+        gpx = mod_gpx.GPX()
+        track = mod_gpx.GPXTrack()
+        gpx.tracks.append(track)
+        for lap in range(3):
+            segment = mod_gpx.GPXTrackSegment()
+            track.segments.append(segment)
+            for i in range(1000):
+                angle = i / 1000. * 2 * mod_math.pi
+                segment.points.append(mod_gpx.GPXTrackPoint(latitude=45 + 0.01 * mod_math.sin(angle),
+                                                            longitude=179.99 + 0.01 * mod_math.cos(angle)))
+                if segment.points[-1].longitude > 180:
+                    segment.points[-1].longitude -= 360
+
+        threshold = gpx.length_3d() * 0.01
+        for location in mod_geo.Location(45.01, 179.99), mod_geo.Location(45, -179.995), mod_geo.Location(46, 0):
+            # Every point checked:
+            expected = []
+            candidate = None
+            for point, distance_from_start, track_no, segment_no, point_no in gpx.get_points_data():
+                distance = location.distance_3d(point)
+                if distance < threshold:
+                    if candidate is None or distance < candidate[0]:
+                        candidate = distance, (distance_from_start, track_no, segment_no, point_no)
+                elif candidate:
+                    expected.append(candidate[1])
+                    candidate = None
+            if candidate:
+                expected.append(candidate[1])
+
+            result = gpx.get_nearest_locations(location)
+            self.assertEqual(len(expected), len(result))
+            for expected_data, data in zip(expected, result):
+                self.assertAlmostEqual(expected_data[0], data.location, 6)
+                self.assertEqual(expected_data[1:], data[1:])
+        self.assertEqual(3, len(gpx.get_nearest_locations(mod_geo.Location(45.01, 179.99))))
+
+        # Blocks aren't skipped with the bounds of the built-in models for other models:
+        class NearDistanceModel(mod_geo.DistanceModel):
+            # Every location is 1 meter from the others:
+            def distance_2d(self, latitude_1, longitude_1, latitude_2, longitude_2):
+                return 1.
+
+        model = NearDistanceModel()
+        self.assertFalse(mod_geo.has_block_lower_bound(model))
+        self.assertTrue(mod_geo.has_block_lower_bound(mod_geo.HybridDistanceModel()))
+        location = mod_geo.Location(10, 10)
+        self.assertEqual([], gpx.get_nearest_locations(location))
+        # ...but they are with the default model (no distances to the far points computed):
+        with mod_instrumentation.instrumented() as measurement:
+            self.assertEqual([], gpx.get_nearest_locations(location))
+        self.assertEqual(0, sum(measurement.snapshot()[name].calls
+                                for name in ('geo.distance', 'geo.haversine_distance', 'geo.vincenty_distance')))
+        with mod_instrumentation.instrumented() as measurement:
+            gpx.get_nearest_locations(location, distance_model=model)
+        self.assertEqual(3000, measurement.snapshot()['geo.distance'].calls)
+        self.assertEqual([(0, 0, 0)], [data[1:] for data in gpx.get_nearest_locations(location, distance_model=model)])
+
     def test_bounds(self):
         gpx = mod_gpx.GPX()
 
@@ -3106,6 +3415,401 @@ class GPXTests(mod_unittest.TestCase):
             self.assertEqual("125", extensions[0].getchildren()[0].text.strip())
             self.assertEqual("75", extensions[0].getchildren()[1].text.strip())
 
+    def test_extension_values(self):
+        xml = """<?xml version="1.0" encoding="UTF-8"?>
+        <gpx creator="Garmin Connect" version="1.1"
+          xmlns:ns3="http://www.garmin.com/xmlschemas/TrackPointExtension/v1"
+          xmlns="http://www.topografix.com/GPX/1/1">
+          <trk>
+            <trkseg>
+              <trkpt lat="51.4378" lon="6.6170">
+                <extensions>
+                  <ns3:TrackPointExtension>
+                    <ns3:hr>125</ns3:hr>
+                    <ns3:cad>75</ns3:cad>
+                  </ns3:TrackPointExtension>
+                </extensions>
+              </trkpt>
+              <trkpt lat="51.4379" lon="6.6171">
+                <extensions>
+                  <ns3:TrackPointExtension>
+                    <ns3:hr>127</ns3:hr>
+                  </ns3:TrackPointExtension>
+                </extensions>
+              </trkpt>
+              <trkpt lat="51.4380" lon="6.6172"/>
+            </trkseg>
+          </trk>
+        </gpx>"""
+        hr = '{http://www.garmin.com/xmlschemas/TrackPointExtension/v1}hr'
+
+        gpx = mod_gpxpy.parse(xml)
+        values = gpx.get_extension_values([hr, 'cad'])
+        self.assertEqual([125, 127], list(values[hr])[:2])
+        self.assertEqual(75, values['cad'][0])
+        self.assertTrue(mod_math.isnan(values['cad'][1]))
+        self.assertTrue(mod_math.isnan(values[hr][2]))
+
+        parsed = mod_gpxpy.parse(xml, extension_values=['hr', 'cad'])
+        point = parsed.tracks[0].segments[0].points[0]
+        self.assertEqual([], point.extensions)
+        self.assertEqual({'hr': 125, 'cad': 75}, point.extension_values)
+        self.assertEqual(['cad', 'hr'], sorted(parsed.tracks[0].segments[0].points[2].extension_values))
+        values = parsed.tracks[0].segments[0].get_extension_values(['hr', 'cad'])
+        self.assertEqual([125, 127], list(values['hr'])[:2])
+        self.assertEqual(75, values['cad'][0])
+        self.assertTrue(mod_math.isnan(values['cad'][2]))
+
+        # Tags not read while parsing aren't missing values:
+        with self.assertRaises(mod_gpx.GPXException):
+            parsed.get_extension_values(['hr', 'power'])
+        with self.assertRaises(mod_gpx.GPXException):
+            parsed.tracks[0].segments[0].get_extension_values([hr])
+
+    def test_cache(self):
+        import gpxpy.cache as mod_cache
+
+        directory = mod_tempfile.mkdtemp()
+        try:
+            file_name = mod_os.path.join(directory, 'track.gpx')
+            with open('test_files/cerknicko-jezero.gpx', 'rb') as f:
+                xml = f.read()
+            with open(file_name, 'wb') as f:
+                f.write(xml)
+            parsed = mod_gpxpy.parse(xml.decode('utf-8'))
+            points_no = parsed.get_track_points_no() + len(parsed.waypoints) \
+                + sum(len(route.points) for route in parsed.routes)
+
+            cache = mod_cache.GPXCache(max_points=points_no, directory=mod_os.path.join(directory, 'cache'))
+            gpx = cache.parse(file_name)
+            gpx.tracks[0].name = 'changed'
+            self.assertEqual(mod_gpxpy.parse(xml.decode('utf-8')).to_xml(), cache.parse(file_name).to_xml())
+            self.assertEqual((1, 0, 1, 0, 1, points_no, len(xml)), cache.get_stats())
+
+            # Different arguments, then evicted by the XML (same content, but other key):
+            cache.parse(file_name, fields='geometry')
+            cache.parse(xml)
+            self.assertEqual(1, len(cache))
+            self.assertEqual((1, 0, 3, 2), cache.get_stats()[:4])
+
+            # From the disk:
+            cache = mod_cache.GPXCache(directory=mod_os.path.join(directory, 'cache'), clone=False)
+            gpx = cache.parse(file_name)
+            self.assertIs(gpx, cache.parse(file_name))
+            self.assertEqual((1, 1, 0), cache.get_stats()[:3])
+
+            # Changed file:
+            with open(file_name, 'wb') as f:
+                f.write(xml.replace(b'<trkpt', b'<trkpt ', 1) + b'\n')
+            self.assertIsNot(gpx, cache.parse(file_name))
+            self.assertEqual((1, 1, 1), cache.get_stats()[:3])
+
+            cache = mod_cache.GPXCache(key='hash')
+            cache.parse(file_name)
+            with open(file_name, 'rb') as f:
+                cache.parse(f)
+            self.assertEqual((1, 0, 1), cache.get_stats()[:3])
+
+            # Arguments are a part of the key by value:
+            cache = mod_cache.GPXCache()
+            gpx = cache.parse(file_name, bounds=mod_gpx.GPXBounds(0, 5, 0, 5))
+            self.assertEqual(0, len(gpx.tracks))
+            gpx = cache.parse(file_name, bounds=mod_gpx.GPXBounds(40, 50, 10, 20))
+            self.assertEqual(len(mod_gpxpy.parse(xml.decode('utf-8'), bounds=(40, 50, 10, 20)).tracks), len(gpx.tracks))
+            self.assertTrue(gpx.tracks)
+            cache.parse(file_name, bounds=mod_gpx.GPXBounds(40, 50, 10, 20))
+            self.assertEqual((1, 0, 2), cache.get_stats()[:3])
+            with self.assertRaises(ValueError):
+                cache.parse(file_name, bounds=object())
+
+            # The parsed GPX is returned even if it can't be saved:
+            cache = mod_cache.GPXCache(directory=file_name)
+            self.assertEqual(len(parsed.tracks), len(cache.parse(xml).tracks))
+        finally:
+            import shutil
+            shutil.rmtree(directory)
+
+    def test_gpx_classes(self):
+        # Not checked on import:
+        mod_gpx.check_gpx_classes()
+
+    @mod_unittest.skipIf(not hasattr(mod_parser.mod_etree, 'XMLPullParser'),
+                         'incremental parsing requires lxml or Python 3.4+')
+    def test_follow_parser(self):
+        # A logger appending the file in chunks:
+        for file_name in ('cerknicko-jezero.gpx', 'gpx1.1_with_all_fields.gpx', 'gpx1.1_with_extensions.gpx'):
+            with open('test_files/' + file_name, 'rb') as f:
+                xml = f.read()
+            f = mod_io.BytesIO()
+            follower = mod_parser.GPXFollowParser(f)
+            points_no = 0
+            for start in range(0, len(xml), 97):
+                f.seek(0, mod_os.SEEK_END)
+                f.write(xml[start:start + 97])
+                points_no += len(follower.poll())
+            gpx = follower.close()
+            self.assertEqual(mod_gpxpy.parse(xml.decode('utf-8')).to_xml(), gpx.to_xml())
+            self.assertEqual(gpx.get_track_points_no(), points_no)
+
+        # A logger rewriting the closing tags after every point:
+        end = b'</trkseg></trk></gpx>\n'
+        f = mod_io.BytesIO(b'<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1"><trk><name>Live</name>'
+                           b'<trkseg>\n' + end)
+        follower = mod_parser.GPXFollowParser(f)
+        self.assertEqual([], follower.poll())
+        for i in range(5):
+            f.seek(-len(end), mod_os.SEEK_END)
+            f.write(b'<trkpt lat="45.%s" lon="13"><ele>%s</ele></trkpt>\n' % (str(i).encode(), str(i).encode()) + end)
+            points = follower.poll()
+            self.assertEqual([45 + i / 10.], [point.latitude for point in points])
+        self.assertEqual('Live', follower.gpx.tracks[0].name)
+        segment = follower.gpx.tracks[0].segments[0]
+        self.assertIsNotNone(segment._get_totals())
+        self.assertEqual(mod_gpxpy.parse(f.getvalue().decode('utf-8')).length_2d(), segment.length_2d())
+        follower.close()
+
+        f.truncate(10)
+        with self.assertRaises(mod_gpx.GPXException):
+            follower.poll()
+
+        # Track fields after the segments, parsed in later polls:
+        xml = b'<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1"><trk><name>T</name><trkseg>' \
+              b'<trkpt lat="1" lon="2"/></trkseg><extensions><hr>1</hr></extensions></trk></gpx>'
+        follower = mod_parser.GPXFollowParser()
+        for start in range(0, len(xml), 5):
+            follower.feed(xml[start:start + 5])
+        track = follower.close().tracks[0]
+        self.assertEqual('T', track.name)
+        self.assertEqual(['hr'], [extension.tag for extension in track.extensions])
+
+    def test_to_xml_chunks(self):
+        with open('test_files/gpx1.1_with_all_fields.gpx') as f:
+            gpx = mod_gpxpy.parse(f)
+        for version in (None, '1.0'):
+            for prettyprint in (True, False):
+                chunks = list(gpx.clone().to_xml_chunks(version, prettyprint, 'compact', points_per_chunk=1))
+                self.assertEqual(gpx.clone().to_xml(version, prettyprint, 'compact'), ''.join(chunks))
+                self.assertTrue(len(chunks) > gpx.get_track_points_no())
+
+    @mod_unittest.skipIf(mod_sys.version_info < (3, 5), 'async requires Python 3.5+')
+    def test_aio(self):
+        import asyncio as mod_asyncio
+        import gpxpy.aio as mod_aio
+
+        with open('test_files/cerknicko-jezero.gpx', 'rb') as f:
+            xml = f.read()
+        loop = mod_asyncio.new_event_loop()
+
+        def done(result):
+            future = loop.create_future()
+            future.set_result(result)
+            return future
+
+        class Reader:
+            def __init__(self):
+                self.reads = 0
+            def read(self, n):
+                self.reads += 1
+                return done(xml[(self.reads - 1) * n:self.reads * n])
+
+        class Writer:
+            def __init__(self):
+                self.data = []
+            def write(self, data):
+                self.data.append(data)
+            def drain(self):
+                return done(None)
+
+        try:
+            reader = Reader()
+            gpx = loop.run_until_complete(mod_aio.parse(reader, chunk_size=1000))
+            self.assertEqual(-(-len(xml) // 1000) + 1, reader.reads)
+            self.assertEqual(mod_gpxpy.parse(xml.decode('utf-8')).to_xml(), gpx.to_xml())
+
+            writer = Writer()
+            loop.run_until_complete(mod_aio.write_xml(gpx, writer, points_per_chunk=10))
+            self.assertTrue(len(writer.data) > gpx.get_track_points_no() // 10)
+            self.assertEqual(gpx.to_xml(), b''.join(writer.data).decode('utf-8'))
+        finally:
+            loop.close()
+
+    def test_parse_stats(self):
+        with open('test_files/gpx1.1_with_all_fields.gpx') as f:
+            xml = f.read()
+        stats = mod_parser.GPXParseStats()
+        gpx = mod_gpxpy.parse(xml, stats=stats)
+
+        self.assertEqual(list(mod_parser.GPXParseStats.PHASES), list(stats.phase_times))
+        self.assertTrue(all(seconds >= 0 for seconds in stats.phase_times.values()))
+        self.assertAlmostEqual(sum(stats.phase_times.values()), stats.total_time)
+        self.assertEqual(len(xml), stats.bytes_read)
+        self.assertEqual(len(list(mod_etree.XML(xml.encode('utf-8')).iter())), stats.elements)
+        points = gpx.waypoints + [point for route in gpx.routes for point in route.points] \
+            + [point for track in gpx.tracks for segment in track.segments for point in segment.points]
+        self.assertEqual(len(points), stats.points)
+        self.assertEqual(len([point for point in points if point.time]), stats.times)
+        self.assertTrue(stats.extensions > len(gpx.extensions))
+        self.assertIn('points=%s' % len(points), repr(stats))
+
+    def test_parse_only_selected_fields(self):
+        with open('test_files/gpx1.1_with_all_fields.gpx') as f:
+            xml = f.read()
+
+        full = mod_gpxpy.parse(xml)
+        gpx = mod_gpxpy.parse(xml, fields={'latitude', 'longitude', 'time'})
+
+        for point, full_point in ((gpx.waypoints[0], full.waypoints[0]),
+                                  (gpx.routes[0].points[0], full.routes[0].points[0]),
+                                  (gpx.tracks[0].segments[0].points[0], full.tracks[0].segments[0].points[0])):
+            self.assertEqual(full_point.latitude, point.latitude)
+            self.assertEqual(full_point.longitude, point.longitude)
+            self.assertEqual(full_point.time, point.time)
+            self.assertTrue(full_point.elevation is not None)
+            self.assertEqual(None, point.elevation)
+            self.assertEqual(None, point.name)
+            self.assertEqual(None, point.link)
+            self.assertEqual([], point.extensions)
+
+        # Other elements are parsed as usual:
+        self.assertEqual(full.name, gpx.name)
+        self.assertEqual(full.tracks[0].name, gpx.tracks[0].name)
+
+        gpx = mod_gpxpy.parse(xml, fields='geometry')
+        self.assertEqual(full.waypoints[0].elevation, gpx.waypoints[0].elevation)
+        self.assertEqual(None, gpx.waypoints[0].name)
+
+        self.assertEqual(full.waypoints[0].name, mod_gpxpy.parse(xml, fields='full').waypoints[0].name)
+
+        # Also a unicode profile name on Python 2:
+        self.assertEqual(full.waypoints[0].elevation, mod_gpxpy.parse(xml, fields=u'geometry').waypoints[0].elevation)
+
+        try:
+            mod_gpxpy.parse(xml, fields='unknown')
+            self.fail()
+        except mod_gpx.GPXException:
+            pass
+        with self.assertRaises(mod_gpx.GPXException):
+            mod_gpxpy.parse(xml, fields={'latitude', 'longitude', 'elevaton'})
+
+    def test_parse_only_selected_tracks(self):
+        with open('test_files/korita-zbevnica.gpx') as f:
+            xml = f.read()
+
+        full = mod_gpxpy.parse(xml)
+        self.assertEqual(4, len(full.tracks))
+
+        gpx = mod_gpxpy.parse(xml, tracks=2)
+        self.assertEqual(['ACTIVE LOG'], [track.name for track in gpx.tracks])
+        self.assertEqual(full.tracks[2].get_points_no(), gpx.tracks[0].get_points_no())
+        self.assertEqual(len(full.waypoints), len(gpx.waypoints))
+
+        gpx = mod_gpxpy.parse(xml, tracks=[0, 'ACTIVE LOG #2'], waypoints=[])
+        self.assertEqual(['03-OCT-10', 'ACTIVE LOG #2'], [track.name for track in gpx.tracks])
+        self.assertEqual([], gpx.waypoints)
+
+        gpx = mod_gpxpy.parse(xml, time_bounds=(mod_datetime.datetime(2010, 10, 3, 11, 0, 0), None))
+        self.assertEqual(['ACTIVE LOG #2'], [track.name for track in gpx.tracks])
+
+        # Aware bounds (the parsed times are naive, UTC):
+        class TZ(mod_datetime.tzinfo):
+            def utcoffset(self, dt):
+                return mod_datetime.timedelta(hours=2)
+
+        gpx = mod_gpxpy.parse(xml, time_bounds=(mod_datetime.datetime(2010, 10, 3, 13, 0, 0, tzinfo=TZ()), None))
+        self.assertEqual(['ACTIVE LOG #2'], [track.name for track in gpx.tracks])
+
+        # Points in any order (the last point isn't the latest):
+        route_xml = """<gpx><rte><name>Route</name>
+            <rtept lat="1" lon="1"><time>2010-10-03T12:00:00Z</time></rtept>
+            <rtept lat="1" lon="1"><time>2010-10-03T09:00:00Z</time></rtept>
+            <rtept lat="1" lon="1"><time>2010-10-03T10:00:00.5Z</time></rtept>
+        </rte></gpx>"""
+        for time_bounds, routes_no in (((mod_datetime.datetime(2010, 10, 3, 11), None), 1),
+                                       ((mod_datetime.datetime(2010, 10, 3, 13), None), 0),
+                                       ((None, mod_datetime.datetime(2010, 10, 3, 9, 30)), 1),
+                                       ((None, mod_datetime.datetime(2010, 10, 3, 8)), 0)):
+            self.assertEqual(routes_no, len(mod_gpxpy.parse(route_xml, time_bounds=time_bounds).routes))
+
+        bounds = full.tracks[1].get_bounds()
+        gpx = mod_gpxpy.parse(xml, bounds=bounds)
+        # The first track is empty:
+        self.assertEqual('03-OCT-10 #2', gpx.tracks[0].name)
+        for track in gpx.tracks:
+            self.assertTrue(any(bounds.min_latitude <= point.latitude <= bounds.max_latitude and
+                                bounds.min_longitude <= point.longitude <= bounds.max_longitude
+                                for point in track.walk(only_points=True)))
+
+    def test_track_index(self):
+        import gpxpy.gpxindex as mod_gpxindex
+
+        file_name = 'test_files/korita-zbevnica.gpx'
+        with open(file_name) as f:
+            full = mod_gpxpy.parse(f)
+
+        index = mod_gpxindex.build_index(file_name)
+        self.assertEqual(len(full.tracks), len(index.tracks))
+        for track_no, track in enumerate(full.tracks):
+            self.assertEqual(track.name, index.tracks[track_no].name)
+            self.assertEqual(track.get_points_no(), index.tracks[track_no].points_no)
+            self.assertEqual(track.get_time_bounds(), index.tracks[track_no].time_bounds)
+            if track.get_points_no():
+                self.assertEqual(list(track.get_bounds()), list(index.tracks[track_no].bounds))
+
+            gpx = index.parse_track(file_name, track_no)
+            self.assertEqual(1, len(gpx.tracks))
+            self.assertEqual(track.name, gpx.tracks[0].name)
+            self.assertEqual([(point.latitude, point.longitude, point.time) for point in track.walk(only_points=True)],
+                             [(point.latitude, point.longitude, point.time) for point in gpx.walk(only_points=True)])
+
+        gpx = index.parse_segment(file_name, 2, 0)
+        self.assertEqual(full.tracks[2].segments[0].get_points_no(), gpx.get_points_no())
+
+        self.assertEqual([3], index.find_tracks(time_bounds=(mod_datetime.datetime(2010, 10, 3, 11, 0, 0), None)))
+
+        class TZ(mod_datetime.tzinfo):
+            def utcoffset(self, dt):
+                return mod_datetime.timedelta(hours=2)
+
+        self.assertEqual([3], index.find_tracks(time_bounds=(mod_datetime.datetime(2010, 10, 3, 13, tzinfo=TZ()), None)))
+
+        index_file = mod_tempfile.NamedTemporaryFile(suffix='.idx', delete=False)
+        index_file.close()
+        try:
+            index.save(index_file.name)
+            loaded = mod_gpxindex.load_index(index_file.name)
+            self.assertEqual(index.header_end, loaded.header_end)
+            self.assertEqual(index.size, loaded.size)
+            self.assertEqual([(track.start, track.end, track.points_no, track.time_bounds) for track in index.tracks],
+                             [(track.start, track.end, track.points_no, track.time_bounds) for track in loaded.tracks])
+            self.assertEqual(full.tracks[3].get_points_no(), loaded.parse_track(file_name, 3).get_points_no())
+
+            # Sidecar index with the current size is reused:
+            self.assertEqual(index.size, mod_gpxindex.get_index(file_name, index_file.name).size)
+        finally:
+            mod_os.remove(index_file.name)
+
+    def test_track_index_offsets(self):
+        import gpxpy.gpxindex as mod_gpxindex
+
+        with open('test_files/korita-zbevnica.gpx', 'rb') as f:
+            xml = f.read()
+        offsets = lambda index: [(track.start, track.end, [(segment.start, segment.end) for segment in track.segments])
+                                 for track in index.tracks]
+        expected = offsets(mod_gpxindex.build_index(xml))
+        for chunk_size in (1, 3):
+            self.assertEqual(expected, offsets(mod_gpxindex.build_index(xml, chunk_size=chunk_size)))
+
+        xml = b'<gpx version="1.1"><trk><name>A</name><trkseg><trkpt lat="1" lon="2"/></trkseg><trkseg/></trk></gpx>'
+        for chunk_size in (1, 3, 1000):
+            index = mod_gpxindex.build_index(xml, chunk_size=chunk_size)
+            self.assertEqual('<gpx version="1.1"><trk><trkseg/></trk></gpx>', index.read_segment(mod_io.BytesIO(xml), 0, 1))
+            self.assertEqual(1, mod_gpxpy.parse(index.read_segment(mod_io.BytesIO(xml), 0, 0)).get_track_points_no())
+
+        # The tags are copied with their prefixes:
+        xml = b'<g:gpx xmlns:g="http://www.topografix.com/GPX/1/1"><g:trk id="1"><g:trkseg/></g:trk></g:gpx>'
+        index = mod_gpxindex.build_index(xml)
+        self.assertEqual(xml.decode('utf-8'), index.read_segment(mod_io.BytesIO(xml), 0, 0))
+
     def test_join_gpx_xml_files(self):
         import gpxpy.gpxxml
 
@@ -3140,6 +3844,239 @@ class GPXTests(mod_unittest.TestCase):
         self.assertEqual(trcks, len(result_gpx.tracks))
         self.assertEqual(points, result_gpx.get_points_no())
 
+        # Joined in chunks into a file object:
+        output = mod_io.BytesIO()
+        self.assertEqual(None, gpxpy.gpxxml.join_gpxs(files, output=output))
+        self.assertEqual(result_xml, output.getvalue().decode('utf-8'))
+
+    def test_split_gpx_xml_files(self):
+        import gpxpy.gpxxml
+
+        with open('test_files/korita-zbevnica.gpx') as f:
+            xml = f.read()
+        gpx = mod_gpxpy.parse(xml)
+
+        xmls = list(gpxpy.gpxxml.split_gpxs(xml))
+        self.assertEqual(len(gpx.tracks), len(xmls))
+        for track, track_xml in zip(gpx.tracks, xmls):
+            track_gpx = mod_gpxpy.parse(track_xml)
+            self.assertEqual(1, len(track_gpx.tracks))
+            self.assertEqual(track.name, track_gpx.tracks[0].name)
+            self.assertEqual(track.get_points_no(), track_gpx.get_points_no())
+            self.assertEqual(len(gpx.waypoints), len(track_gpx.waypoints))
+
+        outputs = list(gpxpy.gpxxml.split_gpxs('test_files/korita-zbevnica.gpx', output=mod_io.BytesIO))
+        self.assertEqual(xmls, [output.getvalue().decode('utf-8') for output in outputs])
+
+    def test_split_and_join_gpx_xml_files_with_empty_elements(self):
+        import gpxpy.gpxxml
+
+        a = '<gpx version="1.1"><trk><name>A</name><trkseg/></trk></gpx>'
+        b = '<gpx version="1.1"><wpt lat="1" lon="2"/><trk><name>B</name></trk><trk/></gpx>'
+
+        joined = mod_gpxpy.parse(gpxpy.gpxxml.join_gpxs([a, b]))
+        self.assertEqual(['A', 'B', None], [track.name for track in joined.tracks])
+        self.assertEqual(1, len(joined.tracks[0].segments))
+        self.assertEqual(1, len(joined.waypoints))
+
+        xmls = list(gpxpy.gpxxml.split_gpxs(b))
+        self.assertEqual(['<gpx version="1.1"><wpt lat="1" lon="2"/><trk><name>B</name></trk></gpx>',
+                          '<gpx version="1.1"><wpt lat="1" lon="2"/><trk/></gpx>'], xmls)
+        self.assertEqual(1, len(mod_gpxpy.parse(list(gpxpy.gpxxml.split_gpxs(a))[0]).tracks[0].segments))
+
+    def test_compiled_point_serializer(self):
+        for file_name in ('gpx1.0_with_all_fields.gpx', 'gpx1.1_with_all_fields.gpx', 'korita-zbevnica.gpx'):
+            gpx = self.parse(file_name)
+            points = [(point, 'wpt') for point in gpx.waypoints] \
+                + [(point, 'rtept') for route in gpx.routes for point in route.points] \
+                + [(point, 'trkpt') for point in gpx.walk(only_points=True)]
+            for point_no, (point, tag) in enumerate(points):
+                if point_no % 2:
+                    point.link = 'http://example.com/?a=1&b=2'
+                    point.name = '<a & b>'
+                if point_no % 3 == 0:
+                    point.elevation = None
+                for version in ('1.0', '1.1'):
+                    for prettyprint in (True, False):
+                        serializer = mod_gpxfield.gpx_fields_serializer(point.__class__, tag, version, prettyprint)
+                        self.assertTrue(serializer)
+                        self.assertEqual(mod_gpxfield.gpx_fields_to_xml(point, tag, version, nsmap=gpx.nsmap,
+                                                                        prettyprint=prettyprint, indent='    '),
+                                         serializer(point, gpx.nsmap, '    '))
+
+        # Classes with complex fields are not compiled:
+        self.assertEqual(None, mod_gpxfield.gpx_fields_serializer(mod_gpx.GPXTrackSegment, 'trkseg', '1.1'))
+
+    def test_to_xml_precision(self):
+        gpx = self.parse('cerknicko-jezero.gpx')
+        point = next(gpx.walk(only_points=True))
+        point.latitude = 45.123456789
+        point.longitude = 10.0
+        point.elevation = 12.3456
+
+        xml = gpx.to_xml(precision='compact')
+        self.assertTrue('<trkpt lat="45.1234568" lon="10.0000000">' in xml)
+        self.assertTrue('<ele>12.35</ele>' in xml)
+
+        reparsed = mod_gpxpy.parse(xml)
+        self.assertEqual(gpx.get_points_no(), reparsed.get_points_no())
+        for point_1, point_2 in zip(gpx.walk(only_points=True), reparsed.walk(only_points=True)):
+            self.assertAlmostEqual(point_1.latitude, point_2.latitude, delta=1e-7)
+            self.assertAlmostEqual(point_1.longitude, point_2.longitude, delta=1e-7)
+
+        # Same result with the compiled serializer and gpx_fields_to_xml():
+        for precision in ({'latitude': 5, 'longitude': 5}, {'elevation': 1}):
+            serializer = mod_gpxfield.gpx_fields_serializer(mod_gpx.GPXTrackPoint, 'trkpt', '1.1', True, precision)
+            for point in gpx.walk(only_points=True):
+                self.assertEqual(mod_gpxfield.gpx_fields_to_xml(point, 'trkpt', '1.1', nsmap=gpx.nsmap,
+                                                                precision=precision),
+                                 serializer(point, gpx.nsmap, ''))
+
+        try:
+            gpx.to_xml(precision='unknown')
+            self.fail()
+        except mod_gpx.GPXException:
+            pass
+
+    def test_to_xml_with_workers(self):
+        gpx = self.parse('korita-zbevnica.gpx')
+        for version in ('1.0', '1.1'):
+            self.assertEqual(gpx.to_xml(version), gpx.to_xml(version, workers=2))
+            self.assertEqual(gpx.to_xml(version, prettyprint=False, precision='compact'),
+                             gpx.to_xml(version, prettyprint=False, precision='compact', workers=3))
+
+        # Small lists (and on single CPU machines, all lists) are serialized sequentially:
+        self.assertEqual(1, mod_gpxfield._get_pool_size(gpx.tracks, 4))
+        pools = []
+        original_min_points, original_cpu_count = mod_gpxfield.PARALLEL_MIN_POINTS, mod_gpxfield._cpu_count
+        original_to_xml_in_pool = mod_gpxfield.GPXComplexField._to_xml_in_pool
+
+        def to_xml_in_pool(field, value, *args):
+            pools.append(args[-1])
+            return original_to_xml_in_pool(field, value, *args)
+
+        mod_gpxfield.PARALLEL_MIN_POINTS = 10
+        mod_gpxfield._cpu_count = lambda: 2
+        mod_gpxfield.GPXComplexField._to_xml_in_pool = to_xml_in_pool
+        try:
+            self.assertEqual(gpx.to_xml(), gpx.to_xml(workers=4))
+        finally:
+            mod_gpxfield.PARALLEL_MIN_POINTS = original_min_points
+            mod_gpxfield._cpu_count = original_cpu_count
+            mod_gpxfield.GPXComplexField._to_xml_in_pool = original_to_xml_in_pool
+        self.assertEqual([2], pools)
+
+        # Never forked with other threads running:
+        pool_sizes = []
+        mod_gpxfield.PARALLEL_MIN_POINTS = 10
+        mod_gpxfield._cpu_count = lambda: 2
+        try:
+            self.assertEqual(2, mod_gpxfield._get_pool_size(gpx.tracks, 2))
+            thread = mod_threading.Thread(target=lambda: pool_sizes.append(mod_gpxfield._get_pool_size(gpx.tracks, 2)))
+            thread.start()
+            thread.join()
+        finally:
+            mod_gpxfield.PARALLEL_MIN_POINTS = original_min_points
+            mod_gpxfield._cpu_count = original_cpu_count
+        self.assertEqual([1], pool_sizes)
+
+    def test_to_geojson(self):
+        gpx = self.parse('korita-zbevnica.gpx')
+        geojson = mod_json.loads(gpx.to_geojson(times=True))
+        self.assertEqual('FeatureCollection', geojson['type'])
+        self.assertEqual(len(gpx.waypoints) + len(gpx.routes) + len(gpx.tracks), len(geojson['features']))
+
+        feature = geojson['features'][len(gpx.waypoints) + len(gpx.routes) + 1]
+        segment = gpx.tracks[1].segments[0]
+        self.assertEqual('LineString', feature['geometry']['type'])
+        self.assertEqual(gpx.tracks[1].name, feature['properties']['name'])
+        self.assertEqual(len(segment.points), len(feature['geometry']['coordinates']))
+        point = segment.points[0]
+        self.assertEqual([point.longitude, point.latitude, point.elevation], feature['geometry']['coordinates'][0])
+        self.assertEqual(len(segment.points), len(feature['properties']['times']))
+
+        track = mod_gpx.GPXTrack()
+        for points in ([(1.5, 2.5, 100)], [(3.123456789, 4, None), (5, 6, None)]):
+            track.segments.append(mod_gpx.GPXTrackSegment([mod_gpx.GPXTrackPoint(*point) for point in points]))
+        track.segments[0].points[0].time = mod_datetime.datetime(2020, 1, 2, 3, 4, 5)
+        gpx = mod_gpx.GPX()
+        gpx.tracks.append(track)
+        self.assertEqual('{"type":"FeatureCollection","features":[{"type":"Feature","geometry":{"type":"MultiLineString",'
+                         '"coordinates":[[[2.500,1.500,100.000]],[[4.000,3.123],[6.000,5.000]]]},'
+                         '"properties":{"name":null,"times":[["2020-01-02T03:04:05Z"],[null,null]]}}]}',
+                         gpx.to_geojson(precision=3, times=True))
+
+        # Missing and NaN values:
+        gpx = mod_gpx.GPX()
+        gpx.waypoints.append(mod_gpx.GPXWaypoint(None, 2))
+        gpx.waypoints.append(mod_gpx.GPXWaypoint(1, 2, elevation=float('nan')))
+        gpx.tracks.append(mod_gpx.GPXTrack())
+        gpx.tracks[0].segments.append(mod_gpx.GPXTrackSegment([
+            mod_gpx.GPXTrackPoint(1, 2, elevation=3), mod_gpx.GPXTrackPoint(float('nan'), 2)]))
+        expected = ('{"type":"FeatureCollection","features":['
+                    '{"type":"Feature","geometry":null,"properties":{"name":null,"time":null}},'
+                    '{"type":"Feature","geometry":{"type":"Point","coordinates":[2.0,1.0]},"properties":{"name":null,"time":null}},'
+                    '{"type":"Feature","geometry":{"type":"LineString","coordinates":[[2.0,1.0,3.0]]},'
+                    '"properties":{"name":null,"times":[null]}}]}')
+        self.assertEqual(expected, gpx.to_geojson(times=True))
+        mod_json.loads(expected)
+
+        import gpxpy.geojson as mod_geojson
+        with mod_tempfile.TemporaryFile('w+') as f:
+            mod_geojson.write_geojson(gpx, f, times=True)
+            f.seek(0)
+            self.assertEqual(expected, f.read())
+
+    @mod_unittest.skipIf(mod_numpy is None, 'numpy not installed')
+    def test_to_numpy(self):
+        gpx = self.parse('cerknicko-jezero.gpx')
+        points = gpx.to_numpy()
+        self.assertEqual(gpx.get_track_points_no(), len(points))
+        for row, (point, track_no, segment_no, point_no) in zip(points, gpx.walk()):
+            self.assertEqual(point.latitude, row['latitude'])
+            self.assertEqual(point.elevation, row['elevation'])
+            self.assertEqual(point.time, mod_datetime.datetime(1970, 1, 1) + mod_datetime.timedelta(seconds=int(row['time'])))
+            self.assertEqual((track_no, segment_no, point_no), (row['track_no'], row['segment_no'], row['point_no']))
+
+        segment = mod_gpx.GPXTrackSegment([mod_gpx.GPXTrackPoint(1, 2),
+                                           mod_gpx.GPXTrackPoint(3, 4, elevation=5, time=mod_datetime.datetime(2020, 1, 1))])
+        points = segment.to_numpy()
+        self.assertTrue(mod_math.isnan(points['elevation'][0]))
+        self.assertEqual(mod_gpx.NUMPY_NO_TIME, points['time'][0])
+        self.assertEqual(1577836800, points['time'][1])
+
+    def test_numpy_seconds_since_epoch(self):
+        class TZ(mod_datetime.tzinfo):
+            def utcoffset(self, dt):
+                return mod_datetime.timedelta(hours=2)
+
+        self.assertEqual(1577836800, mod_gpx._seconds_since_epoch(mod_datetime.datetime(2020, 1, 1)))
+        self.assertEqual(1577836800, mod_gpx._seconds_since_epoch(mod_datetime.datetime(2020, 1, 1, 2, tzinfo=TZ())))
+        self.assertEqual(-1, mod_gpx._seconds_since_epoch(mod_datetime.datetime(1969, 12, 31, 23, 59, 59, 500000)))
+
+    @mod_unittest.skipIf(mod_numpy is None, 'numpy not installed')
+    def test_segment_from_arrays(self):
+        gpx = self.parse('cerknicko-jezero.gpx')
+        points = gpx.to_numpy()
+        segment = mod_gpx.GPXTrackSegment.from_arrays(points['latitude'], points['longitude'], points['elevation'],
+                                                      points['time'], points['speed'])
+        self.assertEqual([(point.latitude, point.longitude, point.elevation, point.time, point.speed)
+                          for point in gpx.walk(only_points=True)],
+                         [(point.latitude, point.longitude, point.elevation, point.time, point.speed)
+                          for point in segment.points])
+
+        segment = mod_gpx.GPXTrackSegment.from_arrays([1, 2], [3, 4], elevations=[float('nan'), 5],
+                                                      times=['NaT', '2020-01-01T00:00:01'])
+        self.assertEqual(None, segment.points[0].elevation)
+        self.assertEqual(5, segment.points[1].elevation)
+        self.assertEqual(None, segment.points[0].time)
+        self.assertEqual(mod_datetime.datetime(2020, 1, 1, 0, 0, 1), segment.points[1].time)
+
+    def test_make_str_without_scientific_notation(self):
+        self.assertEqual('10000000000000000', make_str(1e16))
+        self.assertEqual('0.00000015', make_str(1.5e-7))
+        self.assertEqual('0', make_str(1e-20))
+
     def test_small_floats(self):
         """GPX 1/1 does not allow scientific notation but that is what gpxpy writes right now."""
         f = open('test_files/track-with-small-floats.gpx', 'r')